@@ -0,0 +1,88 @@
+"""Start-up time of the CLIs and light-weight modules, to keep heavy imports lazy.
+
+Each target runs in a fresh interpreter `--repeats` times (wall time, best of); one extra run
+with `python -X importtime` lists the modules with the largest cumulative import time, so a
+regression (e.g. torch or pandas imported at module level again) shows what pulled it in.
+`--budget` makes the command exit non-zero when any target is slower, for CI.
+
+Usage:
+python -m evaluation.benchmark_imports
+python -m evaluation.benchmark_imports --budget 1.0 --output evaluation/run_logs/import_benchmark.json
+"""
+
+import argparse
+import json
+import os
+import subprocess
+import sys
+import time
+
+# label -> interpreter arguments; none of these should need torch, transformers or pandas
+TARGETS = {
+    "run_eval --help": ["-m", "evaluation.run_eval", "--help"],
+    "indexer --help": ["-m", "rag_pipeline.indexer", "--help"],
+    "import evaluation.score": ["-c", "import evaluation.score"],
+    "import evaluation.scorers": ["-c", "import evaluation.scorers"],
+    "import evaluation.rag_utils": ["-c", "import evaluation.rag_utils"],
+    "import evaluation.result_log": ["-c", "import evaluation.result_log"],
+    "import evaluation.matrix": ["-c", "import evaluation.matrix"],
+}
+
+
+def wall_time(argv, repeats):
+    best = float("inf")
+    for _ in range(repeats):
+        start = time.perf_counter()
+        proc = subprocess.run([sys.executable] + argv, capture_output=True, text=True)
+        best = min(best, time.perf_counter() - start)
+    return best, proc.returncode, proc.stderr
+
+
+def slowest_imports(argv, top):
+    """(module, cumulative ms) of the `top` slowest top-level imports in `python -X importtime` output."""
+    proc = subprocess.run([sys.executable, "-X", "importtime"] + argv, capture_output=True, text=True)
+    modules = []
+    for line in proc.stderr.splitlines():
+        if not line.startswith("import time:") or "|" not in line:
+            continue
+        _, cumulative, name = line[len("import time:"):].split("|")
+        if cumulative.strip().isdigit() and not name.startswith("  "):  # top-level imports only
+            modules.append((name.strip(), int(cumulative) / 1000))
+    return sorted(modules, key=lambda m: -m[1])[:top]
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--targets", nargs="+", choices=list(TARGETS), default=list(TARGETS))
+    parser.add_argument("--repeats", type=int, default=5)
+    parser.add_argument("--top", type=int, default=5, help="Slowest top-level imports listed per target")
+    parser.add_argument("--budget", type=float, default=None, help="Exit 1 if any target takes longer (seconds)")
+    parser.add_argument("--output", default=None)
+    args = parser.parse_args()
+
+    baseline, _, _ = wall_time(["-c", "pass"], args.repeats)
+    print(f"Bare interpreter: {baseline * 1000:.0f} ms")
+    rows = []
+    for label in args.targets:
+        seconds, returncode, stderr = wall_time(TARGETS[label], args.repeats)
+        slowest = slowest_imports(TARGETS[label], args.top)
+        rows.append({"target": label, "seconds": seconds, "returncode": returncode,
+                     "slowest_imports": [{"module": m, "ms": ms} for m, ms in slowest]})
+        status = "" if returncode == 0 else f"  (exit {returncode}: {stderr.strip().splitlines()[-1]})"
+        print(f"{label:<32} {seconds * 1000:>7.0f} ms  " + ", ".join(f"{m} {ms:.0f}ms" for m, ms in slowest) + status)
+
+    if args.output:
+        os.makedirs(os.path.dirname(args.output) or ".", exist_ok=True)
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump({"python": sys.version.split()[0], "baseline_seconds": baseline, "rows": rows}, f, indent=2)
+        print(f"Saved to {args.output}")
+
+    if args.budget is not None:
+        over = [r["target"] for r in rows if r["seconds"] > args.budget or r["returncode"] != 0]
+        if over:
+            print(f"Over the {args.budget:.2f}s budget or failing: {', '.join(over)}")
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
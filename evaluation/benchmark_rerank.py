@@ -0,0 +1,134 @@
+"""Latency / quality trade-off of cross-encoder re-ranking on the eval questions.
+
+For every question the bi-encoder over-fetches `--fetch_k` passages; the top-k of that list
+(baseline) is compared with the cross-encoder's top-k at several k. The eval set has no passage
+relevance labels, so quality is answer-term coverage: the fraction of the gold answer's content
+words (for MCQ, the text of the correct option) that appear in the retrieved context. Context
+size is reported in words, to show how far k can shrink for the same coverage.
+
+Re-ranking latency is measured per question with a cold score cache; the share of questions
+that fit under each `--budgets_ms` value is what `--rerank_budget_ms` would re-rank in run_eval.
+
+Usage:
+python -m evaluation.benchmark_rerank
+python -m evaluation.benchmark_rerank --fetch_k 30 --ks 1 2 3 5 --output evaluation/run_logs/rerank_benchmark.json
+"""
+
+import argparse
+import json
+import os
+import re
+import time
+
+import numpy as np
+
+from evaluation.rag_utils import load_index
+from evaluation.reranker import DEFAULT_FETCH_K, DEFAULT_RERANK_MODEL, CrossEncoderReranker
+
+EVAL_DATA_PATH = "evaluation/physics_questions_50.json"
+OUTPUT_PATH = "evaluation/run_logs/rerank_benchmark.json"
+STOPWORDS = {
+    "the", "and", "for", "are", "that", "this", "with", "from", "its", "has", "have", "was", "were",
+    "which", "while", "what", "how", "not", "but", "can", "into", "than", "then", "also", "when", "they",
+}
+
+
+def gold_text(q):
+    """Correct option text for MCQ ('(C) Kilogram' -> 'Kilogram'), the reference answer otherwise."""
+    if q["type"] == "mcq":
+        m = re.search(rf"\({re.escape(q['answer'].strip())}\)\s*([^\n]+)", q["question"])
+        if m:
+            return m.group(1)
+    return q["answer"]
+
+
+def content_words(text):
+    return {w for w in re.findall(r"[a-z0-9]+(?:\.[0-9]+)?", text.lower()) if (len(w) > 2 or w[0].isdigit()) and w not in STOPWORDS}
+
+
+def coverage(gold_words, docs):
+    if not gold_words:
+        return None
+    found = content_words(" ".join(text for _, _, text in docs))
+    return len(gold_words & found) / len(gold_words)
+
+
+def percentiles(values):
+    arr = np.asarray(values)
+    return {"p50_ms": float(np.percentile(arr, 50)), "p95_ms": float(np.percentile(arr, 95)), "mean_ms": float(arr.mean())}
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--eval_file", default=EVAL_DATA_PATH)
+    parser.add_argument("--model", default=DEFAULT_RERANK_MODEL, help="Cross-encoder HF ID")
+    parser.add_argument("--fetch_k", type=int, default=DEFAULT_FETCH_K)
+    parser.add_argument("--ks", type=int, nargs="+", default=[1, 2, 3, 5])
+    parser.add_argument("--batch_size", type=int, default=32)
+    parser.add_argument("--budgets_ms", type=float, nargs="+", default=[10, 25, 50, 100])
+    parser.add_argument("--output", default=OUTPUT_PATH)
+    args = parser.parse_args()
+
+    with open(args.eval_file, "r") as f:
+        questions = json.load(f)
+    db = load_index()
+    reranker = CrossEncoderReranker(args.model, fetch_k=args.fetch_k, batch_size=args.batch_size)
+    reranker.score("warm-up", ["warm-up passage"])
+
+    retrieve_ms, rerank_ms = [], []
+    cov = {"baseline": {k: [] for k in args.ks}, "reranked": {k: [] for k in args.ks}}
+    words = {"baseline": {k: [] for k in args.ks}, "reranked": {k: [] for k in args.ks}}
+    for q in questions:
+        start = time.perf_counter()
+        candidates = db.retrieve(q["question"], k=args.fetch_k)
+        retrieve_ms.append((time.perf_counter() - start) * 1000)
+
+        reranker.cache.clear()
+        start = time.perf_counter()
+        reranked = reranker.rerank(q["question"], candidates, args.fetch_k)
+        rerank_ms.append((time.perf_counter() - start) * 1000)
+
+        gold = content_words(gold_text(q))
+        for name, ranked in (("baseline", candidates), ("reranked", reranked)):
+            for k in args.ks:
+                c = coverage(gold, ranked[:k])
+                if c is not None:
+                    cov[name][k].append(c)
+                words[name][k].append(sum(len(text.split()) for _, _, text in ranked[:k]))
+
+    report = {
+        "questions": len(questions),
+        "rerank_model": args.model,
+        "fetch_k": args.fetch_k,
+        "retrieve_latency": percentiles(retrieve_ms),
+        "rerank_latency": percentiles(rerank_ms),
+        "rerank_within_budget": {str(b): float(np.mean(np.asarray(rerank_ms) <= b)) for b in args.budgets_ms},
+        "by_k": {
+            str(k): {
+                name: {"answer_coverage": float(np.mean(cov[name][k])), "context_words": float(np.mean(words[name][k]))}
+                for name in ("baseline", "reranked")
+            }
+            for k in args.ks
+        },
+    }
+
+    print(f"Bi-encoder top-{args.fetch_k}: p50 {report['retrieve_latency']['p50_ms']:.1f} ms, "
+          f"p95 {report['retrieve_latency']['p95_ms']:.1f} ms")
+    print(f"Cross-encoder re-rank:  p50 {report['rerank_latency']['p50_ms']:.1f} ms, "
+          f"p95 {report['rerank_latency']['p95_ms']:.1f} ms")
+    print("Re-ranked within budget: " + ", ".join(f"{b:g} ms: {v:.0%}" for b, v in
+                                                  zip(args.budgets_ms, report["rerank_within_budget"].values())))
+    print(f"\n{'k':>3} {'coverage (bi)':>14} {'coverage (rr)':>14} {'words (bi)':>11} {'words (rr)':>11}")
+    for k in args.ks:
+        row = report["by_k"][str(k)]
+        print(f"{k:>3} {row['baseline']['answer_coverage']:>14.3f} {row['reranked']['answer_coverage']:>14.3f} "
+              f"{row['baseline']['context_words']:>11.1f} {row['reranked']['context_words']:>11.1f}")
+
+    os.makedirs(os.path.dirname(args.output) or ".", exist_ok=True)
+    with open(args.output, "w", encoding="utf-8") as f:
+        json.dump(report, f, indent=2)
+    print(f"\nSaved to {args.output}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,236 @@
+"""Retrieval benchmark: build time, memory, QPS, latency and recall@k of every retrieval backend.
+
+Backends are the RAGIndex storage types with dense retrieval (float32, float16, int8, binary) and
+the lexical modes on a float32 index (bm25, hybrid). Each is built at every `--sizes` corpus size
+(1k to 1M documents at the MiniLM dimension, 384) and queried one query at a time through
+RAGIndex.retrieve, the path run_eval uses, giving p50 / p99 latency and QPS; dense backends are
+also timed on the whole query batch (`batch_qps`, as benchmark_storage.py does).
+
+Query embeddings are computed up front and handed to the index through a lookup embedder, so the
+numbers are search only; evaluation/embedders.py measures the embedding side.
+
+Recall@k is the overlap of a backend's top-k with exact float32 inner-product search
+(faiss.IndexFlatIP). Memory is what the index keeps resident: faiss codes, plus the BM25 postings
+for bm25 / hybrid (binary storage also keeps float vectors for re-scoring, memory-mapped from disk
+in a saved index and not counted, as in benchmark_storage.py).
+
+Corpora:
+- synthetic (default): clustered vectors (benchmark_storage.synthetic_vectors) with Zipf-distributed
+  texts (bm25.synthetic_corpus). Texts and vectors are unrelated, so bm25 / hybrid recall is not
+  reported; their latency and memory are.
+- `--index_dir`: the first N documents of a built float32 index. Queries are the `--eval_file`
+  questions embedded with `--embedding_backend`, or perturbed documents with `--perturbed_queries`
+  (no embedding model needed).
+
+`--output` writes the rows as JSON; `--baseline` compares against an earlier output and exits 1 when
+QPS, p99 or recall regressed by more than `--tolerance`.
+
+Usage:
+python -m evaluation.benchmark_retrieval --output evaluation/run_logs/retrieval_benchmark.json
+python -m evaluation.benchmark_retrieval --sizes 1000 10000 100000 1000000 --queries 100
+python -m evaluation.benchmark_retrieval --index_dir evaluation/rag_index --sizes 1000 10000
+python -m evaluation.benchmark_retrieval --baseline evaluation/run_logs/retrieval_benchmark.json --tolerance 0.2
+"""
+
+import argparse
+import json
+import os
+import platform
+import sys
+import time
+
+import faiss
+import numpy as np
+
+from evaluation.benchmark_storage import index_vectors, resident_bytes, synthetic_vectors
+from evaluation.bm25 import synthetic_corpus
+from evaluation.rag import STORAGE_TYPES, RAGIndex, search_vectors
+
+LEXICAL_MODES = ("bm25", "hybrid")
+BACKENDS = STORAGE_TYPES + LEXICAL_MODES
+DEFAULT_SIZES = [1_000, 10_000, 100_000]
+MINILM_DIM = 384
+
+
+class PrecomputedEmbedder:
+    """Query text -> its precomputed embedding, standing in for the embedding model."""
+
+    def __init__(self, texts, vectors):
+        self.vectors = dict(zip(texts, vectors))
+
+    def encode(self, texts, batch_size=None):
+        return np.stack([self.vectors[t] for t in texts])
+
+
+def synthetic_dataset(n, dim, n_queries):
+    vectors, queries = synthetic_vectors(n, dim, n_queries)
+    texts, rng = synthetic_corpus(n)
+    # A query's words come from one document; the suffix keeps query texts unique for the lookup
+    query_texts = [" ".join(texts[i].split()[:5]) + f" q{j}" for j, i in enumerate(rng.integers(0, n, n_queries))]
+    return vectors, texts, queries, query_texts
+
+
+def index_corpus(index_dir, n_queries, eval_file=None, embedding_backend="torch"):
+    """(vectors, texts, query vectors, query texts) of a built index; queries from `eval_file` or perturbed docs."""
+    rag = RAGIndex.load(index_dir, embedding_backend)
+    texts = [rag.id_to_text[i] for i in range(len(rag))]
+    if eval_file:
+        vectors = rag.index.reconstruct_n(0, rag.index.ntotal)
+        with open(eval_file, "r", encoding="utf-8") as f:
+            query_texts = list(dict.fromkeys(q["question"] for q in json.load(f)))[:n_queries]
+        return vectors, texts, np.asarray(rag.encode(query_texts), dtype=np.float32), query_texts
+    vectors, queries = index_vectors(index_dir, n_queries)
+    return vectors, texts, queries, [f"query {i}" for i in range(len(queries))]
+
+
+def bm25_bytes(bm25):
+    return sum(a.nbytes for a in (bm25.indptr, bm25.doc_ids, bm25.tfs, bm25.doc_len, bm25.idf, bm25.weights))
+
+
+def build(backend, vectors, texts):
+    """(RAGIndex, build seconds) for `backend`; lexical backends also build BM25 over `texts`."""
+    rag = RAGIndex(storage=backend if backend in STORAGE_TYPES else "float32")
+    start = time.perf_counter()
+    rag.add(texts, vectors)
+    if backend in LEXICAL_MODES:
+        rag.build_lexical()
+    else:
+        rag.flush_vectors()
+    return rag, time.perf_counter() - start
+
+
+def recall_at(found, exact, ks):
+    return {str(k): float(np.mean([len(set(f[:k]) & set(e[:k])) / k for f, e in zip(found, exact)])) for k in ks}
+
+
+def bench_backend(backend, vectors, texts, queries, query_texts, exact, ks, with_recall):
+    rag, build_s = build(backend, vectors, texts)
+    rag._embedder = PrecomputedEmbedder(query_texts, queries)
+    mode = backend if backend in LEXICAL_MODES else "dense"
+    max_k = max(ks)
+
+    rag.retrieve(query_texts[0], k=max_k, mode=mode)  # warm-up
+    latencies, found = [], []
+    for text in query_texts:
+        start = time.perf_counter()
+        hits = rag.retrieve(text, k=max_k, mode=mode)
+        latencies.append(time.perf_counter() - start)
+        found.append([idx for idx, _, _ in hits])
+
+    memory = resident_bytes(rag) + (bm25_bytes(rag.bm25) if rag.bm25 is not None else 0)
+    row = {
+        "backend": backend,
+        "size": len(vectors),
+        "build_s": build_s,
+        "memory_mb": memory / 2**20,
+        "bytes_per_doc": memory / len(vectors),
+        "qps": len(query_texts) / sum(latencies),
+        "p50_ms": float(np.percentile(latencies, 50) * 1000),
+        "p99_ms": float(np.percentile(latencies, 99) * 1000),
+        "batch_qps": None,
+        "recall": recall_at(found, exact, ks) if with_recall else None,
+    }
+    if mode == "dense":
+        start = time.perf_counter()
+        search_vectors(rag, queries, max_k)
+        row["batch_qps"] = len(queries) / (time.perf_counter() - start)
+    return row
+
+
+def regressions(rows, baseline, tolerance):
+    """Rows of `rows` slower, higher-latency or less accurate than the same (size, backend) of `baseline`."""
+    base = {(r["size"], r["backend"]): r for r in baseline["rows"]}
+    found = []
+    for r in rows:
+        b = base.get((r["size"], r["backend"]))
+        if b is None:
+            continue
+        reasons = []
+        if r["qps"] < b["qps"] * (1 - tolerance):
+            reasons.append(f"QPS {b['qps']:.0f} -> {r['qps']:.0f}")
+        if r["p99_ms"] > b["p99_ms"] * (1 + tolerance):
+            reasons.append(f"p99 {b['p99_ms']:.2f} -> {r['p99_ms']:.2f} ms")
+        for k, value in (r["recall"] or {}).items():
+            if b["recall"] and k in b["recall"] and value < b["recall"][k] - 0.01:
+                reasons.append(f"R@{k} {b['recall'][k]:.3f} -> {value:.3f}")
+        if reasons:
+            found.append(f"{r['backend']} @ {r['size']}: " + ", ".join(reasons))
+    return found
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--sizes", type=int, nargs="+", default=DEFAULT_SIZES, help="Corpus sizes (documents)")
+    parser.add_argument("--backends", nargs="+", choices=BACKENDS, default=list(BACKENDS))
+    parser.add_argument("--dim", type=int, default=MINILM_DIM, help="Synthetic vector dimension")
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--k", type=int, nargs="+", default=[1, 5, 10])
+    parser.add_argument("--index_dir", default=None, help="Built float32 index to take documents from instead of synthetic data")
+    parser.add_argument("--eval_file", default="evaluation/physics_questions_50.json", help="Questions used as queries with --index_dir")
+    parser.add_argument("--perturbed_queries", action="store_true", help="With --index_dir: query with perturbed documents instead")
+    parser.add_argument("--embedding_backend", choices=["torch", "onnx", "onnx-int8"], default="torch")
+    parser.add_argument("--threads", type=int, default=None, help="faiss OpenMP threads (default: all cores)")
+    parser.add_argument("--output", default=None, help="Write results as JSON")
+    parser.add_argument("--baseline", default=None, help="Earlier --output to compare against; exit 1 on regressions")
+    parser.add_argument("--tolerance", type=float, default=0.2, help="Allowed relative QPS / p99 change vs --baseline")
+    args = parser.parse_args()
+
+    if args.threads:
+        faiss.omp_set_num_threads(args.threads)
+    if args.index_dir:
+        eval_file = None if args.perturbed_queries else args.eval_file
+        all_vectors, all_texts, queries, query_texts = index_corpus(args.index_dir, args.queries, eval_file,
+                                                                    args.embedding_backend)
+        source = args.index_dir
+        sizes = sorted({min(n, len(all_vectors)) for n in args.sizes})
+    else:
+        source = f"synthetic (dim {args.dim})"
+        sizes = sorted(set(args.sizes))
+    with_lexical_recall = args.index_dir is not None
+
+    rows = []
+    print(f"{'size':>8} {'backend':<8} {'build s':>8} {'MB':>9} {'QPS':>9} {'batch QPS':>10} {'p50 ms':>8} {'p99 ms':>8} "
+          + " ".join(f"{'R@' + str(k):>6}" for k in args.k))
+    for size in sizes:
+        if args.index_dir:
+            vectors, texts = all_vectors[:size], all_texts[:size]
+        else:
+            vectors, texts, queries, query_texts = synthetic_dataset(size, args.dim, args.queries)
+        flat = faiss.IndexFlatIP(vectors.shape[1])
+        flat.add(vectors)
+        _, exact = flat.search(queries, max(args.k))
+        del flat
+        for backend in args.backends:
+            row = bench_backend(backend, vectors, texts, queries, query_texts, exact, args.k,
+                                with_recall=backend in STORAGE_TYPES or with_lexical_recall)
+            rows.append(row)
+            recall = " ".join(f"{row['recall'][str(k)]:>6.3f}" if row["recall"] else f"{'-':>6}" for k in args.k)
+            batch = f"{row['batch_qps']:>10.0f}" if row["batch_qps"] else f"{'-':>10}"
+            print(f"{size:>8} {backend:<8} {row['build_s']:>8.2f} {row['memory_mb']:>9.2f} {row['qps']:>9.0f} {batch} "
+                  f"{row['p50_ms']:>8.3f} {row['p99_ms']:>8.3f} {recall}")
+
+    result = {
+        "source": source,
+        "queries": len(query_texts),
+        "k": args.k,
+        "environment": {"python": sys.version.split()[0], "numpy": np.__version__, "faiss": faiss.__version__,
+                        "machine": platform.machine(), "cpus": os.cpu_count(), "threads": args.threads},
+        "rows": rows,
+    }
+    if args.output:
+        os.makedirs(os.path.dirname(args.output) or ".", exist_ok=True)
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(result, f, indent=2)
+        print(f"Saved to {args.output}")
+
+    if args.baseline:
+        with open(args.baseline, "r", encoding="utf-8") as f:
+            found = regressions(rows, json.load(f), args.tolerance)
+        if found:
+            print("Regressions vs " + args.baseline + ":\n  " + "\n  ".join(found))
+            sys.exit(1)
+        print(f"No regressions vs {args.baseline} (tolerance {args.tolerance:.0%})")
+
+
+if __name__ == "__main__":
+    main()
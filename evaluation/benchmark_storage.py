@@ -0,0 +1,116 @@
+"""Recall vs memory of the RAG index storage types (evaluation/rag.py STORAGE_TYPES).
+
+Every storage type is built from the same vectors and queried with the same queries; recall@k
+is the overlap of its top-k with exact float32 inner-product search. Memory is what stays
+resident per index (binary storage also keeps float32 vectors on disk, memory-mapped and read
+only for re-scored candidates).
+
+Vectors come from a built float32 index (`--index_dir`; queries are documents perturbed with
+noise, standing in for paraphrased questions) or from a synthetic clustered set (`--synthetic N`).
+
+Usage:
+python -m evaluation.benchmark_storage --index_dir evaluation/rag_index
+python -m evaluation.benchmark_storage --synthetic 100000 --output evaluation/run_logs/storage_benchmark.json
+"""
+
+import argparse
+import json
+import os
+import time
+
+import faiss
+import numpy as np
+
+from evaluation.rag import RESCORE_FACTOR, STORAGE_TYPES, RAGIndex, search_vectors
+
+
+def normalize(x):
+    return (x / np.linalg.norm(x, axis=1, keepdims=True)).astype(np.float32)
+
+
+def synthetic_vectors(n, dim, n_queries, clusters=256, seed=0):
+    rng = np.random.default_rng(seed)
+    centers = rng.standard_normal((clusters, dim)).astype(np.float32)
+    def sample(m):
+        return normalize(centers[rng.integers(0, clusters, m)] + 0.6 * rng.standard_normal((m, dim)).astype(np.float32))
+    return sample(n), sample(n_queries)
+
+
+def index_vectors(index_dir, n_queries, noise=0.05, seed=0):
+    rag = RAGIndex.load(index_dir)
+    if rag.storage != "float32":
+        raise ValueError(f"{index_dir} uses {rag.storage} storage; point --index_dir at a float32 index")
+    vectors = rag.index.reconstruct_n(0, rag.index.ntotal)
+    rng = np.random.default_rng(seed)
+    picks = vectors[rng.integers(0, len(vectors), n_queries)]
+    return vectors, normalize(picks + noise * rng.standard_normal(picks.shape).astype(np.float32))
+
+
+def resident_bytes(rag):
+    if rag.storage == "binary":
+        return rag.index.ntotal * rag.index.code_size
+    return rag.index.ntotal * rag.index.sa_code_size()
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--index_dir", default=None, help="Built float32 index to take vectors from")
+    parser.add_argument("--synthetic", type=int, default=None, help="Use N synthetic clustered vectors instead")
+    parser.add_argument("--dim", type=int, default=384)
+    parser.add_argument("--queries", type=int, default=500)
+    parser.add_argument("--k", type=int, nargs="+", default=[1, 5, 10])
+    parser.add_argument("--rescore_factor", type=int, default=RESCORE_FACTOR, help="Binary: Hamming candidates per result")
+    parser.add_argument("--output", default=None)
+    args = parser.parse_args()
+
+    if args.synthetic:
+        vectors, queries = synthetic_vectors(args.synthetic, args.dim, args.queries)
+        source = f"synthetic ({args.synthetic} x {args.dim})"
+    else:
+        vectors, queries = index_vectors(args.index_dir or "evaluation/rag_index", args.queries)
+        source = args.index_dir or "evaluation/rag_index"
+    max_k = max(args.k)
+    flat = faiss.IndexFlatIP(vectors.shape[1])
+    flat.add(vectors)
+    _, exact = flat.search(queries, max_k)
+
+    rows = []
+    for storage in STORAGE_TYPES:
+        rag = RAGIndex(storage=storage)
+        rag.rescore_factor = args.rescore_factor
+        start = time.perf_counter()
+        rag.add([""] * len(vectors), vectors)
+        rag.flush_vectors()
+        build_s = time.perf_counter() - start
+
+        start = time.perf_counter()
+        _, found = search_vectors(rag, queries, max_k)
+        search_s = time.perf_counter() - start
+        recall = {str(k): float(np.mean([len(set(found[i, :k]) & set(exact[i, :k])) / k for i in range(len(queries))]))
+                  for k in args.k}
+        rows.append({
+            "storage": storage,
+            "resident_mb": resident_bytes(rag) / 2**20,
+            "bytes_per_vector": resident_bytes(rag) / len(vectors),
+            "build_s": build_s,
+            "qps": len(queries) / search_s,
+            "recall": recall,
+        })
+
+    print(f"Vectors: {source}, {len(queries)} queries (binary re-scores {args.rescore_factor}x k candidates)")
+    header = f"{'storage':<8} {'MB':>8} {'B/vec':>7} {'QPS':>9} " + " ".join(f"{'R@' + str(k):>7}" for k in args.k)
+    print(header)
+    for r in rows:
+        print(f"{r['storage']:<8} {r['resident_mb']:>8.2f} {r['bytes_per_vector']:>7.0f} {r['qps']:>9.0f} "
+              + " ".join(f"{r['recall'][str(k)]:>7.3f}" for k in args.k))
+
+    if args.output:
+        os.makedirs(os.path.dirname(args.output) or ".", exist_ok=True)
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump({"source": source, "queries": len(queries), "rescore_factor": args.rescore_factor, "rows": rows},
+                      f, indent=2)
+        print(f"Saved to {args.output}")
+
+
+if __name__ == "__main__":
+    main()
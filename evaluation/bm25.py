@@ -0,0 +1,173 @@
+"""Lexical BM25 index stored as numpy CSR postings, plus reciprocal-rank fusion.
+
+Physics questions hinge on exact terms and symbols ("SI base unit", "kilogram", "9.8 m/s^2")
+that sentence embeddings blur, so RAGIndex keeps this index next to the FAISS one and can fuse
+the two rankings.
+
+Layout: `indptr[t]:indptr[t+1]` slices `doc_ids` / `tfs` for term id t (postings sorted by doc).
+The BM25 term weight of every posting is query-independent and precomputed at build/load time,
+so a query is a gather of its terms' postings plus one bincount over the candidate set (or a
+dense accumulator when common terms touch a large share of the corpus).
+
+Usage (synthetic latency check):
+python -m evaluation.bm25 --bench 1000000
+"""
+
+import argparse
+import re
+import time
+from typing import Dict, List, Sequence, Tuple
+
+import numpy as np
+
+# Numbers and unit expressions stay whole ("9.8", "m/s^2"); their pieces are indexed too
+_TOKEN = re.compile(r"[a-z0-9]+(?:[./^*][a-z0-9]+)*")
+_PIECE = re.compile(r"[a-z0-9]+")
+RRF_K = 60
+
+
+def tokenize(text: str) -> List[str]:
+    tokens = []
+    for tok in _TOKEN.findall(text.lower()):
+        tokens.append(tok)
+        if not tok.isalnum():
+            tokens.extend(_PIECE.findall(tok))
+    return tokens
+
+
+class BM25Index:
+    def __init__(self, k1: float = 1.5, b: float = 0.75):
+        self.k1 = k1
+        self.b = b
+        self.vocab: Dict[str, int] = {}
+        self.indptr = np.zeros(1, dtype=np.int64)
+        self.doc_ids = np.zeros(0, dtype=np.int32)
+        self.tfs = np.zeros(0, dtype=np.float32)
+        self.doc_len = np.zeros(0, dtype=np.float32)
+        self.idf = np.zeros(0, dtype=np.float32)
+        self.weights = np.zeros(0, dtype=np.float32)
+
+    def __len__(self):
+        return len(self.doc_len)
+
+    def build(self, texts: Sequence[str]):
+        vocab = {}
+        term_ids, doc_ids, doc_len = [], [], np.zeros(len(texts), dtype=np.float32)
+        for d, text in enumerate(texts):
+            toks = tokenize(text)
+            doc_len[d] = len(toks)
+            ids = [vocab.setdefault(t, len(vocab)) for t in toks]
+            term_ids.append(np.asarray(ids, dtype=np.int64))
+            doc_ids.append(np.full(len(ids), d, dtype=np.int64))
+        terms = np.concatenate(term_ids) if term_ids else np.zeros(0, dtype=np.int64)
+        docs = np.concatenate(doc_ids) if doc_ids else np.zeros(0, dtype=np.int64)
+
+        # Collapse (term, doc) occurrences into postings with term frequencies, sorted by term then doc
+        n_docs = max(len(texts), 1)
+        pair = np.unique(terms * n_docs + docs, return_counts=True)
+        keys, counts = pair
+        post_terms = keys // n_docs
+        self.vocab = vocab
+        self.doc_ids = (keys % n_docs).astype(np.int32)
+        self.tfs = counts.astype(np.float32)
+        self.indptr = np.zeros(len(vocab) + 1, dtype=np.int64)
+        np.cumsum(np.bincount(post_terms, minlength=len(vocab)), out=self.indptr[1:])
+        self.doc_len = doc_len
+        df = np.diff(self.indptr).astype(np.float32)
+        self.idf = np.log1p((len(texts) - df + 0.5) / (df + 0.5)).astype(np.float32)
+        self._compute_weights()
+
+    def _compute_weights(self):
+        # BM25's per-posting term is query-independent, so it is computed once here
+        tf = self.tfs
+        term_of_posting = np.repeat(np.arange(len(self.idf)), np.diff(self.indptr))
+        avgdl = self.doc_len.mean() if len(self.doc_len) else 1.0
+        norm = self.k1 * (1 - self.b + self.b * self.doc_len[self.doc_ids] / (avgdl or 1.0))
+        self.weights = (self.idf[term_of_posting] * tf * (self.k1 + 1) / (tf + norm)).astype(np.float32)
+
+    def search(self, query: str, k: int = 5) -> Tuple[np.ndarray, np.ndarray]:
+        """Returns (doc ids, BM25 scores) of the top-k documents, best first."""
+        term_ids = sorted({self.vocab[t] for t in tokenize(query) if t in self.vocab})
+        if not term_ids or not len(self):
+            return np.zeros(0, dtype=np.int64), np.zeros(0, dtype=np.float32)
+        slices = [slice(self.indptr[t], self.indptr[t + 1]) for t in term_ids]
+        docs = np.concatenate([self.doc_ids[s] for s in slices])
+        weights = np.concatenate([self.weights[s] for s in slices])
+
+        if len(docs) * 8 > len(self):
+            # Common terms touch a large share of the corpus: accumulate densely
+            scores = np.bincount(docs, weights=weights, minlength=len(self))
+            cand = None
+        else:
+            cand, inverse = np.unique(docs, return_inverse=True)
+            scores = np.bincount(inverse, weights=weights)
+        k = min(k, int(np.count_nonzero(scores)))
+        if k == 0:
+            return np.zeros(0, dtype=np.int64), np.zeros(0, dtype=np.float32)
+        top = np.argpartition(-scores, k - 1)[:k]
+        top = top[np.argsort(-scores[top], kind="stable")]
+        ids = top if cand is None else cand[top]
+        return ids.astype(np.int64), scores[top].astype(np.float32)
+
+    def save(self, path: str):
+        terms = np.empty(len(self.vocab), dtype=object)
+        for t, i in self.vocab.items():
+            terms[i] = t
+        np.savez(
+            path,
+            terms=terms.astype(str),
+            indptr=self.indptr,
+            doc_ids=self.doc_ids,
+            tfs=self.tfs,
+            doc_len=self.doc_len,
+            idf=self.idf,
+            params=np.asarray([self.k1, self.b], dtype=np.float64),
+        )
+
+    def load(self, path: str):
+        with np.load(path, allow_pickle=False) as data:
+            self.vocab = {t: i for i, t in enumerate(data["terms"].tolist())}
+            self.indptr = data["indptr"]
+            self.doc_ids = data["doc_ids"]
+            self.tfs = data["tfs"]
+            self.doc_len = data["doc_len"]
+            self.idf = data["idf"]
+            self.k1, self.b = data["params"].tolist()
+        self._compute_weights()
+
+
+def rrf_fuse(rankings: Sequence[Sequence[int]], k: int, rrf_k: int = RRF_K) -> List[Tuple[int, float]]:
+    """Reciprocal-rank fusion: each ranking adds 1 / (rrf_k + rank) to its documents. Returns the top-k (id, score)."""
+    fused = {}
+    for ranking in rankings:
+        for rank, doc_id in enumerate(ranking):
+            fused[int(doc_id)] = fused.get(int(doc_id), 0.0) + 1.0 / (rrf_k + rank + 1)
+    return sorted(fused.items(), key=lambda x: x[1], reverse=True)[:k]
+
+
+def synthetic_corpus(n_docs, vocab_size=50_000, doc_len=60, seed=0):
+    rng = np.random.default_rng(seed)
+    # Zipf-distributed word ids give a realistic mix of very common and rare terms
+    words = np.minimum(rng.zipf(1.2, size=n_docs * doc_len), vocab_size) - 1
+    return [" ".join(f"w{w}" for w in row) for row in words.reshape(n_docs, doc_len)], rng
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--bench", type=int, default=100_000, help="Synthetic corpus size")
+    parser.add_argument("--queries", type=int, default=200)
+    args = parser.parse_args()
+
+    texts, rng = synthetic_corpus(args.bench)
+    start = time.perf_counter()
+    index = BM25Index()
+    index.build(texts)
+    print(f"Built {len(index)} docs, {len(index.vocab)} terms, {len(index.doc_ids)} postings "
+          f"in {time.perf_counter() - start:.1f}s")
+    queries = [" ".join(texts[i].split()[:5]) for i in rng.integers(0, len(texts), args.queries)]
+    latencies = []
+    for q in queries:
+        start = time.perf_counter()
+        index.search(q, k=10)
+        latencies.append((time.perf_counter() - start) * 1000)
+    print(f"Query latency: p50 {np.percentile(latencies, 50):.2f} ms, p99 {np.percentile(latencies, 99):.2f} ms")
@@ -0,0 +1,99 @@
+"""Token-budgeted context assembly for RAG prompts.
+
+Retrieved passages are ordered by score, near-duplicates are dropped (overlapping chunks and
+repeated Q/A pairs retrieve together), and passages are added until the token budget is spent.
+The passage that crosses the budget is cut at the last sentence boundary that still fits, so
+prefill length per RAG question is bounded by the budget whatever the retriever returns.
+
+Tokens are counted with the generating model's tokenizer. Without one (harness.py's placeholder
+models) whitespace-separated words are counted instead.
+"""
+
+import re
+
+DEFAULT_CONTEXT_BUDGET = 1024
+DEFAULT_SEPARATOR = "\n---\n"  # same as prompts.PASSAGE_SEPARATOR
+DUPLICATE_OVERLAP = 0.8  # fraction of a passage's shingles already in a kept passage
+SHINGLE_SIZE = 5
+
+_SENTENCE_END = re.compile(r"(?<=[.!?])\s+")
+_WORD = re.compile(r"\w+")
+
+
+def _token_counts(texts, tokenizer):
+    if not texts:
+        return []
+    if tokenizer is None:
+        return [len(t.split()) for t in texts]
+    return [len(ids) for ids in tokenizer(list(texts), add_special_tokens=False)["input_ids"]]
+
+
+def _shingles(text):
+    words = _WORD.findall(text.lower())
+    if len(words) < SHINGLE_SIZE:
+        return {tuple(words)} if words else set()
+    return {tuple(words[i:i + SHINGLE_SIZE]) for i in range(len(words) - SHINGLE_SIZE + 1)}
+
+
+def split_sentences(text):
+    return [s for s in _SENTENCE_END.split(text.strip()) if s]
+
+
+def build_context(docs, tokenizer=None, budget=DEFAULT_CONTEXT_BUDGET, separator=DEFAULT_SEPARATOR,
+                  overlap_threshold=DUPLICATE_OVERLAP):
+    """
+    `docs` is a list of (id, score, text) as returned by RAGIndex.retrieve.
+    `budget` is in tokens; None means no limit (dedupe and ordering only).
+    Returns (context, info) where info has tokens, passages, duplicates, truncated.
+    """
+    ranked = sorted(docs, key=lambda d: d[1], reverse=True)
+
+    kept, kept_shingles, duplicates = [], [], 0
+    for _, _, text in ranked:
+        text = text.strip()
+        if not text:
+            continue
+        sh = _shingles(text)
+        if any(len(sh & other) >= overlap_threshold * len(sh) for other in kept_shingles):
+            duplicates += 1
+            continue
+        kept.append(text)
+        kept_shingles.append(sh)
+
+    passages, truncated = kept, False
+    if budget is not None:
+        sep_tokens = _token_counts([separator], tokenizer)[0]
+        passages, used = [], 0
+        for text, n in zip(kept, _token_counts(kept, tokenizer)):
+            cost = n + (sep_tokens if passages else 0)
+            if used + cost <= budget:
+                passages.append(text)
+                used += cost
+                continue
+            # Fit as many whole sentences of this passage as the remaining budget allows
+            truncated = True
+            sentences = split_sentences(text)
+            room = budget - used - (sep_tokens if passages else 0)
+            heads = [" ".join(sentences[:i + 1]) for i in range(len(sentences))]
+            fit = sum(1 for n in _token_counts(heads, tokenizer) if n <= room)
+            if fit:
+                passages.append(" ".join(sentences[:fit]))
+            break
+
+        # Pieces counted separately can merge differently once joined; trim until the whole fits
+        while passages and _token_counts([separator.join(passages)], tokenizer)[0] > budget:
+            truncated = True
+            sentences = split_sentences(passages[-1])
+            if len(sentences) > 1:
+                passages[-1] = " ".join(sentences[:-1])
+            else:
+                passages.pop()
+
+    context = separator.join(passages)
+    info = {
+        "tokens": _token_counts([context], tokenizer)[0] if context else 0,
+        "passages": len(passages),
+        "duplicates": duplicates,
+        "truncated": truncated,
+    }
+    return context, info
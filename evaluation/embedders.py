@@ -0,0 +1,183 @@
+"""Pluggable sentence-embedding backends for RAG indexing and queries.
+
+- "torch": SentenceTransformer in eager PyTorch (the original path)
+- "onnx": the same encoder exported to ONNX and run with ONNX Runtime
+- "onnx-int8": the ONNX export with dynamic int8 quantization of its MatMul weights
+
+ONNX exports are cached under .cache/onnx/<model>/ and reused; exporting needs torch once, running
+needs only onnxruntime + tokenizers. The ONNX path reproduces MiniLM's sentence-transformers
+head (mean pooling over the attention mask, then L2 normalization); `parity_check` compares any
+backend against the PyTorch embeddings and should be run once per model/backend pair.
+
+`threads` caps intra-op threads (torch.set_num_threads / ORT intra_op_num_threads), so several
+index-build workers or an eval process sharing the box do not oversubscribe cores.
+
+Usage:
+python -m evaluation.embedders --backend onnx-int8 --threads 4          # parity + throughput vs torch
+python -m evaluation.embedders --backend onnx --sample 2000 --batch_size 64
+"""
+
+import argparse
+import json
+import os
+import time
+
+import numpy as np
+
+ONNX_CACHE_DIR = ".cache/onnx"
+EMBEDDING_BACKENDS = ("torch", "onnx", "onnx-int8")
+DEFAULT_BATCH_SIZE = 64
+
+
+class TorchEmbedder:
+    def __init__(self, model_name, threads=None, device=None):
+        from sentence_transformers import SentenceTransformer
+
+        if threads:
+            import torch
+            torch.set_num_threads(threads)
+        self.model = SentenceTransformer(model_name, device=device)
+
+    def encode(self, texts, batch_size=DEFAULT_BATCH_SIZE):
+        return self.model.encode(texts, batch_size=batch_size, convert_to_numpy=True, normalize_embeddings=True)
+
+
+def onnx_paths(model_name, cache_dir=ONNX_CACHE_DIR):
+    model_dir = os.path.join(cache_dir, model_name.replace("/", "__"))
+    return model_dir, os.path.join(model_dir, "model.onnx"), os.path.join(model_dir, "model.int8.onnx")
+
+
+def export_onnx(model_name, cache_dir=ONNX_CACHE_DIR, quantize=False):
+    """Exports the transformer under `model_name` to ONNX (and an int8 copy); returns the model path."""
+    model_dir, fp32_path, int8_path = onnx_paths(model_name, cache_dir)
+    if not os.path.exists(fp32_path):
+        import torch
+        from transformers import AutoModel, AutoTokenizer
+
+        os.makedirs(model_dir, exist_ok=True)
+        tokenizer = AutoTokenizer.from_pretrained(model_name)
+        model = AutoModel.from_pretrained(model_name).eval()
+        sample = tokenizer(["export sample"], return_tensors="pt")
+        input_names = list(sample.keys())
+        dynamic_axes = {name: {0: "batch", 1: "seq"} for name in input_names}
+        dynamic_axes["last_hidden_state"] = {0: "batch", 1: "seq"}
+        tmp_path = fp32_path + ".tmp"
+        with torch.no_grad():
+            torch.onnx.export(
+                model, tuple(sample[name] for name in input_names), tmp_path,
+                input_names=input_names, output_names=["last_hidden_state"],
+                dynamic_axes=dynamic_axes, opset_version=14,
+            )
+        os.replace(tmp_path, fp32_path)
+        tokenizer.save_pretrained(model_dir)
+        with open(os.path.join(model_dir, "export.json"), "w", encoding="utf-8") as f:
+            json.dump({"model_name": model_name, "inputs": input_names, "pooling": "mean", "normalize": True}, f, indent=2)
+    if quantize and not os.path.exists(int8_path):
+        from onnxruntime.quantization import QuantType, quantize_dynamic
+        quantize_dynamic(fp32_path, int8_path, weight_type=QuantType.QInt8)
+    return int8_path if quantize else fp32_path
+
+
+class OnnxEmbedder:
+    def __init__(self, model_name, threads=None, quantize=False, cache_dir=ONNX_CACHE_DIR, max_length=256):
+        import onnxruntime as ort
+        from transformers import AutoTokenizer
+
+        path = export_onnx(model_name, cache_dir, quantize)
+        options = ort.SessionOptions()
+        options.graph_optimization_level = ort.GraphOptimizationLevel.ORT_ENABLE_ALL
+        if threads:
+            options.intra_op_num_threads = threads
+        self.session = ort.InferenceSession(path, options, providers=["CPUExecutionProvider"])
+        self.input_names = [i.name for i in self.session.get_inputs()]
+        self.tokenizer = AutoTokenizer.from_pretrained(os.path.dirname(path))
+        self.max_length = max_length  # all-MiniLM-L6-v2 truncates at 256 word pieces
+
+    def _encode_batch(self, texts):
+        enc = self.tokenizer(texts, padding=True, truncation=True, max_length=self.max_length, return_tensors="np")
+        feeds = {name: enc[name].astype(np.int64) for name in self.input_names}
+        hidden = self.session.run(None, feeds)[0]
+        mask = enc["attention_mask"][..., None].astype(np.float32)
+        pooled = (hidden * mask).sum(axis=1) / np.maximum(mask.sum(axis=1), 1e-9)
+        return pooled / np.maximum(np.linalg.norm(pooled, axis=1, keepdims=True), 1e-12)
+
+    def encode(self, texts, batch_size=DEFAULT_BATCH_SIZE):
+        if not texts:
+            return np.zeros((0, self.session.get_outputs()[0].shape[-1]), dtype=np.float32)
+        # Length-sorted batches pad less; results are put back in input order
+        order = np.argsort([len(t) for t in texts])
+        out = [None] * len(texts)
+        for i in range(0, len(texts), batch_size):
+            idx = order[i:i + batch_size]
+            for j, vec in zip(idx, self._encode_batch([texts[j] for j in idx])):
+                out[j] = vec
+        return np.stack(out).astype(np.float32)
+
+
+def get_embedder(backend, model_name, threads=None):
+    if backend == "torch":
+        return TorchEmbedder(model_name, threads)
+    if backend in ("onnx", "onnx-int8"):
+        return OnnxEmbedder(model_name, threads, quantize=backend == "onnx-int8")
+    raise ValueError(f"Unknown embedding backend '{backend}'; expected one of {EMBEDDING_BACKENDS}")
+
+
+def parity_check(reference, candidate, texts, k=10):
+    """
+    Cosine similarity between each text's reference and candidate embedding, and how often the
+    candidate's top-k neighbours among `texts` (first text of each pair as query) match the reference's.
+    """
+    a, b = reference.encode(texts), candidate.encode(texts)
+    cos = (a * b).sum(axis=1)
+    k = min(k, len(texts) - 1)
+    top_a = np.argsort(-(a @ a.T), axis=1)[:, 1:k + 1]
+    top_b = np.argsort(-(b @ b.T), axis=1)[:, 1:k + 1]
+    overlap = np.mean([len(set(x) & set(y)) / k for x, y in zip(top_a, top_b)]) if k > 0 else 1.0
+    return {"cosine_min": float(cos.min()), "cosine_mean": float(cos.mean()), f"top{k}_overlap": float(overlap)}
+
+
+def throughput(embedder, texts, batch_size, queries):
+    embedder.encode(texts[:batch_size], batch_size)  # warm-up
+    start = time.perf_counter()
+    embedder.encode(texts, batch_size)
+    docs_per_sec = len(texts) / (time.perf_counter() - start)
+    latencies = []
+    for q in queries:
+        start = time.perf_counter()
+        embedder.encode([q], 1)
+        latencies.append((time.perf_counter() - start) * 1000)
+    return {"docs_per_sec": docs_per_sec, "query_p50_ms": float(np.percentile(latencies, 50)),
+            "query_p95_ms": float(np.percentile(latencies, 95))}
+
+
+def main():
+    from evaluation.rag import DEFAULT_EMBEDDING_MODEL
+    from rag_pipeline.corpora import load_corpus
+
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--backend", choices=EMBEDDING_BACKENDS, default="onnx-int8")
+    parser.add_argument("--model", default=DEFAULT_EMBEDDING_MODEL)
+    parser.add_argument("--threads", type=int, default=None)
+    parser.add_argument("--corpus", default="alpaca-qa")
+    parser.add_argument("--sample", type=int, default=1000, help="Corpus documents used for parity and throughput")
+    parser.add_argument("--batch_size", type=int, default=DEFAULT_BATCH_SIZE)
+    parser.add_argument("--eval_file", default="evaluation/physics_questions_50.json")
+    args = parser.parse_args()
+
+    texts = load_corpus(args.corpus)[0][:args.sample]
+    with open(args.eval_file, "r") as f:
+        queries = [q["question"] for q in json.load(f)]
+
+    reference = get_embedder("torch", args.model, args.threads)
+    candidate = get_embedder(args.backend, args.model, args.threads)
+    parity = parity_check(reference, candidate, texts[:500])
+    print(f"Parity vs torch ({args.backend}): " + ", ".join(f"{k} {v:.4f}" for k, v in parity.items()))
+
+    for name, embedder in (("torch", reference), (args.backend, candidate)):
+        t = throughput(embedder, texts, args.batch_size, queries)
+        print(f"{name:<10} {t['docs_per_sec']:>8.0f} docs/sec   query p50 {t['query_p50_ms']:.1f} ms  "
+              f"p95 {t['query_p95_ms']:.1f} ms")
+
+
+if __name__ == "__main__":
+    main()
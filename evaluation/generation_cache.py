@@ -0,0 +1,63 @@
+"""Persistent cache of generated answers, so re-grading never re-runs the model.
+
+An entry is keyed by a hash of everything that determines the generation:
+
+- the model: base model ID, quantization and dtype (plus a content hash for local checkpoints,
+  e.g. merged models)
+- the adapter's content hash (None for the base model)
+- the full prompt's token IDs, so template, retrieved context and tokenizer changes all miss
+- the decoding parameters (max_new_tokens, sampling settings)
+
+and stores the decoded answer with its prompt / new token counts. Entries are appended to
+`.cache/generations/generations.jsonl` through evaluation/result_log.py, so a crash loses at most
+the last few entries; each entry is a single O_APPEND write, so sharded workers can share the file.
+Entries written by other processes become visible the next time the cache is opened.
+
+With sampling (run_eval decodes at temperature 0.1), a hit returns the sample drawn when the entry
+was written; pass `--no_generation_cache` to draw fresh answers.
+"""
+
+import json
+import os
+
+from evaluation.result_log import ResultLog, read_results
+from fingerprint import text_sha256
+
+GENERATION_CACHE_DIR = ".cache/generations"
+
+
+class GenerationCache:
+    def __init__(self, cache_dir=GENERATION_CACHE_DIR, fsync_every=20):
+        run_path = os.path.join(cache_dir, "generations")
+        self.entries = {row["key"]: row for row in read_results(run_path + ".jsonl")}
+        self._log = ResultLog(run_path, fsync_every=fsync_every)
+        self.hits = 0
+        self.misses = 0
+
+    @staticmethod
+    def key(model, adapter, prompt_ids, decoding):
+        """`model` / `adapter`: identity dicts or hashes (adapter None for the base model)."""
+        return text_sha256(json.dumps(model, sort_keys=True), adapter, ",".join(map(str, prompt_ids)),
+                           json.dumps(decoding, sort_keys=True))
+
+    def get(self, key):
+        entry = self.entries.get(key)
+        if entry is None:
+            self.misses += 1
+        else:
+            self.hits += 1
+        return entry
+
+    def put(self, key, text, prompt_tokens, new_tokens):
+        entry = {"key": key, "text": text, "prompt_tokens": prompt_tokens, "new_tokens": new_tokens}
+        self.entries[key] = entry
+        self._log.append(entry)
+        return entry
+
+    def close(self):
+        self._log.close(compact_log=False)
+
+    def stats(self):
+        total = self.hits + self.misses
+        return {"entries": len(self.entries), "hits": self.hits, "misses": self.misses,
+                "hit_rate": self.hits / total if total else 0.0}
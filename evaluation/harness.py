@@ -1,11 +1,13 @@
 import json
 import argparse
 import os
+import sys
+import time
 from statistics import mean
-import numpy as np
-from scipy import stats
 from score import score_objective, llm_judge_score
-from rag import RAGIndex
+from rag import RAGIndex, read_manifest
+from context_builder import DEFAULT_CONTEXT_BUDGET, build_context
+from tracing import Tracer, format_summary, set_tracer, span
 
 
 # --- PLACEHOLDER model inference functions ---
@@ -24,35 +26,49 @@ def run_finetuned_model(question: str, context: str = None) -> str:
     return "[FINETUNED ANSWER]"
 
 
-def evaluate_run(setup_name: str, questions: list, retriever: RAGIndex = None, openai_client=None):
+def evaluate_run(setup_name: str, questions: list, retriever: RAGIndex = None, openai_client=None,
+                 context_budget: int = DEFAULT_CONTEXT_BUDGET, retrieval: str = 'dense'):
     mcq_scores = []
     expl_scores = []
     runtimes = []
+    tracer = Tracer()  # retrieval spans (embed / search) come from rag.py
+    set_tracer(tracer)
     for q in questions:
+        start = time.perf_counter_ns()
         context = None
         if retriever:
-            hits = retriever.retrieve(q['question'], k=5)
-            context = "\n".join([h[2] for h in hits])
-        if setup_name == 'Base':
-            pred = run_base_model(q['question'], context)
-        elif setup_name == 'Finetuned':
-            pred = run_finetuned_model(q['question'], context)
-        elif setup_name == 'Base+RAG':
-            pred = run_base_model(q['question'], context)
-        elif setup_name == 'Finetuned+RAG':
-            pred = run_finetuned_model(q['question'], context)
-        else:
-            pred = ""
-        if q['type'] == 'objective':
-            s = score_objective(pred, q['gold'], q.get('gold_numeric'))
-            mcq_scores.append(s)
-        else:
-            res = llm_judge_score(q['question'], pred, q.get('reference', q.get('gold', '')), openai_client=openai_client)
-            expl_scores.append(res['score'])
+            hits = retriever.retrieve(q['question'], k=5, mode=retrieval)
+            with span("context"):
+                context, _ = build_context(hits, budget=context_budget, separator="\n")
+        with span("generate"):
+            if setup_name == 'Base':
+                pred = run_base_model(q['question'], context)
+            elif setup_name == 'Finetuned':
+                pred = run_finetuned_model(q['question'], context)
+            elif setup_name == 'Base+RAG':
+                pred = run_base_model(q['question'], context)
+            elif setup_name == 'Finetuned+RAG':
+                pred = run_finetuned_model(q['question'], context)
+            else:
+                pred = ""
+        with span("grade"):
+            if q['type'] == 'objective':
+                s = score_objective(pred, q['gold'], q.get('gold_numeric'))
+                mcq_scores.append(s)
+            else:
+                res = llm_judge_score(q['question'], pred, q.get('reference', q.get('gold', '')), openai_client=openai_client)
+                expl_scores.append(res['score'])
+        elapsed = time.perf_counter_ns() - start
+        tracer.add("question", start, elapsed)
+        runtimes.append(elapsed / 1e9)
+    set_tracer(None)
+    stages = tracer.summary()
     mcq_acc = mean(mcq_scores) if mcq_scores else 0.0
     expl_mean = mean(expl_scores) if expl_scores else 0.0
     total = 0.7 * mcq_acc + 0.3 * (expl_mean / 5.0)  # normalize expl to 0-1 before combining
-    return {'setup': setup_name, 'mcq_acc': mcq_acc, 'expl_mean': expl_mean, 'total': total}
+    return {'setup': setup_name, 'mcq_acc': mcq_acc, 'expl_mean': expl_mean, 'total': total,
+            'mean_s': mean(runtimes) if runtimes else 0.0,
+            'p95_s': stages['question']['p95_ms'] / 1000 if runtimes else 0.0, 'stages': stages}
 
 
 def load_questions(path: str):
@@ -63,30 +79,52 @@ def load_questions(path: str):
     return qs
 
 
+def load_corpus_index_for(index_dir: str, manifest: dict) -> RAGIndex:
+    """The index in `index_dir` through run_eval's loader: rebuilt if its corpus or embedding model changed."""
+    # rag_pipeline sits at the repo root, which `python evaluation/harness.py` does not put on sys.path
+    root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    if root not in sys.path:
+        sys.path.append(root)
+    from rag_pipeline.corpora import load_corpus_index
+    return load_corpus_index(manifest.get('corpus', 'alpaca-qa'), index_dir=index_dir,
+                             storage=manifest.get('storage', 'float32'))
+
+
 def main(args):
     questions = load_questions(args.questions)
     # Build or load RAG index if requested
     rag = None
     if args.use_rag:
-        # for demo, build index from reference text snippets in questions
-        texts = [q.get('reference', '') for q in questions]
-        rag = RAGIndex()
-        rag.build(texts)
+        manifest = read_manifest(args.index_dir)
+        if manifest is not None:
+            # Same index run_eval uses (python -m rag_pipeline.indexer --corpus alpaca-qa)
+            rag = load_corpus_index_for(args.index_dir, manifest)
+        else:
+            # for demo, build index from reference text snippets in questions
+            texts = [q.get('reference', '') for q in questions]
+            rag = RAGIndex()
+            rag.build(texts)
     setups = ['Base', 'Finetuned']
     results = []
     for s in setups:
         results.append(evaluate_run(s, questions, retriever=None))
         if args.use_rag:
-            results.append(evaluate_run(s + '+RAG', questions, retriever=rag))
+            results.append(evaluate_run(s + '+RAG', questions, retriever=rag, context_budget=args.context_budget,
+                                        retrieval=args.retrieval))
     # Print table-like output
-    print("Setup\tMCQ Acc\tExpl Mean\tTotal")
+    print("Setup\tMCQ Acc\tExpl Mean\tTotal\tMean s\tp95 s")
+    for r in results:
+        print(f"{r['setup']}\t{r['mcq_acc']:.2f}\t{r['expl_mean']:.2f}\t{r['total']:.2f}\t{r['mean_s']:.3f}\t{r['p95_s']:.3f}")
     for r in results:
-        print(f"{r['setup']}\t{r['mcq_acc']:.2f}\t{r['expl_mean']:.2f}\t{r['total']:.2f}")
+        print(f"\n{r['setup']}\n{format_summary(r['stages'])}")
 
 
 if __name__ == '__main__':
     p = argparse.ArgumentParser()
     p.add_argument('--questions', required=True)
     p.add_argument('--use-rag', action='store_true')
+    p.add_argument('--context-budget', type=int, default=DEFAULT_CONTEXT_BUDGET)
+    p.add_argument('--index-dir', default='evaluation/rag_index')
+    p.add_argument('--retrieval', choices=['dense', 'bm25', 'hybrid'], default='dense')
     args = p.parse_args()
     main(args)
@@ -0,0 +1,116 @@
+"""Declarative eval matrix: axes -> configs -> a plan that loads each model once.
+
+A spec (YAML or JSON) lists the values of each axis; every combination is one config, i.e. one
+`config` value in the result log:
+
+    adapters:                      # name -> adapter path, referenced by the `adapter` axis
+      ep3: results/checkpoint-300
+      ep5: results/checkpoint-500
+    settings:                      # run_eval arguments fixed for the whole matrix
+      max_new_tokens: 256
+    axes:
+      adapter: [null, ep3, ep5]    # null = base model
+      rag: [false, true]
+      rag_k: [2, 3, 5]
+      grader: [local, claude]
+
+Axes: model (registry name, HF ID or merged checkpoint dir), adapter, rag, retrieval, rag_k,
+rerank, context_budget, grader; unlisted axes take the run_eval argument. Retrieval axes do not
+apply without RAG, so `rag: false` configs are not repeated for every rag_k.
+
+`plan` groups configs by model (one load each), then by adapter (hot-swapped on the loaded base),
+then by generation key - every axis but the grader. Configs sharing a generation key share the
+retrieval and the generated answer; only grading runs per config.
+"""
+
+import itertools
+import json
+
+AXES = ("model", "adapter", "rag", "retrieval", "rag_k", "rerank", "context_budget", "grader")
+RETRIEVAL_AXES = ("retrieval", "rag_k", "rerank", "context_budget")
+GRADING_AXES = ("grader",)
+
+
+def load_spec(path):
+    with open(path, "r", encoding="utf-8") as f:
+        if path.endswith((".yaml", ".yml")):
+            import yaml
+            spec = yaml.safe_load(f)
+        else:
+            spec = json.load(f)
+    unknown = set(spec.get("axes", {})) - set(AXES)
+    if unknown:
+        raise ValueError(f"{path}: unknown axes {sorted(unknown)}; expected some of {AXES}")
+    for axis, values in spec.get("axes", {}).items():
+        if not isinstance(values, list) or not values:
+            raise ValueError(f"{path}: axis '{axis}' needs a non-empty list of values")
+    missing = {a for a in spec.get("axes", {}).get("adapter", []) if a is not None} - set(spec.get("adapters", {}))
+    if missing:
+        raise ValueError(f"{path}: adapters {sorted(missing)} are not defined under 'adapters'")
+    return spec
+
+
+def config_name(config, varying, single_adapter=False):
+    """'Base' / 'Finetuned[ep3]' (+RAG), then 'axis=value' for every other axis the matrix varies."""
+    if config["adapter"] is None:
+        name = "Base"
+    else:
+        name = "Finetuned" if single_adapter else f"Finetuned[{config['adapter']}]"
+    if config["rag"]:
+        name += "+RAG"
+    if "model" in varying:
+        name = f"{config['model']}:{name}"
+    details = [f"{axis}={config[axis]}" for axis in AXES if axis in varying and axis not in ("model", "adapter", "rag")
+               and (config["rag"] or axis not in RETRIEVAL_AXES)]
+    return " ".join([name] + details)
+
+
+def expand(spec, defaults):
+    """Configs (dicts over AXES plus 'name') of `spec`, in axis order; `defaults` fills unlisted axes."""
+    axes = {axis: spec.get("axes", {}).get(axis, [defaults[axis]]) for axis in AXES}
+    varying = {axis for axis, values in axes.items() if len(values) > 1}
+    single_adapter = len([a for a in axes["adapter"] if a is not None]) == 1
+    configs, seen = [], set()
+    for values in itertools.product(*axes.values()):
+        config = dict(zip(AXES, values))
+        if not config["rag"]:
+            config.update({axis: defaults[axis] for axis in RETRIEVAL_AXES})
+        key = tuple(config[axis] for axis in AXES)
+        if key in seen:
+            continue
+        seen.add(key)
+        configs.append({"name": config_name(config, varying, single_adapter), **config})
+    return configs
+
+
+def generation_key(config):
+    """Axes that change the generated answer; configs with equal keys differ only in grading."""
+    key = {axis: config[axis] for axis in AXES if axis not in GRADING_AXES}
+    if not config["rag"]:
+        key.update({axis: None for axis in RETRIEVAL_AXES})
+    return tuple(key.items())
+
+
+def plan(configs):
+    """
+    [(model, [(generation, [configs])])]: one entry per model load, each listing its generation
+    units (grouped by adapter, so adapters are switched as rarely as possible) with the configs
+    graded from each unit's answers. Order otherwise follows `configs`.
+    """
+    by_model = {}
+    for config in configs:
+        units = by_model.setdefault(config["model"], {})
+        units.setdefault(generation_key(config), []).append(config)
+    result = []
+    for model, units in by_model.items():
+        adapters = list(dict.fromkeys(dict(key)["adapter"] for key in units))
+        ordered = sorted(units.items(), key=lambda unit: adapters.index(dict(unit[0])["adapter"]))
+        result.append((model, [(dict(key), unit_configs) for key, unit_configs in ordered]))
+    return result
+
+
+def describe(run_plan):
+    loads = len(run_plan)
+    units = sum(len(units) for _, units in run_plan)
+    configs = sum(len(c) for _, units in run_plan for _, c in units)
+    return f"{configs} configs -> {units} generation passes over {loads} model load(s)"
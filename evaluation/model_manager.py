@@ -0,0 +1,96 @@
+import logging
+from contextlib import contextmanager
+
+from model_registry import get_model_spec, DEFAULT_MODEL, load_base_model, load_tokenizer
+
+logger = logging.getLogger(__name__)
+
+
+class ModelManager:
+    """
+    Loads the base model once and hot-swaps LoRA adapters on top of it.
+
+    - add_adapter(name, path) attaches another adapter without reloading base weights
+    - activate(name) makes `name` the active adapter; activate(None) runs the plain base model
+      (adapters disabled), so Base and Finetuned configs share one set of weights
+    - lazy=True defers loading the weights (and attaching adapters) until the model is first
+      used, so a run whose answers all come from the generation cache never loads them
+    """
+
+    def __init__(self, spec=None, lazy=False):
+        self.spec = spec or get_model_spec(DEFAULT_MODEL)
+        self.tokenizer = load_tokenizer(self.spec)
+        self._model = None
+        self.adapters = {}
+        self._unattached = []
+        self.active = None
+        if not lazy:
+            self.model
+
+    @property
+    def loaded(self):
+        return self._model is not None
+
+    @property
+    def model(self):
+        if self._model is None:
+            logger.info(f"Loading Base Model: {self.spec['model_id']} "
+                        f"(quantization: {self.spec['quantization']}, device: {self.spec['device_map']})")
+            self._model = load_base_model(self.spec)
+            for name in self._unattached:
+                self._attach(name, self.adapters[name])
+            self._unattached = []
+        return self._model
+
+    @property
+    def device(self):
+        return self.model.device
+
+    def add_adapter(self, name, path):
+        if name in self.adapters:
+            return
+        self.adapters[name] = path
+        if self._model is None:
+            self._unattached.append(name)
+        else:
+            self._attach(name, path)
+
+    def _attach(self, name, path):
+        from peft import PeftModel
+
+        logger.info(f"Loading LoRA Adapter '{name}' from {path}")
+        if isinstance(self._model, PeftModel):
+            self._model.load_adapter(path, adapter_name=name)
+        else:
+            self._model = PeftModel.from_pretrained(self._model, path, adapter_name=name)
+        self._model.eval()
+
+    @contextmanager
+    def activate(self, name=None):
+        """Context manager yielding the model with adapter `name` active (None = base model)."""
+        model = self.model
+        if name is None:
+            self.active = None
+            if self.adapters:
+                with model.disable_adapter():
+                    yield model
+            else:
+                yield model
+            return
+        if name not in self.adapters:
+            raise KeyError(f"Adapter '{name}' not loaded; call add_adapter first.")
+        model.set_adapter(name)
+        self.active = name
+        yield model
+
+
+def parse_adapters(values):
+    """['path'] -> {'finetuned': 'path'}; ['a=path1', 'b=path2'] -> {'a': 'path1', 'b': 'path2'}."""
+    adapters = {}
+    for i, value in enumerate(values or []):
+        if "=" in value:
+            name, path = value.split("=", 1)
+        else:
+            name, path = ("finetuned" if i == 0 else f"adapter{i}"), value
+        adapters[name] = path
+    return adapters
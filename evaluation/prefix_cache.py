@@ -0,0 +1,148 @@
+"""Prefix KV-cache reuse for eval generation.
+
+Every eval prompt starts with the same template header, and RAG prompts then list retrieved
+passages that related questions often share. PrefixKVCache stores the past key/values computed
+for a prompt prefix, keyed by the prefix's token IDs (plus a namespace for the active model /
+adapter, since LoRA changes the keys and values), and `generate_with_prefix_cache` prefills only
+the tokens after the longest cached prefix.
+
+One entry holds the KV tensors for a prompt up to its last reusable boundary (end of the
+retrieved context); every shorter boundary (template header, each passage) is indexed to the
+same entry and served by cropping a copy, so shared leading passages hit without storing the
+tensors twice. Entries are evicted least-recently-used once their total size exceeds the
+memory budget.
+"""
+
+import copy
+import logging
+from collections import OrderedDict
+
+from evaluation.prompts import build_prompt_segments
+from evaluation.tracing import span
+
+logger = logging.getLogger(__name__)
+
+
+def _cache_nbytes(kv):
+    if hasattr(kv, "layers"):
+        return sum(
+            t.nbytes for layer in kv.layers for t in (getattr(layer, "keys", None), getattr(layer, "values", None))
+            if t is not None
+        )
+    if hasattr(kv, "key_cache"):
+        return sum(k.nbytes + v.nbytes for k, v in zip(kv.key_cache, kv.value_cache))
+    return sum(t.nbytes for layer in kv for t in layer)
+
+
+class PrefixKVCache:
+    def __init__(self, max_bytes):
+        self.max_bytes = max_bytes
+        self.entries = OrderedDict()  # entry_id -> {"kv", "nbytes", "keys"}
+        self.index = {}  # (namespace, token-id tuple) -> (entry_id, prefix length)
+        self.bytes = 0
+        self._next_id = 0
+        self.hits = 0
+        self.misses = 0
+        self.reused_tokens = 0
+        self.prefilled_tokens = 0
+
+    def lookup(self, keys):
+        """
+        `keys` are (key, length) pairs, longest first.
+        Returns (kv copy cropped to the matched length, length) or (None, 0).
+        """
+        for key, length in keys:
+            hit = self.index.get(key)
+            if hit is None:
+                continue
+            entry_id, _ = hit
+            self.entries.move_to_end(entry_id)
+            kv = copy.deepcopy(self.entries[entry_id]["kv"])
+            if kv.get_seq_length() > length:
+                kv.crop(length)
+            return kv, length
+        return None, 0
+
+    def put(self, keys, kv):
+        nbytes = _cache_nbytes(kv)
+        if nbytes > self.max_bytes:
+            return
+        entry_id = self._next_id
+        self._next_id += 1
+        self.entries[entry_id] = {"kv": kv, "nbytes": nbytes, "keys": [k for k, _ in keys]}
+        self.bytes += nbytes
+        for key, length in keys:
+            self.index[key] = (entry_id, length)
+        while self.bytes > self.max_bytes and self.entries:
+            old_id, old = self.entries.popitem(last=False)
+            self.bytes -= old["nbytes"]
+            for key in old["keys"]:
+                if self.index.get(key, (None,))[0] == old_id:
+                    del self.index[key]
+
+    def stats(self):
+        return {
+            "entries": len(self.entries),
+            "bytes": self.bytes,
+            "hits": self.hits,
+            "misses": self.misses,
+            "reused_tokens": self.reused_tokens,
+            "prefilled_tokens": self.prefilled_tokens,
+        }
+
+
+def _common_prefix_len(a, b):
+    n = min(len(a), len(b))
+    i = 0
+    while i < n and a[i] == b[i]:
+        i += 1
+    return i
+
+
+def generate_with_prefix_cache(model, tokenizer, question, context, prefix_cache, namespace=None, prompt_ids=None,
+                               **generate_kwargs):
+    """
+    Generates like model.generate on build_prompt(question, context), reusing cached prefix KV.
+    `prompt_ids` is that prompt already tokenized, if the caller has it.
+    Returns the generated token IDs (prompt included), as model.generate does.
+    """
+    import torch
+
+    segments = build_prompt_segments(question, context)
+    prompt = "".join(segments)
+    with span("tokenize"):
+        ids = list(prompt_ids) if prompt_ids is not None else tokenizer(prompt)["input_ids"]
+        full_ids = torch.tensor([ids], device=model.device)
+
+        # Token length of each reusable boundary. A prefix tokenized alone can merge differently at
+        # its edge, so only the part that agrees with the full prompt's tokens counts.
+        prefixes = ["".join(segments[:i]) for i in range(1, len(segments))]
+        enc = tokenizer(prefixes, add_special_tokens=True)["input_ids"]
+    lengths = sorted({min(_common_prefix_len(p, ids), len(ids) - 1) for p in enc}, reverse=True)
+    lengths = [n for n in lengths if n > 0]
+    keys = [((namespace, tuple(ids[:n])), n) for n in lengths]
+
+    kv = None
+    if keys:
+        kv, cached_len = prefix_cache.lookup(keys)
+        longest = lengths[0]
+        if cached_len:
+            prefix_cache.hits += 1
+            prefix_cache.reused_tokens += cached_len
+        else:
+            prefix_cache.misses += 1
+        if cached_len < longest:
+            # Extend the (possibly empty) cached prefix to the longest boundary and store it
+            with span("prefill"), torch.no_grad():
+                out = model(input_ids=full_ids[:, cached_len:longest], past_key_values=kv, use_cache=True)
+            kv = out.past_key_values
+            prefix_cache.prefilled_tokens += longest - cached_len
+            prefix_cache.put(keys, copy.deepcopy(kv))
+
+    with torch.no_grad():
+        return model.generate(
+            input_ids=full_ids,
+            attention_mask=torch.ones_like(full_ids),
+            past_key_values=kv,
+            **generate_kwargs,
+        )
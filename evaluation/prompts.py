@@ -0,0 +1,26 @@
+# Prompt used for every eval generation (Mistral Instruct format)
+ANSWER_INSTRUCTIONS = "Answer concisely. If MCQ, output only the option letter. If Numeric, output only the number."
+# Separator context_builder.build_context puts between retrieved passages
+PASSAGE_SEPARATOR = "\n---\n"
+
+
+def build_prompt(question, context=None):
+    if context:
+        return f"[INST] Context:\n{context}\n\nQuestion: {question}\n\n{ANSWER_INSTRUCTIONS} [/INST]"
+    return f"[INST] Question: {question}\n\n{ANSWER_INSTRUCTIONS} [/INST]"
+
+
+def build_prompt_segments(question, context=None):
+    """
+    Same prompt as build_prompt, split into segments whose boundaries are reusable prefixes:
+    the template header, then one segment per retrieved passage, then the question tail.
+    "".join(segments) == build_prompt(question, context).
+    """
+    if context:
+        passages = context.split(PASSAGE_SEPARATOR)
+        segments = ["[INST] Context:\n"]
+        segments += [p + PASSAGE_SEPARATOR for p in passages[:-1]]
+        segments.append(passages[-1])
+        segments.append(f"\n\nQuestion: {question}\n\n{ANSWER_INSTRUCTIONS} [/INST]")
+        return segments
+    return ["[INST] Question: ", f"{question}\n\n{ANSWER_INSTRUCTIONS} [/INST]"]
@@ -1,41 +1,282 @@
-from sentence_transformers import SentenceTransformer
+"""Retrieval index shared by every RAG entry point (run_eval, harness, rag_pipeline).
+
+On-disk format (one directory per index):
+    index.faiss    dense vectors (inner product over normalized MiniLM embeddings), stored as
+                   float32, float16, int8 (per-dimension scalar quantizer) or binary sign codes
+    vectors.npy    binary storage only: float32 vectors, memory-mapped for re-scoring
+    bm25.npz       lexical CSR postings (bm25.py)
+    docs.jsonl     one {"text", "metadata"} object per document, in vector-id order
+    manifest.json  format version, embedding model, dimension, document count, and whatever the
+                   builder records about its corpus (path, sha256, chunking params)
+
+`load_or_build` compares a saved manifest with the one the caller expects and rebuilds when
+they differ, so an index built from an older corpus, another embedding model or other chunking
+settings is never used silently.
+
+Binary storage keeps 1 bit per dimension resident (48 bytes per MiniLM vector instead of 1536);
+a dense query takes the rescore_factor * k nearest codes by Hamming distance and re-scores them
+with the float vectors from vectors.npy, which the OS pages in for those rows only.
+
+Retrieval backends are functions (index, query, k) -> [(id, score)] registered by name in
+RETRIEVAL_BACKENDS; RAGIndex.retrieve(query, k, mode) dispatches to them.
+"""
+
 import faiss
+import json
 import numpy as np
-from typing import List, Tuple
+import logging
+import os
+import time
+from typing import Callable, Dict, List, Protocol, Tuple
+
+try:
+    from evaluation.bm25 import BM25Index, rrf_fuse
+    from evaluation.embedders import DEFAULT_BATCH_SIZE, get_embedder
+    from evaluation.tracing import span
+except ImportError:  # run from evaluation/ (harness.py)
+    from bm25 import BM25Index, rrf_fuse
+    from embedders import DEFAULT_BATCH_SIZE, get_embedder
+    from tracing import span
+
+logger = logging.getLogger(__name__)
+
+INDEX_FORMAT_VERSION = 1
+DEFAULT_EMBEDDING_MODEL = "sentence-transformers/all-MiniLM-L6-v2"
+MANIFEST_FILE = "manifest.json"
+FAISS_FILE = "index.faiss"
+BM25_FILE = "bm25.npz"
+DOCS_FILE = "docs.jsonl"
+VECTORS_FILE = "vectors.npy"
+STORAGE_TYPES = ("float32", "float16", "int8", "binary")
+RESCORE_FACTOR = 30  # binary storage: Hamming candidates per result re-scored in float
+HYBRID_DEPTH = 50  # candidates taken from each ranking before fusion
+
+
+class Retriever(Protocol):
+    def retrieve(self, query: str, k: int = 5) -> List[Tuple[int, float, str]]:
+        """Top-k documents for `query` as (id, score, text), best first."""
+        ...
 
 
 class RAGIndex:
-    def __init__(self, model_name: str = "sentence-transformers/all-MiniLM-L6-v2"):
-        self.model = SentenceTransformer(model_name)
+    def __init__(self, model_name: str = DEFAULT_EMBEDDING_MODEL, storage: str = "float32",
+                 embedding_backend: str = "torch", threads: int = None):
+        if storage not in STORAGE_TYPES:
+            raise ValueError(f"Unknown storage '{storage}'; expected one of {STORAGE_TYPES}")
+        self.model_name = model_name
+        self.storage = storage
+        self.embedding_backend = embedding_backend
+        self.threads = threads
+        self._embedder = None
         self.index = None
+        self.vectors = None  # binary storage: float vectors for re-scoring
+        self.rescore_factor = RESCORE_FACTOR
+        self._vector_parts = []
+        self.bm25 = None
         self.id_to_text = {}
+        self.metadata = []
+        self.manifest = {}
+
+    @property
+    def embedder(self):
+        # Loaded on first encode, so BM25-only use and index inspection skip the transformer
+        if self._embedder is None:
+            self._embedder = get_embedder(self.embedding_backend, self.model_name, self.threads)
+        return self._embedder
+
+    def __len__(self):
+        return len(self.id_to_text)
+
+    def encode(self, texts: List[str], batch_size: int = DEFAULT_BATCH_SIZE):
+        return self.embedder.encode(texts, batch_size=batch_size)
 
-    def build(self, texts: List[str]):
-        embs = self.model.encode(texts, convert_to_numpy=True, normalize_embeddings=True)
-        d = embs.shape[1]
-        self.index = faiss.IndexFlatIP(d)
-        self.index.add(embs)
-        self.id_to_text = {i: t for i, t in enumerate(texts)}
+    def build(self, texts: List[str], metadata: List[dict] = None):
+        self.add(texts, self.encode(texts), metadata)
+        self.build_lexical()
 
-    def save(self, index_path: str, meta_path: str):
-        faiss.write_index(self.index, index_path)
-        with open(meta_path, "w", encoding="utf-8") as f:
+    def add(self, texts: List[str], embs, metadata: List[dict] = None):
+        """Appends already-embedded documents (streaming builds); call build_lexical() or flush_vectors() once done."""
+        embs = np.ascontiguousarray(embs, dtype=np.float32)
+        if self.index is None:
+            self.index = new_faiss_index(self.storage, embs.shape[1])
+        if self.storage == "binary":
+            self.index.add(np.packbits(embs > 0, axis=1))
+            self._vector_parts.append(embs)
+        elif not self.index.is_trained:
+            # int8 ranges are fitted on every streamed batch at flush_vectors, so no batch is clipped
+            self._vector_parts.append(embs)
+        else:
+            self.index.add(embs)
+        start = len(self.id_to_text)
+        self.id_to_text.update({start + i: t for i, t in enumerate(texts)})
+        self.metadata.extend(metadata if metadata is not None else [{} for _ in texts])
+
+    def flush_vectors(self):
+        """
+        Binary storage: joins the float vectors added so far into the re-scoring matrix. int8
+        storage: trains the quantizer on the vectors added so far, then adds their codes.
+        """
+        if not self._vector_parts:
+            return
+        vectors = np.concatenate(self._vector_parts)
+        self._vector_parts = []
+        if self.storage == "binary":
+            self.vectors = vectors if self.vectors is None else np.concatenate([self.vectors, vectors])
+            return
+        if not self.index.is_trained:
+            self.index.train(vectors)
+        self.index.add(vectors)
+
+    def build_lexical(self):
+        self.flush_vectors()
+        self.bm25 = BM25Index()
+        self.bm25.build([self.id_to_text[i] for i in range(len(self.id_to_text))])
+
+    def save(self, index_dir: str, manifest: dict = None):
+        os.makedirs(index_dir, exist_ok=True)
+        if self.storage == "binary":
+            faiss.write_index_binary(self.index, os.path.join(index_dir, FAISS_FILE))
+            np.save(os.path.join(index_dir, VECTORS_FILE), self.vectors)
+        else:
+            faiss.write_index(self.index, os.path.join(index_dir, FAISS_FILE))
+        self.bm25.save(os.path.join(index_dir, BM25_FILE))
+        with open(os.path.join(index_dir, DOCS_FILE), "w", encoding="utf-8") as f:
             for i in range(len(self.id_to_text)):
-                f.write(self.id_to_text[i].replace('\n', ' ') + "\n")
+                f.write(json.dumps({"text": self.id_to_text[i], "metadata": self.metadata[i]}) + "\n")
+        self.manifest = {
+            **(manifest or {}),
+            "format_version": INDEX_FORMAT_VERSION,
+            "embedding_model": self.model_name,
+            "embedding_backend": self.embedding_backend,
+            "storage": self.storage,
+            "dim": self.index.d,
+            "num_docs": len(self.id_to_text),
+            "created_at": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        }
+        # Manifest last: a directory without one is an incomplete build
+        with open(os.path.join(index_dir, MANIFEST_FILE), "w", encoding="utf-8") as f:
+            json.dump(self.manifest, f, indent=2)
 
-    def load(self, index_path: str, meta_path: str):
-        self.index = faiss.read_index(index_path)
-        with open(meta_path, "r", encoding="utf-8") as f:
-            lines = [l.strip() for l in f.readlines()]
-        self.id_to_text = {i: lines[i] for i in range(len(lines))}
+    @classmethod
+    def load(cls, index_dir: str, embedding_backend: str = "torch", threads: int = None) -> "RAGIndex":
+        """`embedding_backend` embeds queries; it need not match the one that built the index (see embedders.parity_check)."""
+        manifest = read_manifest(index_dir)
+        if manifest is None:
+            raise FileNotFoundError(f"No index manifest in {index_dir}")
+        rag = cls(manifest["embedding_model"], manifest.get("storage", "float32"), embedding_backend, threads)
+        rag.manifest = manifest
+        if rag.storage == "binary":
+            rag.index = faiss.read_index_binary(os.path.join(index_dir, FAISS_FILE))
+            rag.vectors = np.load(os.path.join(index_dir, VECTORS_FILE), mmap_mode="r")
+        else:
+            rag.index = faiss.read_index(os.path.join(index_dir, FAISS_FILE))
+        texts, metadata = [], []
+        with open(os.path.join(index_dir, DOCS_FILE), "r", encoding="utf-8") as f:
+            for line in f:
+                doc = json.loads(line)
+                texts.append(doc["text"])
+                metadata.append(doc.get("metadata", {}))
+        rag.id_to_text = {i: t for i, t in enumerate(texts)}
+        rag.metadata = metadata
+        rag.bm25 = BM25Index()
+        rag.bm25.load(os.path.join(index_dir, BM25_FILE))
+        return rag
 
-    def retrieve(self, query: str, k: int = 5) -> List[Tuple[int, float, str]]:
-        q_emb = self.model.encode([query], convert_to_numpy=True, normalize_embeddings=True)
-        D, I = self.index.search(q_emb, k)
-        results = []
-        for idx, score in zip(I[0], D[0]):
-            results.append((int(idx), float(score), self.id_to_text[int(idx)]))
-        return results
+    def retrieve(self, query: str, k: int = 5, mode: str = "dense") -> List[Tuple[int, float, str]]:
+        if mode not in RETRIEVAL_BACKENDS:
+            raise ValueError(f"Unknown retrieval mode '{mode}'; expected one of {list(RETRIEVAL_BACKENDS)}")
+        hits = RETRIEVAL_BACKENDS[mode](self, query, k)
+        return [(idx, score, self.id_to_text[idx]) for idx, score in hits]
+
+
+def new_faiss_index(storage: str, d: int):
+    if storage == "float32":
+        return faiss.IndexFlatIP(d)
+    if storage == "float16":
+        return faiss.IndexScalarQuantizer(d, faiss.ScalarQuantizer.QT_fp16, faiss.METRIC_INNER_PRODUCT)
+    if storage == "int8":
+        return faiss.IndexScalarQuantizer(d, faiss.ScalarQuantizer.QT_8bit, faiss.METRIC_INNER_PRODUCT)
+    return faiss.IndexBinaryFlat(d)
+
+
+def search_vectors(rag: RAGIndex, q_emb, k: int):
+    """(scores, ids) for a batch of query embeddings, as faiss.Index.search returns them."""
+    if rag.storage != "binary":
+        return rag.index.search(q_emb, k)
+    # Hamming pre-filter on sign codes, then exact inner product on the candidates
+    depth = min(k * rag.rescore_factor, rag.index.ntotal)
+    _, cand = rag.index.search(np.packbits(q_emb > 0, axis=1), depth)
+    cand = np.sort(cand, axis=1)  # ascending rows read the memory-mapped vectors in file order
+    scores = np.einsum("qcd,qd->qc", np.asarray(rag.vectors[cand]), q_emb)
+    order = np.argsort(-scores, axis=1)[:, :k]
+    return np.take_along_axis(scores, order, 1), np.take_along_axis(cand, order, 1)
+
+
+def _dense(rag: RAGIndex, query: str, k: int):
+    with span("embed"):
+        q_emb = rag.encode([query])
+    with span("search"):
+        D, I = search_vectors(rag, q_emb, k)
+    return [(int(idx), float(score)) for idx, score in zip(I[0], D[0]) if idx >= 0]
+
+
+def _bm25(rag: RAGIndex, query: str, k: int):
+    with span("search"):
+        ids, scores = rag.bm25.search(query, k)
+    return list(zip(ids.tolist(), scores.tolist()))
+
+
+def _hybrid(rag: RAGIndex, query: str, k: int):
+    # Reciprocal-rank fusion of both rankings; scores are the fused RRF scores
+    depth = max(k, HYBRID_DEPTH)
+    dense_ids = [i for i, _ in _dense(rag, query, depth)]
+    lexical_ids = [i for i, _ in _bm25(rag, query, depth)]
+    return rrf_fuse([dense_ids, lexical_ids], k)
+
+
+RETRIEVAL_BACKENDS: Dict[str, Callable[[RAGIndex, str, int], List[Tuple[int, float]]]] = {
+    "dense": _dense,
+    "bm25": _bm25,
+    "hybrid": _hybrid,
+}
+RETRIEVAL_MODES = tuple(RETRIEVAL_BACKENDS)
+
+
+def read_manifest(index_dir: str):
+    path = os.path.join(index_dir, MANIFEST_FILE)
+    if not os.path.exists(path):
+        return None
+    with open(path, "r", encoding="utf-8") as f:
+        return json.load(f)
+
+
+def stale_reasons(manifest: dict, expected: dict) -> List[str]:
+    """Why a saved index does not match `expected` (empty list = up to date)."""
+    if manifest is None:
+        return ["no index"]
+    reasons = []
+    if manifest.get("format_version") != INDEX_FORMAT_VERSION:
+        reasons.append(f"format_version {manifest.get('format_version')} != {INDEX_FORMAT_VERSION}")
+    for key, value in expected.items():
+        if manifest.get(key) != value:
+            reasons.append(f"{key} changed")
+    return reasons
+
+
+def load_or_build(index_dir: str, expected: dict, build: Callable[[], RAGIndex], rebuild: bool = False,
+                  embedding_backend: str = "torch") -> RAGIndex:
+    """
+    Loads the index in `index_dir` if its manifest matches `expected`; otherwise calls build()
+    for a fresh RAGIndex and saves it with `expected` as its manifest.
+    """
+    reasons = ["rebuild requested"] if rebuild else stale_reasons(read_manifest(index_dir), expected)
+    if not reasons:
+        return RAGIndex.load(index_dir, embedding_backend)
+    logger.info(f"Building RAG index in {index_dir} ({'; '.join(reasons)})...")
+    rag = build()
+    rag.save(index_dir, expected)
+    logger.info(f"Index built with {len(rag)} documents.")
+    return rag
 
 
 if __name__ == '__main__':
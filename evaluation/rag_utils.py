@@ -1,51 +1,41 @@
 import os
-import json
 import logging
 from typing import List, Tuple
-from evaluation.rag import RAGIndex
+from evaluation.context_builder import build_context
+from evaluation.prompts import PASSAGE_SEPARATOR
+from evaluation.tracing import span
 
 logger = logging.getLogger(__name__)
 
-INDEX_PATH = "evaluation/rag_index.faiss"
-META_PATH = "evaluation/rag_meta.txt"
-DATA_PATH = "data_extraction/alpaca_physics_5k_cleaned.jsonl"
+# Corpus run_eval retrieves from; its index lives in CORPORA[...]["index_dir"] (evaluation/rag_index).
+# rag_pipeline.corpora (and with it faiss / numpy) is imported only when an index is loaded.
+CORPUS = "alpaca-qa"
 
-def build_index_from_dataset():
-    logger.info("Building RAG index from dataset...")
-    if not os.path.exists(DATA_PATH):
-        raise FileNotFoundError(f"Dataset not found at {DATA_PATH}")
+def _check_corpus(corpus):
+    from rag_pipeline.corpora import corpus_path
+    if not os.path.exists(corpus_path(corpus)):
+        raise FileNotFoundError(f"Dataset not found at {corpus_path(corpus)}")
 
-    texts = []
-    with open(DATA_PATH, 'r') as f:
-        for line in f:
-            try:
-                item = json.loads(line)
-                # Combine instruction and output for context
-                text = f"Q: {item.get('instruction', '')}\nA: {item.get('output', '')}\n"
-                texts.append(text)
-            except:
-                continue
-    
-    rag = RAGIndex()
-    rag.build(texts)
-    rag.save(INDEX_PATH, META_PATH)
-    logger.info(f"Index built with {len(texts)} documents.")
-    return rag
+def build_index_from_dataset(corpus=CORPUS, storage="float32"):
+    from rag_pipeline.corpora import load_corpus_index
+    _check_corpus(corpus)
+    return load_corpus_index(corpus, storage=storage, rebuild=True)
 
-def load_index():
-    if not os.path.exists(INDEX_PATH) or not os.path.exists(META_PATH):
-        return build_index_from_dataset()
-    
-    rag = RAGIndex()
-    rag.load(INDEX_PATH, META_PATH)
-    return rag
+def load_index(corpus=CORPUS, storage="float32", embedding_backend="torch"):
+    # Rebuilt automatically when the corpus, chunking, embedding model or storage changed since the last build
+    from rag_pipeline.corpora import load_corpus_index
+    _check_corpus(corpus)
+    return load_corpus_index(corpus, storage=storage, embedding_backend=embedding_backend)
 
-def retrieve(rag_index, query, k=3):
-    return rag_index.retrieve(query, k=k)
+def retrieve(rag_index, query, k=3, reranker=None, mode="dense"):
+    if reranker is None:
+        return rag_index.retrieve(query, k=k, mode=mode)
+    # Over-fetch with the first stage, keep the cross-encoder's top-k
+    candidates = rag_index.retrieve(query, k=max(reranker.fetch_k, k), mode=mode)
+    with span("rerank"):
+        return reranker.rerank(query, candidates, k)
 
-def format_docs(docs: List[Tuple[int, float, str]]) -> str:
-    # docs is list of (id, score, text)
-    context = ""
-    for _, _, text in docs:
-        context += text + "\n---\n"
-    return context.strip()
+def format_docs(docs: List[Tuple[int, float, str]], tokenizer=None, budget=None) -> str:
+    # docs is list of (id, score, text); deduped, score-ordered, optionally token-budgeted
+    context, _ = build_context(docs, tokenizer, budget, separator=PASSAGE_SEPARATOR)
+    return context
@@ -0,0 +1,92 @@
+"""Cross-encoder re-ranking for retrieved passages.
+
+The bi-encoder (MiniLM cosine over FAISS) is over-fetched to `fetch_k` candidates; a small
+cross-encoder scores each (query, passage) pair jointly, in batches, and the top-k by that score
+are kept. Pair scores are cached (LRU), so configs that retrieve for the same question (Base+RAG
+and Finetuned+RAG) score each pair once.
+
+`latency_budget_ms` bounds the extra stage: the per-pair cost is tracked as a moving average, and
+when the uncached pairs for a query are predicted to exceed the budget the bi-encoder order is
+returned unchanged (counted in `stats()["skipped"]`).
+"""
+
+import logging
+import time
+from collections import OrderedDict
+from typing import List, Tuple
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_RERANK_MODEL = "cross-encoder/ms-marco-MiniLM-L-6-v2"
+DEFAULT_FETCH_K = 20
+
+
+class CrossEncoderReranker:
+    def __init__(self, model_name: str = DEFAULT_RERANK_MODEL, fetch_k: int = DEFAULT_FETCH_K, batch_size: int = 32,
+                 latency_budget_ms: float = None, cache_size: int = 100_000, device: str = None):
+        from sentence_transformers import CrossEncoder
+
+        self.model = CrossEncoder(model_name, max_length=512, device=device)
+        self.fetch_k = fetch_k
+        self.batch_size = batch_size
+        self.latency_budget_ms = latency_budget_ms
+        self.cache_size = cache_size
+        self.cache = OrderedDict()  # (query, passage text) -> score
+        self.pair_ms = None  # moving average of scoring cost per uncached pair
+        self.calls = 0
+        self.skipped = 0
+        self.cache_hits = 0
+        self.scored_pairs = 0
+        self.total_ms = 0.0
+
+    def score(self, query: str, texts: List[str]) -> List[float]:
+        """Cross-encoder scores for (query, text) pairs; uncached pairs are scored in batches."""
+        keys = [(query, t) for t in texts]
+        missing = list(dict.fromkeys(k for k in keys if k not in self.cache))
+        self.cache_hits += len(keys) - len(missing)
+        found = {}
+        for key in keys:
+            if key in self.cache:
+                self.cache.move_to_end(key)
+                found[key] = self.cache[key]
+        if missing:
+            start = time.perf_counter()
+            scores = self.model.predict(missing, batch_size=self.batch_size, show_progress_bar=False,
+                                        convert_to_numpy=True)
+            elapsed_ms = (time.perf_counter() - start) * 1000
+            per_pair = elapsed_ms / len(missing)
+            self.pair_ms = per_pair if self.pair_ms is None else 0.8 * self.pair_ms + 0.2 * per_pair
+            self.scored_pairs += len(missing)
+            for key, s in zip(missing, scores):
+                found[key] = self.cache[key] = float(s)
+            while len(self.cache) > self.cache_size:
+                self.cache.popitem(last=False)
+        return [found[key] for key in keys]
+
+    def rerank(self, query: str, docs: List[Tuple[int, float, str]], k: int) -> List[Tuple[int, float, str]]:
+        """
+        `docs` are (id, score, text) candidates from RAGIndex.retrieve.
+        Returns the top-k as (id, cross-encoder score, text), or the first k unchanged when skipped.
+        """
+        self.calls += 1
+        start = time.perf_counter()
+        if self.latency_budget_ms is not None and self.pair_ms is not None:
+            uncached = sum(1 for _, _, t in docs if (query, t) not in self.cache)
+            if uncached * self.pair_ms > self.latency_budget_ms:
+                self.skipped += 1
+                return docs[:k]
+        scores = self.score(query, [t for _, _, t in docs])
+        ranked = sorted(zip(docs, scores), key=lambda x: x[1], reverse=True)[:k]
+        self.total_ms += (time.perf_counter() - start) * 1000
+        return [(doc_id, s, text) for (doc_id, _, text), s in ranked]
+
+    def stats(self):
+        reranked = self.calls - self.skipped
+        return {
+            "calls": self.calls,
+            "skipped": self.skipped,
+            "cache_hits": self.cache_hits,
+            "scored_pairs": self.scored_pairs,
+            "mean_ms": self.total_ms / reranked if reranked else 0.0,
+            "pair_ms": self.pair_ms,
+        }
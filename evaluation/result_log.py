@@ -0,0 +1,203 @@
+"""Append-only, crash-safe result log for eval runs.
+
+Every completed (config, question) row is appended to `<run>.jsonl` as one JSON line and handed
+to the OS right away; the file is fsync'd every `fsync_every` rows or `fsync_seconds`, whichever
+comes first, so a crash loses at most the rows since the last sync. A line torn by a crash
+mid-write is skipped on read. Appending costs the same for the 5000th row as for the first,
+unlike rewriting the whole CSV after every question.
+
+`close()` compacts the log into `<run>.csv` (or `.parquet`), the table the analysis scripts read;
+the JSONL log is kept next to it.
+
+`<run>.run.json` records what the rows were produced from (model / adapter / eval-file hashes and
+the generation settings). A resumed run (`run_eval --resume <run>`) must match it, and skips the
+(config, question_id) pairs already in the log.
+
+Sharded runs (`run_eval --workers N`) give each worker its own `<run>.shard<i>.jsonl`;
+`merge_shards` folds them into `<run>.jsonl` in a caller-defined order once the workers finish
+(or when a crashed sharded run is resumed), so the merged log does not depend on scheduling.
+"""
+
+import glob
+import json
+import logging
+import os
+import time
+
+logger = logging.getLogger(__name__)
+
+OUTPUT_FORMATS = ("csv", "parquet")
+RUN_MANIFEST_SUFFIX = ".run.json"
+
+
+def _to_json(value):
+    # numpy scalars from graders / scorers
+    return value.item() if hasattr(value, "item") else str(value)
+
+
+def _truncate_torn_tail(log_path):
+    # Cut a partial last line left by a crash, so rows appended after reopening start on their own line
+    if not os.path.exists(log_path) or os.path.getsize(log_path) == 0:
+        return
+    with open(log_path, "rb+") as f:
+        f.seek(-1, os.SEEK_END)
+        if f.read(1) == b"\n":
+            return
+        f.seek(0)
+        f.truncate(f.read().rfind(b"\n") + 1)
+
+
+def read_results(log_path):
+    """Rows of a result log, in append order; a torn last line (crash mid-write) is dropped."""
+    rows = []
+    if not os.path.exists(log_path):
+        return rows
+    with open(log_path, "r", encoding="utf-8") as f:
+        for line_num, line in enumerate(f, 1):
+            if not line.strip():
+                continue
+            try:
+                rows.append(json.loads(line))
+            except json.JSONDecodeError:
+                logger.warning(f"{log_path}:{line_num}: skipping incomplete row")
+    return rows
+
+
+def row_key(row):
+    """(config, question_id) a result row completes; the question text stands in for a missing ID."""
+    qid = row.get("question_id")
+    return row["config"], qid if qid is not None else row["question"]
+
+
+def row_position(row, order):
+    """Where `row` sorts in `order` ({row key: position}); rows not in it sort last."""
+    return order.get(row_key(row), len(order))
+
+
+def completed_keys(log_path):
+    return {row_key(row) for row in read_results(log_path)}
+
+
+def write_run_manifest(run_path, manifest):
+    with open(run_path + RUN_MANIFEST_SUFFIX, "w", encoding="utf-8") as f:
+        json.dump(manifest, f, indent=2)
+
+
+def read_run_manifest(run_path):
+    path = run_path + RUN_MANIFEST_SUFFIX
+    if not os.path.exists(path):
+        return None
+    with open(path, "r", encoding="utf-8") as f:
+        return json.load(f)
+
+
+def mismatch_reasons(recorded, current):
+    """Why a run recorded as `recorded` cannot be continued as `current` (empty when it can)."""
+    reasons = []
+    for key, value in current.items():
+        if recorded.get(key) != value:
+            reasons.append(f"{key} changed ({recorded.get(key)!r} -> {value!r})")
+    return reasons
+
+
+def shard_path(run_path, shard):
+    return f"{run_path}.shard{shard}"
+
+
+def merge_shards(run_path, order):
+    """
+    Appends the rows of every `<run>.shard*.jsonl` not yet in `<run>.jsonl` to it, sorted by
+    `order` (see row_position), then deletes the shard logs. Returns the number of rows merged.
+    """
+    shard_logs = sorted(glob.glob(glob.escape(run_path) + ".shard*.jsonl"))
+    if not shard_logs:
+        return 0
+    done = completed_keys(run_path + ".jsonl")
+    rows = {}
+    for path in shard_logs:
+        for row in read_results(path):
+            if row_key(row) not in done:
+                rows[row_key(row)] = row
+    log = ResultLog(run_path)
+    for row in sorted(rows.values(), key=lambda row: row_position(row, order)):
+        log.append(row)
+    log.close(compact_log=False)
+    # Only after the merged rows are synced; a crash before this just merges them again (deduplicated)
+    for path in shard_logs:
+        os.remove(path)
+    return len(rows)
+
+
+def read_table(path):
+    """Rows of a run log or compacted table (.jsonl / .csv / .parquet) as a DataFrame."""
+    import pandas as pd
+
+    if path.endswith(".parquet"):
+        return pd.read_parquet(path)
+    if path.endswith(".jsonl"):
+        return pd.DataFrame(read_results(path))
+    return pd.read_csv(path)
+
+
+def compact(log_path, output_path, order=None):
+    """
+    Writes the rows of `log_path` to `output_path` (.csv or .parquet), in log order or sorted by
+    `order` (see row_position), and returns them as a DataFrame.
+    """
+    import pandas as pd
+
+    rows = read_results(log_path)
+    if order is not None:
+        rows.sort(key=lambda row: row_position(row, order))
+    df = pd.DataFrame(rows)
+    tmp_path = output_path + ".tmp"
+    if output_path.endswith(".parquet"):
+        df.to_parquet(tmp_path, index=False)
+    else:
+        df.to_csv(tmp_path, index=False)
+    os.replace(tmp_path, output_path)
+    return df
+
+
+class ResultLog:
+    def __init__(self, run_path, output_format="csv", fsync_every=20, fsync_seconds=30.0):
+        if output_format not in OUTPUT_FORMATS:
+            raise ValueError(f"Unknown output format '{output_format}'; expected one of {OUTPUT_FORMATS}")
+        self.log_path = run_path + ".jsonl"
+        self.output_path = f"{run_path}.{output_format}"
+        self.fsync_every = fsync_every
+        self.fsync_seconds = fsync_seconds
+        os.makedirs(os.path.dirname(self.log_path) or ".", exist_ok=True)
+        _truncate_torn_tail(self.log_path)
+        self._f = open(self.log_path, "a", encoding="utf-8")
+        self._unsynced = 0
+        self._last_sync = time.monotonic()
+        self.rows_written = 0
+
+    def append(self, row):
+        self._f.write(json.dumps(row, ensure_ascii=False, default=_to_json) + "\n")
+        self._f.flush()
+        self._unsynced += 1
+        self.rows_written += 1
+        if self._unsynced >= self.fsync_every or time.monotonic() - self._last_sync >= self.fsync_seconds:
+            self.sync()
+
+    def sync(self):
+        self._f.flush()
+        os.fsync(self._f.fileno())
+        self._unsynced = 0
+        self._last_sync = time.monotonic()
+
+    def close(self, compact_log=True, order=None):
+        """Syncs the log and (by default) compacts it into `output_path`; returns the results DataFrame."""
+        if self._f.closed:
+            return None
+        self.sync()
+        self._f.close()
+        return compact(self.log_path, self.output_path, order) if compact_log else None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
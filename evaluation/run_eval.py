@@ -1,91 +1,399 @@
 import os
 import json
 import argparse
-import pandas as pd
-import torch
 import logging
+import functools
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
 from datetime import datetime
 from tqdm import tqdm
-from transformers import AutoTokenizer, AutoModelForCausalLM, BitsAndBytesConfig
-from peft import PeftModel
 from evaluation.scorers import grade_mcq, grade_numeric, grade_explanation
-# Assumes rag_utils is available 
+from evaluation.score import grade_mcq_local, grade_numeric_local, grade_explanation_local
+from model_registry import DEFAULT_MODEL, MERGE_MANIFEST_FILE, MODEL_REGISTRY, get_merged_spec, get_model_spec, is_cpu
+from evaluation.model_manager import ModelManager, parse_adapters
+from evaluation.matrix import describe, expand, load_spec, plan
+from evaluation.generation_cache import GENERATION_CACHE_DIR, GenerationCache
+from evaluation.prompts import PASSAGE_SEPARATOR, build_prompt
+from evaluation.context_builder import DEFAULT_CONTEXT_BUDGET, build_context
+from evaluation.prefix_cache import PrefixKVCache, generate_with_prefix_cache
+from evaluation.tracing import Tracer, format_summary, get_tracer, row_columns, set_tracer, span, timing_streamer
+from evaluation.reranker import DEFAULT_FETCH_K, DEFAULT_RERANK_MODEL, CrossEncoderReranker
+from evaluation.result_log import (OUTPUT_FORMATS, RUN_MANIFEST_SUFFIX, ResultLog, completed_keys, merge_shards,
+                                   mismatch_reasons, read_run_manifest, row_key, shard_path, write_run_manifest)
+from fingerprint import file_sha256, path_sha256
+# Assumes rag_utils is available (cheap to import: the index stack loads with the first index)
 try:
-    from evaluation.rag_utils import load_index, retrieve, format_docs
+    from evaluation.rag_utils import load_index, retrieve
 except ImportError:
     print("Warning: rag_utils not found or failed to import. RAG will not work.")
 
-# Setup Logging
-logging.basicConfig(level=logging.INFO)
+# torch / transformers / peft are imported where a model is loaded or run, so `--help` and
+# planning-only code paths start without them. Logging is set up in main().
 logger = logging.getLogger(__name__)
 
-BASE_MODEL_ID = "mistralai/Mistral-7B-Instruct-v0.2"
+BASE_MODEL_ID = MODEL_REGISTRY[DEFAULT_MODEL]["model_id"]
 ADAPTER_PATH = "mistral-7b-physics-finetuned"
 EVAL_DATA_PATH = "evaluation/physics_questions_50.json"
 LOG_DIR = "evaluation/run_logs"
 
-def setup_output_file():
+def setup_run_path():
+    # Rows are appended to <run>.jsonl and compacted to <run>.csv / .parquet at the end
     if not os.path.exists(LOG_DIR):
         os.makedirs(LOG_DIR)
     timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
-    return os.path.join(LOG_DIR, f"eval_results_{timestamp}.csv")
-
-def load_models(run_finetuned=False, adapter_id=ADAPTER_PATH):
-    logger.info(f"Loading Base Model: {BASE_MODEL_ID}")
-    bnb_config = BitsAndBytesConfig(
-        load_in_4bit=True,
-        bnb_4bit_quant_type="nf4",
-        bnb_4bit_compute_dtype=torch.float16
-    )
-    
-    tokenizer = AutoTokenizer.from_pretrained(BASE_MODEL_ID)
-    tokenizer.pad_token = tokenizer.eos_token
-    
-    model = AutoModelForCausalLM.from_pretrained(
-        BASE_MODEL_ID,
-        quantization_config=bnb_config,
-        device_map="auto"
+    run_path = os.path.join(LOG_DIR, f"eval_results_{timestamp}")
+    # Logs are opened for append, so two runs started in the same second must not share a name
+    suffix = 1
+    while os.path.exists(run_path + RUN_MANIFEST_SUFFIX):
+        suffix += 1
+        run_path = os.path.join(LOG_DIR, f"eval_results_{timestamp}_{suffix}")
+    return run_path
+
+def resolve_run_path(run):
+    # Accepts the run name, its .jsonl / .csv / .parquet / .run.json file, or the path without extension
+    for suffix in (".run.json", ".jsonl", ".csv", ".parquet"):
+        if run.endswith(suffix):
+            run = run[:-len(suffix)]
+            break
+    return run if os.path.dirname(run) else os.path.join(LOG_DIR, run)
+
+# Run-wide arguments that change what a row contains (per-config ones are in the configs themselves)
+RESUME_SETTINGS = ["max_new_tokens", "rag_corpus", "rag_storage", "embedding_backend", "rerank_fetch_k"]
+
+@functools.lru_cache(maxsize=None)
+def _weights_sha256(model_id):
+    # Local checkpoints / adapters are hashed (once per process); HF Hub IDs are recorded by name only
+    return path_sha256(model_id) if os.path.exists(model_id) else None
+
+def run_fingerprint(args, configs, adapters):
+    models = {}
+    for model in dict.fromkeys(c["model"] for c in configs):
+        spec = model_spec(args, model)
+        models[model] = {"model_id": spec["model_id"], "sha256": _weights_sha256(spec["model_id"]),
+                         "quantization": spec["quantization"]}
+    return {
+        "models": models,
+        "adapters": {name: {"path": path, "sha256": _weights_sha256(path)} for name, path in adapters.items()},
+        "eval_file_sha256": file_sha256(args.eval_file),
+        "configs": configs,
+        "settings": {key: getattr(args, key) for key in RESUME_SETTINGS},
+    }
+
+# (mcq, numeric, explanation) graders; "local" needs no API key or network
+GRADERS = {
+    "claude": (grade_mcq, grade_numeric, grade_explanation),
+    "local": (grade_mcq_local, grade_numeric_local, grade_explanation_local),
+}
+
+def decoding_params(max_new_tokens=512):
+    return dict(
+        max_new_tokens=max_new_tokens,
+        do_sample=True,
+        temperature=0.1 # Low temp for deterministic evaluation
     )
-    
-    if run_finetuned:
-        if not adapter_id:
-            raise ValueError("Adapter ID/Path must be provided for finetuned mode.")
-        logger.info(f"Loading LoRA Adapter from {adapter_id}")
-        model = PeftModel.from_pretrained(model, adapter_id)
-    
-    return model, tokenizer
 
-def generate_answer(model, tokenizer, question, context=None):
-    if context:
-        prompt = f"[INST] Context:\n{context}\n\nQuestion: {question}\n\nAnswer concisely. If MCQ, output only the option letter. If Numeric, output only the number. [/INST]"
+def generate_answer(model, tokenizer, question, context=None, max_new_tokens=512, prefix_cache=None, cache_namespace=None,
+                    return_counts=False, prompt_ids=None):
+    """
+    Answer text; with return_counts, (answer, prompt tokens, generated tokens). `prompt_ids`, the
+    tokenized build_prompt(question, context), skips tokenizing the prompt again.
+    """
+    import torch
+
+    gen_kwargs = decoding_params(max_new_tokens)
+    streamer = timing_streamer()  # prefill / decode spans when a tracer is active
+    if streamer is not None:
+        gen_kwargs["streamer"] = streamer
+    if prompt_ids is None:
+        with span("tokenize"):
+            prompt_ids = tokenizer(build_prompt(question, context))["input_ids"]
+    prompt_tokens = len(prompt_ids)
+    if prefix_cache is not None:
+        # Prefill only what follows the longest cached prompt prefix
+        outputs = generate_with_prefix_cache(model, tokenizer, question, context, prefix_cache, cache_namespace,
+                                             prompt_ids=prompt_ids, **gen_kwargs)
     else:
-        prompt = f"[INST] Question: {question}\n\nAnswer concisely. If MCQ, output only the option letter. If Numeric, output only the number. [/INST]"
-    
-    inputs = tokenizer(prompt, return_tensors="pt").to(model.device)
-    
-    with torch.no_grad():
-        outputs = model.generate(
-            **inputs,
-            max_new_tokens=512,
-            do_sample=True,
-            temperature=0.1 # Low temp for deterministic evaluation
-        )
+        input_ids = torch.tensor([prompt_ids], device=model.device)
+        with torch.no_grad():
+            outputs = model.generate(input_ids=input_ids, attention_mask=torch.ones_like(input_ids), **gen_kwargs)
     
     response = tokenizer.decode(outputs[0], skip_special_tokens=True)
     if "[/INST]" in response:
         response = response.split("[/INST]")[-1].strip()
+    if return_counts:
+        return response, prompt_tokens, len(outputs[0]) - prompt_tokens
     return response
 
+def retrieve_context(tokenizer, q, db=None, context_budget=DEFAULT_CONTEXT_BUDGET, rag_k=3, reranker=None, retrieval="dense"):
+    """(context, context info) for one question; empty without an index."""
+    if not db:
+        return "", {"tokens": 0}
+    docs = retrieve(db, q['question'], k=rag_k, reranker=reranker, mode=retrieval)
+    with span("context"):
+        return build_context(docs, tokenizer, context_budget, separator=PASSAGE_SEPARATOR)
+
+def generate_cached(manager, adapter, q, context, args, generation_cache, model_identity, adapter_identity, prefix_cache=None):
+    """
+    Answer for `q` from the generation cache, generating (and caching) it on a miss. The model is
+    only touched on a miss, so with a lazy ModelManager all-hit runs never load weights.
+    Returns (answer, cache hit).
+    """
+    decoding = decoding_params(args.max_new_tokens)
+    key = prompt_ids = None
+    if generation_cache is not None:
+        with span("tokenize"):
+            prompt_ids = manager.tokenizer(build_prompt(q['question'], context))["input_ids"]
+        key = generation_cache.key(model_identity, adapter_identity, prompt_ids, decoding)
+        entry = generation_cache.get(key)
+        if entry is not None:
+            return entry["text"], True
+    with manager.activate(adapter) as model:
+        ans, prompt_tokens, new_tokens = generate_answer(model, manager.tokenizer, q['question'], context,
+                                                         max_new_tokens=args.max_new_tokens, prefix_cache=prefix_cache,
+                                                         cache_namespace=adapter, return_counts=True, prompt_ids=prompt_ids)
+    if generation_cache is not None:
+        generation_cache.put(key, ans, prompt_tokens, new_tokens)
+    return ans, False
+
+def grade_answer(q, ans, context_info, graders=GRADERS["claude"]):
+    """Grades one generated answer. Returns the result row without 'config'."""
+    grade_mcq_fn, grade_numeric_fn, grade_explanation_fn = graders
+    score_mcq = 0.0
+    score_num = 0.0
+    score_exp = 0.0
+    reasoning = ""
+
+    if q['type'] == 'mcq':
+        score_mcq = grade_mcq_fn(ans, q['answer'])
+    elif q['type'] == 'numeric':
+        score_num = grade_numeric_fn(ans, q['answer'])
+    elif q['type'] == 'explanation':
+        res = grade_explanation_fn(ans, q['answer'])
+        score_exp = res['score']
+        reasoning = res['reasoning']
+
+    return {
+        "question_id": q.get('id'),
+        "type": q['type'],
+        "question": q['question'],
+        "predicted": ans,
+        "correct": q['answer'],
+        "score_mcq": score_mcq,
+        "score_numeric": score_num,
+        "score_explanation": score_exp,
+        "reasoning": reasoning,
+        "context_tokens": context_info["tokens"]
+    }
+
+def adapters_for(args, matrix=None):
+    if matrix is not None:
+        return matrix.get("adapters", {})
+    return parse_adapters(args.adapter_id) if not args.merged_model else {}
+
+def axis_defaults(args):
+    return {"model": args.model, "adapter": None, "rag": args.rag, "retrieval": args.retrieval, "rag_k": args.rag_k,
+            "rerank": args.rerank, "context_budget": args.context_budget, "grader": args.grader}
+
+def build_configs(args, adapters):
+    """
+    Configs (see evaluation/matrix.py) of a --mode run. --merged_model stands in for the adapters:
+    its configs use the merged checkpoint as their model instead.
+    """
+    defaults = axis_defaults(args)
+    finetuned = {name: {"adapter": name} for name in adapters}
+    if args.merged_model:
+        finetuned = {"merged": {"model": args.merged_model}}
+
+    def ft_label(prefix, name):
+        return prefix if len(finetuned) == 1 else f"{prefix}[{name}]"
+
+    def config(name, rag, **axes):
+        return {**defaults, "name": name, "rag": rag, **axes}
+
+    configs = []
+    if args.mode == "all":
+        configs = [config("Base", False), config("Base+RAG", True)]
+        for name, axes in finetuned.items():
+            configs += [config(ft_label("Finetuned", name), False, **axes),
+                        config(ft_label("Finetuned", name) + "+RAG", True, **axes)]
+    elif args.mode == "finetuned":
+        for name, axes in finetuned.items():
+            configs.append(config(ft_label("finetuned", name) + ("+RAG" if args.rag else ""), args.rag, **axes))
+    else:
+        configs.append(config(args.mode + ("+RAG" if args.rag else ""), args.rag))
+    return configs
+
+def model_spec(args, model, device=None):
+    # Merged checkpoints (finetuning/merge_adapter.py) carry their own loading settings
+    device = device or args.device
+    if os.path.exists(os.path.join(model, MERGE_MANIFEST_FILE)):
+        return get_merged_spec(model, device=device)
+    return get_model_spec(model, quantization=args.quantization, device=device)
+
+def load_index_for(args):
+    try:
+        db = load_index(args.rag_corpus, args.rag_storage, args.embedding_backend)
+        logger.info("RAG Index loaded.")
+        return db
+    except Exception as e:
+        logger.warning(f"RAG Load Error: {e}")
+
+def question_key(q):
+    return row_key({"config": None, "question_id": q.get("id"), "question": q["question"]})[1]
+
+def run_plan(args, planned, adapters, questions, result_log, done=frozenset(), device=None):
+    """
+    Evaluates every (config, question) of `planned` (evaluation/matrix.py `plan`) not in `done`,
+    appending rows to `result_log`. Each answer is generated once per generation unit and graded
+    for every config of the unit that still needs it. Stage timings go to the active tracer
+    (evaluation/tracing.py) and the rows' `<stage>_ms` columns.
+    """
+    def pending(configs, q):
+        return [c for c in configs if (c["name"], question_key(q)) not in done]
+
+    tracer = get_tracer()
+    if tracer is None:
+        tracer = Tracer()
+        set_tracer(tracer)
+
+    db, rerankers = None, {}
+    generation_cache = None if args.no_generation_cache else GenerationCache(args.generation_cache_dir)
+    for model_name, units in planned:
+        # Finished units are skipped before loading anything, so a fully done model loads no weights
+        units = [(gen, configs) for gen, configs in units if any(pending(configs, q) for q in questions)]
+        if not units:
+            continue
+        if db is None and any(gen["rag"] for gen, _ in units):
+            db = load_index_for(args)
+        # Weights load on the first generation-cache miss; a run re-graded from cache loads none
+        spec = model_spec(args, model_name, device)
+        manager = ModelManager(spec, lazy=True)
+        for name in dict.fromkeys(gen["adapter"] for gen, _ in units if gen["adapter"]):
+            manager.add_adapter(name, adapters[name])
+        model_identity = {key: spec[key] for key in ("model_id", "quantization", "dtype")}
+        model_identity["sha256"] = _weights_sha256(spec["model_id"])
+
+        prefix_cache = PrefixKVCache(args.prefix_cache_mb * 1024 * 1024) if args.prefix_cache_mb > 0 else None
+        for gen, configs in units:
+            logger.info(f"Running Configuration: {', '.join(c['name'] for c in configs)}")
+            reranker = None
+            if gen["rag"] and gen["rerank"] and db is not None:
+                if gen["rerank"] not in rerankers:
+                    rerankers[gen["rerank"]] = CrossEncoderReranker(gen["rerank"], fetch_k=args.rerank_fetch_k,
+                                                                    latency_budget_ms=args.rerank_budget_ms)
+                    logger.info(f"Re-ranking top-{args.rerank_fetch_k} with {gen['rerank']}")
+                reranker = rerankers[gen["rerank"]]
+            adapter = gen["adapter"]
+            adapter_identity = (_weights_sha256(adapters[adapter]) or adapters[adapter]) if adapter else None
+            try:
+                for q in tqdm([q for q in questions if pending(configs, q)]):
+                    tracer.start_row()
+                    context, context_info = retrieve_context(manager.tokenizer, q, db if gen["rag"] else None,
+                                                             gen["context_budget"], gen["rag_k"], reranker, gen["retrieval"])
+                    ans, cached = generate_cached(manager, adapter, q, context, args, generation_cache,
+                                                  model_identity, adapter_identity, prefix_cache)
+                    shared = tracer.start_row()
+                    for config in pending(configs, q):
+                        with span("grade"):
+                            row = grade_answer(q, ans, context_info, GRADERS[config["grader"]])
+                        timings = {**shared, **tracer.start_row()}
+                        with span("write"):
+                            result_log.append({"config": config["name"], **row, "generation_cached": cached,
+                                               **row_columns(timings)})
+            except Exception as e:
+                logger.error(f"Configuration {', '.join(c['name'] for c in configs)} failed: {e}")
+
+        if prefix_cache is not None:
+            logger.info(f"Prefix cache: {prefix_cache.stats()}")
+        loaded = manager.loaded
+        if not loaded:
+            logger.info(f"{model_name}: every answer came from the generation cache; weights not loaded")
+        manager = prefix_cache = None
+        if loaded:
+            import torch
+            if torch.cuda.is_available():
+                torch.cuda.empty_cache()
+
+    for name, reranker in rerankers.items():
+        logger.info(f"Re-ranker {name}: {reranker.stats()}")
+    if generation_cache is not None:
+        generation_cache.close()
+        logger.info(f"Generation cache: {generation_cache.stats()}")
+
+def _run_shard(args, shard, run_path, configs, adapters, done):
+    """
+    Worker process: questions shard, shard + N, ... of every config, logged to <run>.shard<i>.jsonl.
+    Returns (rows written, trace events).
+    """
+    logging.basicConfig(level=logging.INFO)
+    tracer = Tracer()
+    set_tracer(tracer)
+    device = args.devices[shard % len(args.devices)] if args.devices else None
+    if all(is_cpu(model_spec(args, model, device)) for model in dict.fromkeys(c["model"] for c in configs)):
+        # Workers share the cores instead of each starting a full-size thread pool
+        import torch
+        torch.set_num_threads(max(1, (os.cpu_count() or 1) // args.workers))
+    with open(args.eval_file, "r") as f:
+        questions = json.load(f)[shard::args.workers]
+    result_log = ResultLog(shard_path(run_path, shard), fsync_every=args.fsync_every)
+    run_plan(args, plan(configs), adapters, questions, result_log, done, device)
+    result_log.close(compact_log=False)
+    return result_log.rows_written, tracer.events
+
+def run_sharded(args, run_path, configs, adapters, done, tracer):
+    # spawn: CUDA and torch thread pools do not survive fork
+    ctx = multiprocessing.get_context("spawn")
+    with ProcessPoolExecutor(args.workers, mp_context=ctx) as pool:
+        futures = [pool.submit(_run_shard, args, shard, run_path, configs, adapters, done) for shard in range(args.workers)]
+        for shard, future in enumerate(futures):
+            try:
+                rows, events = future.result()
+                tracer.events.extend(events)
+                logger.info(f"Shard {shard} finished: {rows} rows")
+            except Exception as e:
+                logger.error(f"Shard {shard} failed: {e}")
+
 def main():
+    logging.basicConfig(level=logging.INFO)
     parser = argparse.ArgumentParser()
     parser.add_argument("--mode", choices=["base", "finetuned", "all"], default="all")
     parser.add_argument("--rag", action="store_true", help="Enable RAG")
     parser.add_argument("--eval_file", default=EVAL_DATA_PATH)
-    parser.add_argument("--adapter_id", default=ADAPTER_PATH, help="Path or HF ID of the adapter to load")
+    parser.add_argument("--adapter_id", nargs="+", default=[ADAPTER_PATH], help="Path or HF ID of the adapter to load; several as name=path")
+    parser.add_argument("--model", default=DEFAULT_MODEL, help=f"Registry name ({', '.join(MODEL_REGISTRY)}) or HF model ID")
+    parser.add_argument("--quantization", default="default", help="Override the registry quantization (nf4, int8, dynamic-int8, none)")
+    parser.add_argument("--device", default=None, help="Override the registry device_map (e.g. cpu)")
+    parser.add_argument("--grader", choices=list(GRADERS), default="claude")
+    parser.add_argument("--max_new_tokens", type=int, default=512)
+    parser.add_argument("--context_budget", type=int, default=DEFAULT_CONTEXT_BUDGET, help="Max tokens of retrieved context per RAG prompt")
+    parser.add_argument("--rag_corpus", choices=["alpaca-qa", "openstax"], default="alpaca-qa", help="Corpus to retrieve from (rag_pipeline/corpora.py)")
+    parser.add_argument("--rag_storage", choices=["float32", "float16", "int8", "binary"], default="float32", help="Vector storage of the RAG index")
+    parser.add_argument("--embedding_backend", choices=["torch", "onnx", "onnx-int8"], default="torch", help="Query/index embedding backend (evaluation/embedders.py)")
+    parser.add_argument("--retrieval", choices=["dense", "bm25", "hybrid"], default="dense", help="First-stage retrieval: MiniLM/FAISS, BM25, or RRF fusion of both")
+    parser.add_argument("--rag_k", type=int, default=3, help="Passages kept per RAG question")
+    parser.add_argument("--rerank", nargs="?", const=DEFAULT_RERANK_MODEL, default=None, help="Re-rank retrieved passages with a cross-encoder (optionally its HF ID)")
+    parser.add_argument("--rerank_fetch_k", type=int, default=DEFAULT_FETCH_K, help="Candidates fetched for re-ranking")
+    parser.add_argument("--rerank_budget_ms", type=float, default=None, help="Skip re-ranking a question when predicted to exceed this latency")
+    parser.add_argument("--prefix_cache_mb", type=int, default=0, help="Reuse prompt-prefix KV caches up to this many MB (0 = off)")
+    parser.add_argument("--output_format", choices=OUTPUT_FORMATS, default="csv", help="Table the result log is compacted to at the end")
+    parser.add_argument("--fsync_every", type=int, default=20, help="fsync the result log every N rows (and at least every 30s)")
+    parser.add_argument("--resume", default=None, help="Continue run_logs/<run>: skip (config, question) pairs already logged")
+    parser.add_argument("--workers", type=int, default=1, help="Shard questions over N processes, each with its own model replica")
+    parser.add_argument("--devices", nargs="+", default=None, help="Devices assigned to workers round-robin (e.g. cuda:0 cuda:1); default --device")
+    parser.add_argument("--generation_cache_dir", default=GENERATION_CACHE_DIR, help="Persistent cache of generated answers (re-grading reuses them)")
+    parser.add_argument("--no_generation_cache", action="store_true", help="Always generate; neither read nor write the generation cache")
+    parser.add_argument("--matrix", default=None, help="Eval-matrix spec (YAML/JSON, see evaluation/matrix.py) replacing --mode/--adapter_id")
+    parser.add_argument("--trace", default=None, help="Write per-stage spans as Chrome trace JSON (chrome://tracing, Perfetto)")
+    parser.add_argument("--merged_model", default=None, help="Merged checkpoint dir (finetuning/merge_adapter.py) used for the finetuned configs instead of --adapter_id")
     args = parser.parse_args()
 
-    output_file = setup_output_file()
-    logger.info(f"Results will be saved to {output_file}")
+    matrix = None
+    if args.matrix:
+        matrix = load_spec(args.matrix)
+        for key, value in matrix.get("settings", {}).items():
+            if not hasattr(args, key):
+                parser.error(f"{args.matrix}: unknown setting '{key}'")
+            setattr(args, key, value)
 
     if not os.path.exists(args.eval_file):
         logger.error(f"Error: Eval file {args.eval_file} not found.")
@@ -93,128 +401,60 @@ def main():
 
     with open(args.eval_file, "r") as f:
         questions = json.load(f)
+    adapters = adapters_for(args, matrix)
+    configs = expand(matrix, axis_defaults(args)) if matrix else build_configs(args, adapters)
+    logger.info(describe(plan(configs)))
+    # Merged logs list rows by config, then question, however the shards were scheduled
+    order = {}
+    for name in (c["name"] for c in configs):
+        for q in questions:
+            order.setdefault((name, question_key(q)), len(order))
 
-    # Load RAG if needed
-    db = None
-    if args.rag or args.mode == "all":
-        try:
-            db = load_index()
-            logger.info("RAG Index loaded.")
-        except Exception as e:
-            logger.warning(f"RAG Load Error: {e}")
-
-    results = []
+    fingerprint = run_fingerprint(args, configs, adapters)
+    done = set()
+    if args.resume:
+        run_path = resolve_run_path(args.resume)
+        recorded = read_run_manifest(run_path)
+        if recorded is None:
+            logger.error(f"Error: no run manifest for {run_path}; cannot resume.")
+            return
+        reasons = mismatch_reasons(recorded, fingerprint)
+        if reasons:
+            logger.error(f"Cannot resume {run_path}: " + "; ".join(reasons))
+            return
+        merge_shards(run_path, order)  # rows a crashed sharded run left in its shard logs
+        done = completed_keys(run_path + ".jsonl")
+        logger.info(f"Resuming {run_path}: {len(done)} (config, question) results already logged")
+    else:
+        run_path = setup_run_path()
+        write_run_manifest(run_path, fingerprint)
 
-    # Define configurations
-    configs = []
-    if args.mode == "all":
-        configs = [
-            ("Base", False, False),
-            ("Base+RAG", False, True),
-            ("Finetuned", True, False),
-            ("Finetuned+RAG", True, True)
-        ]
+    tracer = Tracer()
+    set_tracer(tracer)
+    if args.workers > 1:
+        logger.info(f"Sharding {len(configs)} configs x {len(questions)} questions over {args.workers} workers")
+        run_sharded(args, run_path, configs, adapters, done, tracer)
+        logger.info(f"Merged {merge_shards(run_path, order)} rows into {run_path}.jsonl")
+        result_log = ResultLog(run_path, args.output_format)
     else:
-        is_ft = (args.mode == "finetuned")
-        configs.append((args.mode + ("+RAG" if args.rag else ""), is_ft, args.rag))
-
-    # --- Run Base Tasks First ---
-    base_confs = [c for c in configs if not c[1]]
-    if base_confs:
-        model, tokenizer = load_models(run_finetuned=False)
-        for name, _, use_rag in base_confs:
-            logger.info(f"Running Configuration: {name}")
-            for q in tqdm(questions):
-                context = ""
-                if use_rag and db:
-                    docs = retrieve(db, q['question'])
-                    context = format_docs(docs)
-                
-                ans = generate_answer(model, tokenizer, q['question'], context)
-                
-                # Grading
-                score_mcq = 0.0
-                score_num = 0.0
-                score_exp = 0.0
-                reasoning = ""
-                
-                if q['type'] == 'mcq':
-                    score_mcq = grade_mcq(ans, q['answer'])
-                elif q['type'] == 'numeric':
-                    score_num = grade_numeric(ans, q['answer'])
-                elif q['type'] == 'explanation':
-                    res = grade_explanation(ans, q['answer'])
-                    score_exp = res['score']
-                    reasoning = res['reasoning']
-                
-                results.append({
-                    "config": name,
-                    "question_id": q.get('id'),
-                    "type": q['type'],
-                    "question": q['question'],
-                    "predicted": ans,
-                    "correct": q['answer'],
-                    "score_mcq": score_mcq,
-                    "score_numeric": score_num,
-                    "score_explanation": score_exp,
-                    "reasoning": reasoning
-                })
-                pd.DataFrame(results).to_csv(output_file, index=False)
-        
-        del model
-        torch.cuda.empty_cache()
-
-    # --- Run Finetuned Tasks ---
-    ft_confs = [c for c in configs if c[1]]
-    if ft_confs:
-        try:
-            logger.info("Loading Finetuned Model...")
-            model, tokenizer = load_models(run_finetuned=True, adapter_id=args.adapter_id)
-            for name, _, use_rag in ft_confs:
-                logger.info(f"Running Configuration: {name}")
-                for q in tqdm(questions):
-                    context = ""
-                    if use_rag and db:
-                        docs = retrieve(db, q['question'])
-                        context = format_docs(docs)
-                    
-                    ans = generate_answer(model, tokenizer, q['question'], context)
-                    
-                    # Grading
-                    score_mcq = 0.0
-                    score_num = 0.0
-                    score_exp = 0.0
-                    reasoning = ""
-                    
-                    if q['type'] == 'mcq':
-                        score_mcq = grade_mcq(ans, q['answer'])
-                    elif q['type'] == 'numeric':
-                        score_num = grade_numeric(ans, q['answer'])
-                    elif q['type'] == 'explanation':
-                        res = grade_explanation(ans, q['answer'])
-                        score_exp = res['score']
-                        reasoning = res['reasoning']
-                    
-                    results.append({
-                        "config": name,
-                        "question_id": q.get('id'),
-                        "type": q['type'],
-                        "question": q['question'],
-                        "predicted": ans,
-                        "correct": q['answer'],
-                        "score_mcq": score_mcq,
-                        "score_numeric": score_num,
-                        "score_explanation": score_exp,
-                        "reasoning": reasoning
-                    })
-                    pd.DataFrame(results).to_csv(output_file, index=False)
-        except Exception as e:
-            logger.error(f"Finetuned run failed: {e}")
-
-    # Final Save
-    df = pd.DataFrame(results)
-    df.to_csv(output_file, index=False)
-    logger.info(f"Final results saved to {output_file}")
+        result_log = ResultLog(run_path, args.output_format, fsync_every=args.fsync_every)
+        logger.info(f"Appending results to {result_log.log_path}")
+        run_plan(args, plan(configs), adapters, questions, result_log, done)
+
+    # Final Save: the table lists rows by config, then question, whatever order they were logged in
+    # (plan order, shard merges, resumed runs)
+    df = result_log.close(order=order)
+    logger.info(f"Final results saved to {result_log.output_path}")
+    if tracer.events:
+        summary = tracer.summary()
+        with open(run_path + ".latency.json", "w", encoding="utf-8") as f:
+            json.dump(summary, f, indent=2)
+        print(format_summary(summary))
+        if args.trace:
+            tracer.write_chrome_trace(args.trace)
+            logger.info(f"Chrome trace ({len(tracer.events)} spans) saved to {args.trace}")
+    if df.empty:
+        return
     print(df.groupby("config")[["score_mcq", "score_numeric", "score_explanation"]].mean())
 
 if __name__ == "__main__":
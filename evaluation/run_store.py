@@ -0,0 +1,282 @@
+"""Columnar store of eval run logs, for analyses across many runs.
+
+`ingest` converts each run log (`run_logs/*.jsonl|csv|parquet`, `results_*.csv`) into a Parquet
+dataset partitioned by run and config:
+
+    .cache/run_store/
+      manifest.json                          # run -> source file + hash, rows, configs, types, columns
+      run=<run>/config=<config>/part-0.parquet
+
+Labels (config, type, model, grader, ...) are stored dictionary-encoded; free text (question,
+predicted, correct, reasoning) is stored plain, so a query that does not ask for it never
+decodes it. Every row also gets a `score` on 0-1 (the score column of its question type,
+explanations / 5), so most queries read a single column. A run whose source file hash is
+unchanged is not re-ingested.
+
+`query` aggregates over the store, reading only the group-by / metric / filter columns. Run and
+config filters select partition directories (other files are never opened); the type filter is
+pushed down to the Parquet row groups.
+
+Usage:
+python -m evaluation.run_store ingest
+python -m evaluation.run_store ingest evaluation/run_logs/eval_results_20260129_*.csv --force
+python -m evaluation.run_store query --by config type
+python -m evaluation.run_store query --by run config --runs 'eval_results_202601*' --types mcq --metrics score score_mcq
+"""
+
+import argparse
+import fnmatch
+import glob
+import json
+import logging
+import os
+import shutil
+import time
+from datetime import datetime
+from urllib.parse import quote
+
+from evaluation.result_log import read_run_manifest, read_table
+from evaluation.significance import SCORE_COLUMNS, SCORE_SCALE
+from fingerprint import file_sha256
+
+logger = logging.getLogger(__name__)
+
+RUN_STORE_DIR = ".cache/run_store"
+MANIFEST_FILE = "manifest.json"
+DEFAULT_SOURCES = ["evaluation/run_logs/*", "evaluation/results_*.csv"]
+# Same run in several forms (run_eval keeps the JSONL log next to its compacted table): most complete first
+SOURCE_PREFERENCE = (".jsonl", ".parquet", ".csv")
+PARTITION_COLUMNS = ("run", "config")
+FREE_TEXT_COLUMNS = ("question", "predicted", "correct", "reasoning")
+REQUIRED_COLUMNS = ("config", "type", "question")
+
+
+def read_manifest(store_dir=RUN_STORE_DIR):
+    path = os.path.join(store_dir, MANIFEST_FILE)
+    if not os.path.exists(path):
+        return {"runs": {}}
+    with open(path, "r", encoding="utf-8") as f:
+        return json.load(f)
+
+
+def write_manifest(store_dir, manifest):
+    path = os.path.join(store_dir, MANIFEST_FILE)
+    with open(path + ".tmp", "w", encoding="utf-8") as f:
+        json.dump(manifest, f, indent=2)
+    os.replace(path + ".tmp", path)
+
+
+def run_sources(patterns):
+    """{run name: source path}, one source per run (see SOURCE_PREFERENCE); shard logs are skipped."""
+    sources = {}
+    for pattern in patterns:
+        for path in sorted(glob.glob(pattern) or [pattern]):
+            ext = os.path.splitext(path)[1]
+            if ext not in SOURCE_PREFERENCE or ".shard" in os.path.basename(path):
+                continue
+            run = os.path.basename(path)[:-len(ext)]
+            current = sources.get(run)
+            if current is None or SOURCE_PREFERENCE.index(ext) < SOURCE_PREFERENCE.index(os.path.splitext(current)[1]):
+                sources[run] = path
+    return sources
+
+
+def to_arrow(df):
+    """Result rows -> Arrow table with the store's column types (consistent across runs)."""
+    import pyarrow as pa
+
+    df = df.copy()
+    df["score"] = 0.0
+    for qtype, column in SCORE_COLUMNS.items():
+        mask = df["type"] == qtype
+        df.loc[mask, "score"] = df.loc[mask, column].astype(float) / SCORE_SCALE[qtype]
+    for column in SCORE_COLUMNS.values():
+        df[column] = df[column].astype(float)
+    if "question_id" in df:
+        df["question_id"] = df["question_id"].map(lambda v: None if v is None or v != v else str(v))
+
+    table = pa.Table.from_pandas(df, preserve_index=False)
+    fields = []
+    for field in table.schema:
+        if field.name in PARTITION_COLUMNS:
+            fields.append(pa.field(field.name, pa.string()))
+        elif pa.types.is_null(field.type) or field.name == "question_id" or field.name in FREE_TEXT_COLUMNS:
+            fields.append(pa.field(field.name, pa.string()))
+        elif pa.types.is_string(field.type) or pa.types.is_large_string(field.type):
+            fields.append(pa.field(field.name, pa.dictionary(pa.int32(), pa.string())))
+        elif pa.types.is_integer(field.type):
+            fields.append(pa.field(field.name, pa.int64()))
+        else:
+            fields.append(field)
+    return table.cast(pa.schema(fields))
+
+
+def ingest_run(store_dir, run, source):
+    """Writes `source` as `run=<run>/config=<config>/` partitions, replacing any earlier copy of the run."""
+    import pyarrow.dataset as ds
+
+    df = read_table(source)
+    missing = [c for c in REQUIRED_COLUMNS if c not in df]
+    if missing:
+        raise ValueError(f"not a per-question result log (no {', '.join(missing)} column)")
+    table = to_arrow(df)
+    run_dir = os.path.join(store_dir, f"run={quote(run, safe='')}")
+    tmp_dir = os.path.join(store_dir, f".run={quote(run, safe='')}.tmp")
+    shutil.rmtree(tmp_dir, ignore_errors=True)
+    file_format = ds.ParquetFileFormat()
+    ds.write_dataset(
+        table, tmp_dir, format=file_format,
+        partitioning=ds.partitioning(table.select(["config"]).schema, flavor="hive"),
+        file_options=file_format.make_write_options(
+            compression="zstd",
+            use_dictionary=[f.name for f in table.schema if f.name not in FREE_TEXT_COLUMNS]),
+    )
+    shutil.rmtree(run_dir, ignore_errors=True)
+    os.replace(tmp_dir, run_dir)
+
+    return {
+        "source": source,
+        "source_sha256": file_sha256(source),
+        "ingested": datetime.now().isoformat(timespec="seconds"),
+        "rows": table.num_rows,
+        "configs": sorted(df["config"].dropna().astype(str).unique()),
+        "types": sorted(df["type"].dropna().astype(str).unique()),
+        "columns": [c for c in table.column_names if c != "config"],
+        "run_manifest": read_run_manifest(os.path.splitext(source)[0]),
+    }
+
+
+def ingest(sources, store_dir=RUN_STORE_DIR, force=False):
+    """Ingests new or changed runs; returns (ingested, unchanged) run names."""
+    os.makedirs(store_dir, exist_ok=True)
+    manifest = read_manifest(store_dir)
+    ingested, unchanged = [], []
+    for run, source in sorted(sources.items()):
+        recorded = manifest["runs"].get(run)
+        if not force and recorded and recorded["source_sha256"] == file_sha256(source):
+            unchanged.append(run)
+            continue
+        try:
+            manifest["runs"][run] = ingest_run(store_dir, run, source)
+        except ValueError as e:
+            logger.warning(f"Skipping {source}: {e}")
+            continue
+        write_manifest(store_dir, manifest)  # after every run, so an interrupted ingest keeps what it wrote
+        ingested.append(run)
+    return ingested, unchanged
+
+
+def open_store(store_dir=RUN_STORE_DIR):
+    """The store as one pyarrow dataset; columns missing from older runs read as null."""
+    import pyarrow as pa
+    import pyarrow.dataset as ds
+
+    partitioning = ds.HivePartitioning.discover(infer_dictionary=True)
+    files = sorted(glob.glob(os.path.join(glob.escape(store_dir), "run=*", "config=*", "*.parquet")))
+    kwargs = {"format": "parquet", "partitioning": partitioning, "partition_base_dir": store_dir}
+    dataset = ds.dataset(files, **kwargs)
+    # Footers only; the first file's schema would hide columns that later runs added
+    schema = pa.unify_schemas([f.physical_schema for f in dataset.get_fragments()] + [dataset.schema],
+                              promote_options="permissive")
+    return ds.dataset(files, schema=schema, **kwargs)
+
+
+def match(patterns, names):
+    return sorted({name for pattern in patterns for name in fnmatch.filter(names, pattern)})
+
+
+def query(store_dir=RUN_STORE_DIR, by=("config",), metrics=("score",), runs=None, configs=None, types=None):
+    """
+    Mean of each metric (and the row count) per `by` group, over the runs / configs / question
+    types matching the given glob patterns. Returns (pyarrow table, scan stats).
+    """
+    import pyarrow.compute as pc
+
+    manifest = read_manifest(store_dir)
+    if not manifest["runs"]:
+        raise ValueError(f"Run store {store_dir} is empty; run `python -m evaluation.run_store ingest` first")
+    dataset = open_store(store_dir)
+    unknown = [c for c in list(by) + list(metrics) if c not in dataset.schema.names]
+    if unknown:
+        raise ValueError(f"Unknown columns {unknown}; the store has {dataset.schema.names}")
+
+    conditions = []
+    if runs:
+        conditions.append(pc.field("run").isin(match(runs, list(manifest["runs"]))))
+    if configs:
+        all_configs = {c for entry in manifest["runs"].values() for c in entry["configs"]}
+        conditions.append(pc.field("config").isin(match(configs, all_configs)))
+    if types:
+        conditions.append(pc.field("type").isin(list(types)))
+    condition = None
+    for c in conditions:
+        condition = c if condition is None else condition & c
+
+    columns = list(dict.fromkeys(list(by) + list(metrics)))
+    start = time.perf_counter()
+    fragments = list(dataset.get_fragments(filter=condition))
+    table = dataset.to_table(columns=columns, filter=condition)
+    stats = {"files": len(fragments), "total_files": len(list(dataset.get_fragments())), "columns": columns,
+             "rows": table.num_rows, "seconds": time.perf_counter() - start}
+
+    for name in by:  # group on plain strings; dictionaries from different files need not agree
+        if str(table.schema.field(name).type).startswith("dictionary"):
+            table = table.set_column(table.schema.get_field_index(name), name, table[name].cast("string"))
+    result = table.group_by(list(by)).aggregate([(m, "mean") for m in metrics] + [([], "count_all")])
+    result = result.rename_columns(["rows" if c == "count_all" else c for c in result.column_names])
+    return result.sort_by([(name, "ascending") for name in by]), stats
+
+
+def print_table(table):
+    rows = table.to_pylist()
+    names = table.column_names
+    cells = [[f"{r[n]:.3f}" if isinstance(r[n], float) else str(r[n]) for n in names] for r in rows]
+    widths = [max([len(n)] + [len(c[i]) for c in cells]) for i, n in enumerate(names)]
+    print("  ".join(n.ljust(w) for n, w in zip(names, widths)))
+    for c in cells:
+        print("  ".join(v.ljust(w) for v, w in zip(c, widths)))
+
+
+def main():
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s - %(levelname)s - %(message)s")
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--store", default=RUN_STORE_DIR)
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    ingest_parser = commands.add_parser("ingest", help="Convert run logs into the store")
+    ingest_parser.add_argument("sources", nargs="*", default=DEFAULT_SOURCES, help="Run logs; globs are expanded")
+    ingest_parser.add_argument("--force", action="store_true", help="Re-ingest runs whose source is unchanged")
+
+    query_parser = commands.add_parser("query", help="Aggregate scores across runs")
+    query_parser.add_argument("--by", nargs="+", default=["config"], help="Group-by columns, e.g. run config type")
+    query_parser.add_argument("--metrics", nargs="+", default=["score"], help="Columns to average")
+    query_parser.add_argument("--runs", nargs="+", default=None, help="Run name globs")
+    query_parser.add_argument("--configs", nargs="+", default=None, help="Config name globs")
+    query_parser.add_argument("--types", nargs="+", default=None, help="Question types (mcq, numeric, explanation)")
+    query_parser.add_argument("--output", default=None, help="Write the aggregate table (.csv or .parquet)")
+    args = parser.parse_args()
+
+    if args.command == "ingest":
+        start = time.perf_counter()
+        ingested, unchanged = ingest(run_sources(args.sources), args.store, args.force)
+        logger.info(f"Ingested {len(ingested)} run(s), {len(unchanged)} unchanged, into {args.store} "
+                    f"in {time.perf_counter() - start:.2f}s")
+        return
+
+    table, stats = query(args.store, args.by, args.metrics, args.runs, args.configs, args.types)
+    print(f"Read {stats['files']}/{stats['total_files']} files, columns {stats['columns']}, "
+          f"{stats['rows']} rows in {stats['seconds']:.3f}s")
+    print_table(table)
+    if args.output:
+        os.makedirs(os.path.dirname(args.output) or ".", exist_ok=True)
+        if args.output.endswith(".parquet"):
+            import pyarrow.parquet as pq
+            pq.write_table(table, args.output)
+        else:
+            import pyarrow.csv as pcsv
+            pcsv.write_csv(table, args.output)
+        print(f"Saved to {args.output}")
+
+
+if __name__ == "__main__":
+    main()
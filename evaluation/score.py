@@ -28,6 +28,60 @@ def score_objective(pred: str, gold: str, gold_numeric: Optional[float] = None)
     return 1.0 if normalize_text(pred) == normalize_text(gold) else 0.0
 
 
+# Most to least specific: "answer/option is C", "(C)", a leading letter with a delimiter ("C)",
+# "C.", "C:" or the letter alone), then any standalone A-D except the article "A" before a word
+MCQ_PATTERNS = [
+    r"(?i:answer|option)\s*(?:is)?\s*:?\s*\(?([A-D])\b",
+    r"\(([A-D])\)",
+    r"^\s*([A-D])(?:[).:]|\s*$)",
+    r"\b(A(?!\s+[a-z])|[B-D])\b",
+]
+
+
+def grade_mcq_local(predicted_text: str, reference_answer: str) -> float:
+    """Offline MCQ grader: extracts the selected option letter A-D from the prediction."""
+    text = str(predicted_text)
+    for pattern in MCQ_PATTERNS:
+        m = re.search(pattern, text)
+        if m:
+            return 1.0 if m.group(1) == str(reference_answer).strip().upper()[:1] else 0.0
+    return 0.0
+
+
+NUMBER = r"[-+]?\d*\.?\d+(?:[eE][-+]?\d+)?"
+# "3 x 10^8" -> "3e8" before exponents are dropped
+SCI_NOTATION = re.compile(r"(\d)\s*(?:x|\*|\u00d7)\s*10\s*\^\s*([-+]?\d+)")
+# Exponents attached to units ("m/s^2", "s\u00b2"), which are not the answer
+UNIT_EXPONENT = re.compile(r"(?<=[A-Za-z)])(?:\^\s*[-+]?\d+|[\u207b\u00b9\u00b2\u00b3\u2070\u2074-\u2079]+)")
+# A number stated as the result: "v = 25", "answer is 9.8", "~ 3"
+STATED_NUMBER = re.compile(r"(?:=|\u2248|~|(?i:answer|result)\s*(?:is)?\s*:?)\s*(" + NUMBER + ")")
+
+
+def extract_number(text: str) -> Optional[float]:
+    """The number a free-text numeric answer gives: the last stated result, else the last number."""
+    text = UNIT_EXPONENT.sub("", SCI_NOTATION.sub(r"\1e\2", str(text).replace(",", "")))
+    stated = STATED_NUMBER.findall(text)
+    nums = stated or re.findall(NUMBER, text)
+    return float(nums[-1]) if nums else None
+
+
+def grade_numeric_local(predicted_text: str, reference_answer: str, tolerance: float = 0.05) -> float:
+    """Offline numeric grader: the prediction's answer number within `tolerance` of the reference."""
+    p = extract_number(predicted_text)
+    if p is None:
+        return 0.0
+    try:
+        g = float(re.sub('[^0-9eE+\-.]', '', str(reference_answer)))
+    except ValueError:
+        return 0.0
+    return 1.0 if math.isclose(p, g, rel_tol=tolerance, abs_tol=1e-9) else 0.0
+
+
+def grade_explanation_local(predicted_text: str, reference_text: str) -> Dict:
+    """Offline explanation grader on the same 0-1 scale as scorers.grade_explanation."""
+    return {"score": rubric_score_local(predicted_text, reference_text) / 5.0, "reasoning": "local heuristic"}
+
+
 def rubric_score_local(pred: str, gold: str) -> float:
     # Simple heuristic fallback rubric (0-5) when LLM judge not available.
     npreds = normalize_text(pred)
@@ -56,7 +110,7 @@ def llm_judge_score(question: str, prediction: str, reference: str, openai_clien
         return {"score": rubric_score_local(prediction, reference), "explanation": "fallback heuristic"}
 
     # Example prompt and call - user must provide configured openai client object
-    prompt = f"Score the following physics explanation from 0-5 using rubric: conceptual correctness 50%, completeness 30%, clarity 20%.\nQUESTION: {question}\nREFERENCE: {reference}\nPREDICTION: {prediction}\nReturn JSON: {\"score\": <0-5>, \"notes\": <short> }"
+    prompt = f"Score the following physics explanation from 0-5 using rubric: conceptual correctness 50%, completeness 30%, clarity 20%.\nQUESTION: {question}\nREFERENCE: {reference}\nPREDICTION: {prediction}\nReturn JSON: {{\"score\": <0-5>, \"notes\": <short> }}"
     try:
         resp = openai_client.create(
             model="gpt-4o-mini",
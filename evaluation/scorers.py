@@ -3,24 +3,31 @@ import re
 import json
 import logging
 import math
-from typing import Optional, Dict, Any, Union
-from dotenv import load_dotenv
-from anthropic import Anthropic
+import functools
+from typing import TYPE_CHECKING, Optional, Dict, Any, Union
 
-load_dotenv()
+if TYPE_CHECKING:
+    from anthropic import Anthropic
 
-# Setup logging
-logging.basicConfig(level=logging.INFO)
+# Logging is configured by the entry point (run_eval.main); importing this module has no side effects
 logger = logging.getLogger(__name__)
 
+@functools.lru_cache(maxsize=None)
+def _load_env():
+    # .env is read on first use of the API, not at import
+    from dotenv import load_dotenv
+    load_dotenv()
+
 def get_claude_client():
+    _load_env()
     api_key = os.getenv("ANTHROPIC_API_KEY")
     if not api_key:
         logger.warning("Error: ANTHROPIC_API_KEY not found in environment variables.")
         return None
+    from anthropic import Anthropic
     return Anthropic(api_key=api_key)
 
-def grade_mcq(predicted_text: str, reference_answer: str, client: Optional[Anthropic] = None) -> float:
+def grade_mcq(predicted_text: str, reference_answer: str, client: Optional["Anthropic"] = None) -> float:
     """
     Grades MCQ using Claude to extract the answer and compare.
     Returns 1.0 if correct, 0.0 otherwise.
@@ -68,7 +75,7 @@ def grade_mcq(predicted_text: str, reference_answer: str, client: Optional[Anthr
         logger.error(f"Error in grade_mcq: {e}")
         return 0.0
 
-def grade_numeric(predicted_text: str, reference_answer: str, tolerance: float = 0.05, client: Optional[Anthropic] = None) -> float:
+def grade_numeric(predicted_text: str, reference_answer: str, tolerance: float = 0.05, client: Optional["Anthropic"] = None) -> float:
     """
     Grades numeric answers using Claude to extract the value and compare.
     Returns 1.0 if within tolerance, 0.0 otherwise.
@@ -116,7 +123,7 @@ def grade_numeric(predicted_text: str, reference_answer: str, tolerance: float =
         return 0.0
 
 
-def grade_explanation(predicted_text: str, reference_text: str, rubric=None, client: Optional[Anthropic] = None) -> Dict[str, Any]:
+def grade_explanation(predicted_text: str, reference_text: str, rubric=None, client: Optional["Anthropic"] = None) -> Dict[str, Any]:
     """
     Grades explanations using Claude on a 5-point scale (0, 0.25, 0.5, 0.75, 1.0).
     Returns a dict with 'score' and 'reasoning'.
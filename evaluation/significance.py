@@ -0,0 +1,178 @@
+"""Paired significance tests between eval configs, per question type.
+
+With 50 questions, a few points between Base, RAG and Finetuned can be noise. Every config answers
+the same questions, so configs are compared on per-question score differences:
+
+- bootstrap CI: questions resampled with replacement; the mean difference over each resample gives
+  a percentile confidence interval
+- permutation test: under H0 (no difference) each question's difference is equally likely to have
+  either sign; the p-value is the share of random sign flips whose mean is at least as extreme
+  (two-sided), with Holm correction over the comparisons of each question type
+
+Both are one matrix product for all comparisons at once: resample counts (B x n, multinomial) or
+random signs (B x n) times the question x comparison difference matrix (n x P). Each pair uses the
+questions both configs answered (a partial run log is compared on what it has), via a 0/1 mask
+that goes through the same products.
+
+Scores: score_mcq / score_numeric (0-1) and score_explanation (0-5) for their question types; the
+"all" rows put explanations on 0-1 (/ 5) so the types can be pooled.
+
+Usage:
+python -m evaluation.significance evaluation/results_final.csv
+python -m evaluation.significance evaluation/run_logs/eval_results_*.csv --baseline Base --resamples 20000
+"""
+
+import argparse
+import glob
+import os
+import time
+
+import numpy as np
+import pandas as pd
+
+try:
+    from evaluation.result_log import read_table
+except ImportError:  # run from evaluation/
+    from result_log import read_table
+
+SCORE_COLUMNS = {"mcq": "score_mcq", "numeric": "score_numeric", "explanation": "score_explanation"}
+SCORE_SCALE = {"mcq": 1.0, "numeric": 1.0, "explanation": 5.0}
+
+
+def load_runs(paths):
+    """
+    Result rows of run logs (.csv / .parquet / .jsonl) with one 'score' per row. When several logs
+    use the same config name, configs are labelled '<run>:<config>'.
+    """
+    frames = []
+    for path in paths:
+        df = read_table(path)
+        df["run"] = os.path.splitext(os.path.basename(path))[0]
+        frames.append(df)
+    df = pd.concat(frames, ignore_index=True)
+    if df.groupby("config")["run"].nunique().max() > 1:
+        df["config"] = df["run"] + ":" + df["config"]
+    df["score"] = 0.0
+    for qtype, column in SCORE_COLUMNS.items():
+        mask = df["type"] == qtype
+        df.loc[mask, "score"] = df.loc[mask, column].astype(float)
+    df["question_key"] = df["question_id"].where(df["question_id"].notna(), df["question"]).astype(str)
+    return df
+
+
+def score_matrix(df, qtype=None):
+    """(questions x configs score array, NaN where a config has no row, config names)."""
+    if qtype is not None:
+        df = df[df["type"] == qtype]
+        scores = df["score"]
+    else:
+        scores = df["score"] / df["type"].map(SCORE_SCALE).fillna(1.0)
+    table = df.assign(score=scores).pivot_table(index="question_key", columns="config", values="score", aggfunc="mean")
+    return table.to_numpy(dtype=np.float64), list(table.columns)
+
+
+def paired_tests(scores, pairs, resamples=10_000, alpha=0.05, seed=0):
+    """
+    Bootstrap CIs and sign-flip permutation p-values of mean(scores[:, a] - scores[:, b]) over the
+    questions both answered, for every (a, b) in `pairs`, all comparisons in one pass. Returns a dict
+    of arrays, one entry per pair.
+    """
+    rng = np.random.default_rng(seed)
+    n = scores.shape[0]
+    a, b = np.array(pairs).T
+    diffs = scores[:, a] - scores[:, b]  # n x P, NaN where either config is missing
+    mask = (~np.isnan(diffs)).astype(np.float64)
+    diffs = np.nan_to_num(diffs)
+    paired = mask.sum(axis=0)
+    with np.errstate(invalid="ignore", divide="ignore"):
+        observed = diffs.sum(axis=0) / paired
+
+        counts = rng.multinomial(n, np.full(n, 1.0 / n), size=resamples).astype(np.float64)  # B x n resample weights
+        boot = (counts @ diffs) / (counts @ mask)  # B x P
+        low, high = np.nanquantile(boot, [alpha / 2, 1 - alpha / 2], axis=0)
+
+        signs = (rng.integers(0, 2, size=(resamples, n)) * 2 - 1).astype(np.float64)
+        perm = (signs @ diffs) / paired
+    extreme = (np.abs(perm) >= np.abs(observed) - 1e-12).sum(axis=0)
+    p_value = (extreme + 1) / (resamples + 1)
+    return {"diff": observed, "ci_low": low, "ci_high": high, "p_value": p_value,
+            "questions": paired.astype(int),
+            "mean": (np.nan_to_num(scores[:, a]) * mask).sum(axis=0) / paired,
+            "mean_versus": (np.nan_to_num(scores[:, b]) * mask).sum(axis=0) / paired}
+
+
+def holm(p_values):
+    """Holm step-down adjusted p-values (family-wise error over one set of comparisons)."""
+    p = np.asarray(p_values, dtype=np.float64)
+    order = np.argsort(p)
+    adjusted = np.maximum.accumulate(p[order] * (len(p) - np.arange(len(p))))
+    out = np.empty_like(p)
+    out[order] = np.minimum(adjusted, 1.0)
+    return out
+
+
+def compare(df, baseline=None, resamples=10_000, alpha=0.05, seed=0):
+    """One row per (question type, config pair): means, mean difference, CI, p-value, Holm p-value."""
+    rows = []
+    for qtype in [None] + sorted(df["type"].dropna().unique()):
+        scores, configs = score_matrix(df, qtype)
+        if len(configs) < 2:
+            continue
+        if baseline is not None:
+            if baseline not in configs:
+                raise ValueError(f"Baseline config '{baseline}' not in {configs}")
+            base = configs.index(baseline)
+            pairs = [(i, base) for i in range(len(configs)) if i != base]
+        else:
+            pairs = [(i, j) for i in range(len(configs)) for j in range(i + 1, len(configs))]
+        result = paired_tests(scores, pairs, resamples, alpha, seed)
+        keep = result["questions"] >= 2
+        p_holm = np.full(len(pairs), np.nan)
+        p_holm[keep] = holm(result["p_value"][keep])
+        for k, (i, j) in enumerate(pairs):
+            if not keep[k]:
+                continue
+            rows.append({
+                "type": qtype or "all", "config": configs[i], "versus": configs[j], "questions": result["questions"][k],
+                "mean": result["mean"][k], "mean_versus": result["mean_versus"][k], "diff": result["diff"][k],
+                "ci_low": result["ci_low"][k], "ci_high": result["ci_high"][k],
+                "p_value": result["p_value"][k], "p_holm": p_holm[k],
+            })
+    return pd.DataFrame(rows)
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("runs", nargs="+", help="Run logs (.csv / .parquet / .jsonl); globs are expanded")
+    parser.add_argument("--baseline", default=None, help="Compare every config against this one (default: all pairs)")
+    parser.add_argument("--resamples", type=int, default=10_000)
+    parser.add_argument("--alpha", type=float, default=0.05, help="CI level is 1 - alpha")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--output", default=None, help="Write the comparison table as CSV")
+    args = parser.parse_args()
+
+    paths = sorted({p for pattern in args.runs for p in (glob.glob(pattern) or [pattern])})
+    start = time.perf_counter()
+    df = load_runs(paths)
+    table = compare(df, args.baseline, args.resamples, args.alpha, args.seed)
+    elapsed = time.perf_counter() - start
+
+    ci = f"{100 * (1 - args.alpha):.0f}% CI"
+    print(f"{len(paths)} run log(s), {df['config'].nunique()} configs, {args.resamples} resamples, {elapsed:.2f}s")
+    width = max([len(c) for c in table["config"]] + [len(c) for c in table["versus"]] + [6]) if len(table) else 6
+    for qtype, group in table.groupby("type", sort=False):
+        print(f"\n[{qtype}]")
+        print(f"{'config':<{width}} {'versus':<{width}} {'n':>4} {'diff':>7} {ci:>18} {'p':>7} {'p_holm':>7}")
+        for r in group.itertuples():
+            flag = " *" if r.p_holm < args.alpha else ""
+            print(f"{r.config:<{width}} {r.versus:<{width}} {r.questions:>4} {r.diff:>+7.3f} "
+                  f"[{r.ci_low:>+7.3f}, {r.ci_high:>+7.3f}] {r.p_value:>7.4f} {r.p_holm:>7.4f}{flag}")
+
+    if args.output:
+        os.makedirs(os.path.dirname(args.output) or ".", exist_ok=True)
+        table.to_csv(args.output, index=False)
+        print(f"Saved to {args.output}")
+
+
+if __name__ == "__main__":
+    main()
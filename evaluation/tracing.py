@@ -0,0 +1,138 @@
+"""Per-stage latency tracing for eval runs.
+
+A span times one stage of one question:
+
+    embed     query embedding (rag.py)
+    search    FAISS / BM25 search (rag.py)
+    rerank    cross-encoder re-ranking (rag_utils.py)
+    context   context selection and formatting (context_builder.py)
+    tokenize  prompt tokenization (cache key and generation)
+    prefill   prompt forward pass, up to the first generated token
+    decode    the remaining generated tokens
+    grade     grading (the Claude API call with --grader claude)
+    write     appending the row to the result log
+
+Instrumented code calls the module-level `span(name)`, which records into the active tracer (a
+no-op when none is set), so retrieval and generation need no extra arguments. Prefill / decode
+are split by `timing_streamer()`, a generate() streamer that notes when the first new token
+arrives.
+
+run_eval adds each row's stage times as `<stage>_ms` columns (shared stages repeat across the
+configs graded from one answer; `write` happens after the row is built and is only in the
+summary), prints p50 / p95 / p99 per stage, and with `--trace` exports all spans as Chrome trace
+JSON (chrome://tracing or https://ui.perfetto.dev).
+"""
+
+import contextlib
+import json
+import os
+import threading
+import time
+
+STAGES = ("embed", "search", "rerank", "context", "tokenize", "prefill", "decode", "grade", "write")
+ROW_STAGES = STAGES[:-1]
+PERCENTILES = (50, 95, 99)
+
+_active = None
+
+
+class Tracer:
+    def __init__(self):
+        self.events = []  # (name, start ns, duration ns, pid, tid)
+        self._row = {}
+
+    def add(self, name, start_ns, duration_ns):
+        self.events.append((name, start_ns, duration_ns, os.getpid(), threading.get_ident()))
+        self._row[name] = self._row.get(name, 0) + duration_ns
+
+    @contextlib.contextmanager
+    def span(self, name):
+        start = time.perf_counter_ns()
+        try:
+            yield
+        finally:
+            self.add(name, start, time.perf_counter_ns() - start)
+
+    def start_row(self):
+        """Starts accumulating a new row; returns the stage times (ns) of the previous one."""
+        row, self._row = self._row, {}
+        return row
+
+    def durations(self):
+        by_stage = {}
+        for name, _, duration, _, _ in self.events:
+            by_stage.setdefault(name, []).append(duration)
+        return by_stage
+
+    def summary(self):
+        """{stage: {count, total_s, p50_ms, p95_ms, p99_ms}}, stages in order of first occurrence."""
+        import numpy as np
+
+        by_stage = self.durations()
+        result = {}
+        for name, durations in by_stage.items():
+            ms = np.asarray(durations, dtype=np.float64) / 1e6
+            result[name] = {"count": len(ms), "total_s": ms.sum() / 1000,
+                            **{f"p{p}_ms": float(v) for p, v in zip(PERCENTILES, np.percentile(ms, PERCENTILES))}}
+        return result
+
+    def write_chrome_trace(self, path):
+        """Complete ("X") events, microsecond timestamps; each worker process is its own track."""
+        events = [{"name": name, "cat": "eval", "ph": "X", "ts": start / 1000, "dur": duration / 1000,
+                   "pid": pid, "tid": tid} for name, start, duration, pid, tid in self.events]
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        with open(path, "w", encoding="utf-8") as f:
+            json.dump({"traceEvents": events, "displayTimeUnit": "ms"}, f)
+
+
+def row_columns(row):
+    """`<stage>_ms` result-log columns of one row's stage times (ns)."""
+    return {f"{stage}_ms": round(row.get(stage, 0) / 1e6, 3) for stage in ROW_STAGES}
+
+
+def format_summary(summary):
+    lines = [f"{'stage':<10} {'count':>6} {'total s':>9} " + " ".join(f"{f'p{p} ms':>9}" for p in PERCENTILES)]
+    for name, s in summary.items():
+        lines.append(f"{name:<10} {s['count']:>6} {s['total_s']:>9.2f} "
+                     + " ".join(f"{s[f'p{p}_ms']:>9.1f}" for p in PERCENTILES))
+    return "\n".join(lines)
+
+
+def set_tracer(tracer):
+    global _active
+    _active = tracer
+
+
+def get_tracer():
+    return _active
+
+
+def span(name):
+    return _active.span(name) if _active is not None else contextlib.nullcontext()
+
+
+class _TimingStreamer:
+    # generate() calls put() with the prompt, then once per new token, then end(). The clock starts
+    # at the prompt put(), so tokenization and an explicit prefix prefill (own spans) are not counted again.
+    def __init__(self, tracer):
+        self.tracer = tracer
+        self.start = None
+        self.first_token = None
+
+    def put(self, value):
+        if self.start is None:
+            self.start = time.perf_counter_ns()
+        elif self.first_token is None:
+            self.first_token = time.perf_counter_ns()
+
+    def end(self):
+        now = time.perf_counter_ns()
+        start = self.start or now
+        first = self.first_token or now
+        self.tracer.add("prefill", start, first - start)
+        self.tracer.add("decode", first, now - first)
+
+
+def timing_streamer():
+    """A streamer for model.generate() recording prefill / decode spans; None without an active tracer."""
+    return _TimingStreamer(_active) if _active is not None else None
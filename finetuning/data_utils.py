@@ -0,0 +1,32 @@
+import json
+
+# Mistral Instruct Format: [INST] instruction [/INST] output
+PROMPT_TEMPLATE = "[INST] {instruction}\n\n{input} [/INST] {output}"
+PROMPT_TEMPLATE_NO_INPUT = "[INST] {instruction} [/INST] {output}"
+
+
+def format_prompt(example):
+    """Formats an Alpaca record into the Mistral Instruct prompt used for training."""
+    instruction = example['instruction']
+    input_text = example.get('input', "")
+    output = example['output']
+
+    if input_text:
+        return PROMPT_TEMPLATE.format(instruction=instruction, input=input_text, output=output)
+    return PROMPT_TEMPLATE_NO_INPUT.format(instruction=instruction, output=output)
+
+
+def iter_jsonl(path):
+    """
+    Streams a JSONL file once.
+    Yields (line_number, item) pairs; item is None when the line fails to parse.
+    """
+    with open(path, 'r', encoding='utf-8') as f:
+        for line_num, line in enumerate(f, start=1):
+            line = line.strip()
+            if not line:
+                continue
+            try:
+                yield line_num, json.loads(line)
+            except json.JSONDecodeError:
+                yield line_num, None
@@ -1,8 +1,10 @@
 
 import argparse
-from datasets import load_dataset
+from itertools import islice
 from transformers import AutoTokenizer
-import numpy as np
+from finetuning.data_utils import format_prompt
+from finetuning.profile_dataset import profile_dataset, print_report
+from finetuning.token_cache import iter_training_records, load_token_cache
 
 # Configuration
 MODEL_NAME = "mistralai/Mistral-7B-Instruct-v0.2"
@@ -23,34 +25,21 @@ def main():
 
     print(f"Loading dataset from {args.dataset}...")
     try:
-        dataset = load_dataset('json', data_files=args.dataset, split="train")
+        # Same memory-mapped token cache train.py reads (built here on first use)
+        tokenized = load_token_cache(args.dataset, tokenizer)
     except Exception as e:
         print(f"Error loading dataset: {e}")
         print("Make sure you have generated the synthetic data first!")
         return
 
-    print(f"Dataset size: {len(dataset)}")
+    print(f"Dataset size: {len(tokenized)}")
 
-    # Formatting function (Same as train.py)
-    def format_prompt(example):
-        instruction = example['instruction']
-        input_text = example.get('input', "")
-        output = example['output']
-        
-        if input_text:
-            prompt = f"[INST] {instruction}\n\n{input_text} [/INST] {output}"
-        else:
-            prompt = f"[INST] {instruction} [/INST] {output}"
-        return prompt
+    # Cache rows are the well-formed records in file order, so sample i is tokenized[i]
+    records = (record for _, record in iter_training_records(args.dataset) if record is not None)
 
     print("\n--- Checking Samples ---")
-    lengths = []
-    
-    for i in range(min(5, len(dataset))):
-        sample = dataset[i]
+    for i, sample in enumerate(islice(records, 5)):
         formatted = format_prompt(sample)
-        tokens = tokenizer.encode(formatted)
-        lengths.append(len(tokens))
         
         print(f"\n[Sample {i}]")
         print(f"Instruction: {sample['instruction']}")
@@ -59,22 +48,12 @@ def main():
         print("Formatted:\n" + "-"*20)
         print(formatted)
         print("-" * 20)
-        print(f"Token Count: {len(tokens)}")
+        print(f"Token Count (incl. EOS, truncated): {tokenized[i]['length']}")
 
-    # Check whole dataset stats
-    print("\n--- Analyzing Token Lengths (First 100 or all) ---")
-    all_lengths = []
-    check_limit = min(500, len(dataset))
-    for i in range(check_limit):
-        txt = format_prompt(dataset[i])
-        all_lengths.append(len(tokenizer.encode(txt)))
-    
-    print(f"Max Length: {max(all_lengths)}")
-    print(f"Mean Length: {np.mean(all_lengths):.2f}")
-    if max(all_lengths) > 2048:
-        print("WARNING: Some samples exceed 2048 tokens and will be truncated during training.")
-    else:
-        print("SUCCESS: All samples fit within 2048 context window.")
+    # Check whole dataset stats (single pass, batched tokenization, no row cap)
+    print("\n--- Profiling Full Dataset ---")
+    report = profile_dataset(args.dataset, tokenizer=tokenizer, tokenizer_name=MODEL_NAME, max_length=2048)
+    print_report(report)
 
 if __name__ == "__main__":
     main()
@@ -0,0 +1,163 @@
+"""Merge a trained LoRA adapter into the base weights and save a standalone checkpoint.
+
+Inference through PEFT's LoRA wrappers runs extra low-rank matmuls on every targeted projection
+(q, k, v, o, gate). A merged checkpoint is a plain causal LM, so run_eval can load it directly
+(`--merged_model <dir>`) with no PEFT overhead.
+
+The base model is loaded unquantized (fp16 on GPU, fp32 on CPU) for the merge: folding LoRA
+deltas into 4-bit weights would round them away. `--requantize nf4|int8` then reloads the merged
+weights through bitsandbytes (CUDA only) and saves a quantized copy; `--requantize dynamic-int8` is recorded
+in the manifest and applied at load time on CPU.
+
+`--benchmark N` times generation on the first N eval questions with the adapter unmerged
+(PeftModel) and again after merging, on the same weights in memory, and writes the comparison
+to <output_dir>/merge_benchmark.json.
+
+Usage:
+python -m finetuning.merge_adapter --adapter results/mistral-7b-physics-finetune --output_dir results/mistral-7b-physics-merged
+python -m finetuning.merge_adapter --model tiny-mistral --adapter results_cpu/tiny-mistral-physics-finetune \
+    --output_dir results_cpu/tiny-mistral-merged --benchmark 5
+"""
+
+import argparse
+import gc
+import json
+import os
+import shutil
+import tempfile
+import time
+
+import numpy as np
+import torch
+from peft import PeftModel
+
+from fingerprint import path_sha256
+from model_registry import DEFAULT_MODEL, MERGE_MANIFEST_FILE, MODEL_REGISTRY, get_model_spec, is_cpu, load_base_model, load_tokenizer
+
+EVAL_DATA_PATH = "evaluation/physics_questions_50.json"
+
+
+def time_generation(model, tokenizer, prompts, max_new_tokens):
+    """Greedy-generates each prompt; returns per-prompt latency (s) and generated token counts."""
+    latencies, new_tokens = [], []
+    for prompt in prompts:
+        inputs = tokenizer(prompt, return_tensors="pt").to(model.device)
+        if torch.cuda.is_available():
+            torch.cuda.synchronize()
+        start = time.perf_counter()
+        with torch.no_grad():
+            out = model.generate(**inputs, max_new_tokens=max_new_tokens, min_new_tokens=max_new_tokens,
+                                 do_sample=False, pad_token_id=tokenizer.pad_token_id)
+        if torch.cuda.is_available():
+            torch.cuda.synchronize()
+        latencies.append(time.perf_counter() - start)
+        new_tokens.append(int(out.shape[1] - inputs["input_ids"].shape[1]))
+    return latencies, new_tokens
+
+
+def latency_stats(latencies, new_tokens):
+    arr = np.asarray(latencies)
+    return {
+        "mean_s": float(arr.mean()),
+        "p50_s": float(np.percentile(arr, 50)),
+        "p95_s": float(np.percentile(arr, 95)),
+        "tokens_per_sec": float(sum(new_tokens) / arr.sum()),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--adapter", type=str, required=True, help="Local adapter dir (train.py output) or HF repo (upload_model.py)")
+    parser.add_argument("--model", type=str, default=DEFAULT_MODEL, help=f"Base model registry name ({', '.join(MODEL_REGISTRY)}) or HF ID")
+    parser.add_argument("--output_dir", type=str, required=True)
+    parser.add_argument("--device", type=str, default=None)
+    parser.add_argument("--requantize", choices=["none", "nf4", "int8", "dynamic-int8"], default="none")
+    parser.add_argument("--benchmark", type=int, default=0, help="Number of eval questions to time unmerged vs merged")
+    parser.add_argument("--max_new_tokens", type=int, default=64)
+    parser.add_argument("--eval_file", type=str, default=EVAL_DATA_PATH)
+    args = parser.parse_args()
+    if args.requantize in ("nf4", "int8") and is_cpu(get_model_spec(args.model, quantization=args.requantize, device=args.device)):
+        parser.error(f"--requantize {args.requantize} needs bitsandbytes on CUDA; use --requantize dynamic-int8 on CPU")
+
+    # Merge in full precision; the registry default for the 7B model is nf4
+    spec = get_model_spec(args.model, quantization="none", device=args.device)
+    if spec["dtype"] == "float32" and torch.cuda.is_available() and spec["device_map"] != "cpu":
+        spec["dtype"] = "float16"
+
+    print(f"Loading base model {spec['model_id']} ({spec['dtype']})...")
+    tokenizer = load_tokenizer(spec)
+    model = load_base_model(spec)
+    print(f"Loading adapter from {args.adapter}...")
+    model = PeftModel.from_pretrained(model, args.adapter)
+    model.eval()
+
+    prompts = []
+    if args.benchmark:
+        from evaluation.prompts import build_prompt
+        with open(args.eval_file, "r") as f:
+            questions = json.load(f)[:args.benchmark]
+        prompts = [build_prompt(q["question"]) for q in questions]
+        time_generation(model, tokenizer, prompts[:1], 4)  # warm-up
+        unmerged = latency_stats(*time_generation(model, tokenizer, prompts, args.max_new_tokens))
+
+    print("Merging adapter into base weights...")
+    model = model.merge_and_unload()
+
+    benchmark = None
+    if args.benchmark:
+        time_generation(model, tokenizer, prompts[:1], 4)
+        merged = latency_stats(*time_generation(model, tokenizer, prompts, args.max_new_tokens))
+        benchmark = {
+            "questions": len(prompts),
+            "max_new_tokens": args.max_new_tokens,
+            "unmerged": unmerged,
+            "merged": merged,
+            "speedup": unmerged["mean_s"] / merged["mean_s"],
+        }
+        print("\n--- Generation Latency (unmerged vs merged) ---")
+        for name in ("unmerged", "merged"):
+            s = benchmark[name]
+            print(f"{name:<9} mean {s['mean_s']:.3f}s  p50 {s['p50_s']:.3f}s  p95 {s['p95_s']:.3f}s  {s['tokens_per_sec']:.1f} tok/s")
+        print(f"Speedup: {benchmark['speedup']:.2f}x\n")
+
+    quantization = None
+    if args.requantize in ("nf4", "int8"):
+        # Full-precision merge goes to a scratch dir, the quantized copy to output_dir
+        scratch_dir = tempfile.mkdtemp(prefix="merged_fp_", dir=os.path.dirname(os.path.abspath(args.output_dir)))
+        model.save_pretrained(scratch_dir, safe_serialization=True)
+        del model
+        gc.collect()
+        if torch.cuda.is_available():
+            torch.cuda.empty_cache()
+        print(f"Re-quantizing merged weights to {args.requantize}...")
+        q_spec = get_model_spec(args.model, quantization=args.requantize, device=args.device)
+        model = load_base_model(q_spec, model_id=scratch_dir)
+        quantization = q_spec["quantization"]  # what was actually applied
+    elif args.requantize == "dynamic-int8":
+        quantization = "dynamic-int8"
+
+    print(f"Saving merged model to {args.output_dir}...")
+    # For nf4/int8 the quantization_config is serialized into config.json, so loaders pick it up
+    model.save_pretrained(args.output_dir, safe_serialization=True)
+    tokenizer.save_pretrained(args.output_dir)
+    if args.requantize in ("nf4", "int8"):
+        shutil.rmtree(scratch_dir, ignore_errors=True)
+
+    manifest = {
+        "base_model": spec["model_id"],
+        "registry_name": spec["name"],
+        "adapter": args.adapter,
+        "adapter_sha256": path_sha256(args.adapter) if os.path.exists(args.adapter) else None,
+        "dtype": spec["dtype"],
+        "quantization": quantization,
+    }
+    with open(os.path.join(args.output_dir, MERGE_MANIFEST_FILE), "w", encoding="utf-8") as f:
+        json.dump(manifest, f, indent=2)
+    if benchmark:
+        with open(os.path.join(args.output_dir, "merge_benchmark.json"), "w", encoding="utf-8") as f:
+            json.dump(benchmark, f, indent=2)
+    print("Merge complete.")
+
+
+if __name__ == "__main__":
+    main()
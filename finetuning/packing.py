@@ -0,0 +1,191 @@
+"""Sequence packing for SFT on the pre-tokenized cache.
+
+Most Alpaca physics pairs are a few hundred tokens, so padded batches at max_length=2048 are
+mostly padding. This module:
+- plans bins with first-fit-decreasing (segment tree, O(n log n)) so each packed row holds as
+  many examples as fit in max_length
+- builds packed rows (`input_ids` + `position_ids` that reset to 0 at every example boundary)
+- collates them without an attention_mask, so transformers derives per-example attention
+  boundaries from the position-ID resets (flash_attention_2 varlen, or the block-diagonal
+  masks recent transformers releases build from packed position_ids) and examples cannot
+  attend to each other; the first token of every example is masked out of the labels so no
+  loss crosses a boundary
+- reports padding efficiency before and after packing
+
+Usage:
+python -m finetuning.packing --dataset data_extraction/alpaca_physics_5k_cleaned.jsonl --batch_size 4
+"""
+
+import argparse
+
+import numpy as np
+
+from finetuning.token_cache import DATASET_FILE, MAX_LENGTH, MODEL_NAME, load_token_cache
+
+IGNORE_INDEX = -100
+
+
+def plan_bins(lengths, max_length=MAX_LENGTH):
+    """
+    First-fit-decreasing bin packing.
+    Returns a list of bins, each a list of example indices whose lengths sum to <= max_length.
+    """
+    lengths = np.minimum(np.asarray(lengths, dtype=np.int64), max_length)
+    n = len(lengths)
+    if n == 0:
+        return []
+    order = np.argsort(-lengths, kind="stable")
+
+    # Leaves hold the remaining capacity of bin i (unopened bins are full); internal nodes hold
+    # the max of their children, so the leftmost bin that fits is found in one root-to-leaf walk.
+    size = 1
+    while size < n:
+        size *= 2
+    tree = [max_length] * (2 * size)
+    bins = []
+    for idx in order.tolist():
+        length = int(lengths[idx])
+        node = 1
+        while node < size:
+            node = 2 * node if tree[2 * node] >= length else 2 * node + 1
+        b = node - size
+        if b == len(bins):
+            bins.append([])
+        bins[b].append(idx)
+        tree[node] -= length
+        node //= 2
+        while node:
+            tree[node] = max(tree[2 * node], tree[2 * node + 1])
+            node //= 2
+    return bins
+
+
+def _batch_efficiency(row_lengths, batch_size):
+    """Real tokens / padded tokens when consecutive rows are batched and padded to the batch max."""
+    row_lengths = np.asarray(row_lengths, dtype=np.int64)
+    if row_lengths.size == 0:
+        return 1.0, 0
+    n_batches = -(-row_lengths.size // batch_size)
+    padded = np.zeros(n_batches * batch_size, dtype=np.int64)
+    padded[:row_lengths.size] = row_lengths
+    per_batch = padded.reshape(n_batches, batch_size)
+    rows_in_batch = np.minimum(batch_size, row_lengths.size - np.arange(n_batches) * batch_size)
+    capacity = int((per_batch.max(axis=1) * rows_in_batch).sum())
+    return float(row_lengths.sum()) / capacity, capacity
+
+
+def padding_report(lengths, bins, batch_size, max_length=MAX_LENGTH, seed=42):
+    """Padding efficiency of random batches, length-sorted batches and packed rows."""
+    lengths = np.minimum(np.asarray(lengths, dtype=np.int64), max_length)
+    rng = np.random.default_rng(seed)
+    random_eff, random_cap = _batch_efficiency(lengths[rng.permutation(lengths.size)], batch_size)
+    sorted_eff, sorted_cap = _batch_efficiency(np.sort(lengths)[::-1], batch_size)
+    packed_lengths = np.array([lengths[b].sum() for b in bins], dtype=np.int64)
+    packed_eff, packed_cap = _batch_efficiency(packed_lengths[rng.permutation(packed_lengths.size)], batch_size)
+    return {
+        "examples": int(lengths.size),
+        "tokens": int(lengths.sum()),
+        "packed_rows": len(bins),
+        "examples_per_row": lengths.size / len(bins) if bins else 0.0,
+        "row_fill": float(packed_lengths.mean()) / max_length if bins else 0.0,
+        "random_batches": {"efficiency": random_eff, "padded_tokens": random_cap},
+        "length_grouped_batches": {"efficiency": sorted_eff, "padded_tokens": sorted_cap},
+        "packed_batches": {"efficiency": packed_eff, "padded_tokens": packed_cap},
+        "steps_before": -(-int(lengths.size) // batch_size),
+        "steps_after": -(-len(bins) // batch_size),
+        "tokens_per_step_before": float(lengths.sum()) / max(1, -(-int(lengths.size) // batch_size)),
+        "tokens_per_step_after": float(lengths.sum()) / max(1, -(-len(bins) // batch_size)),
+    }
+
+
+def print_padding_report(report, batch_size):
+    print(f"\n--- Padding Efficiency (batch_size={batch_size}) ---")
+    print(f"Examples: {report['examples']}  Tokens: {report['tokens']}")
+    print(f"Packed rows: {report['packed_rows']} ({report['examples_per_row']:.1f} examples/row, "
+          f"{report['row_fill'] * 100:.1f}% full)")
+    for name in ("random_batches", "length_grouped_batches", "packed_batches"):
+        entry = report[name]
+        print(f"{name:<24} efficiency {entry['efficiency'] * 100:5.1f}%  padded tokens {entry['padded_tokens']}")
+    print(f"Steps per epoch: {report['steps_before']} -> {report['steps_after']}")
+    print(f"Real tokens per step: {report['tokens_per_step_before']:.0f} -> {report['tokens_per_step_after']:.0f}")
+
+
+def _flat_token_arrays(tokenized):
+    """Zero-copy numpy views of the cache's token IDs and row offsets."""
+    column = tokenized.with_format("arrow")[:].column("input_ids").combine_chunks()
+    offsets = column.offsets.to_numpy()
+    flat = column.values.to_numpy()
+    return flat, offsets
+
+
+def build_packed_dataset(tokenized, max_length=MAX_LENGTH):
+    """
+    Packs the tokenized cache into rows of <= max_length tokens.
+    Returns (packed Dataset with input_ids/position_ids, bins, per-example lengths).
+    """
+    from datasets import Dataset, Features, Sequence, Value
+
+    flat, offsets = _flat_token_arrays(tokenized)
+    starts = offsets[:-1]
+    lengths = np.minimum(np.diff(offsets), max_length)
+    bins = plan_bins(lengths, max_length)
+
+    input_ids = []
+    position_ids = []
+    for b in bins:
+        input_ids.append(np.concatenate([flat[starts[i]:starts[i] + lengths[i]] for i in b]))
+        position_ids.append(np.concatenate([np.arange(lengths[i], dtype=np.int32) for i in b]))
+
+    features = Features({"input_ids": Sequence(Value("int32")), "position_ids": Sequence(Value("int32"))})
+    packed = Dataset.from_dict({"input_ids": input_ids, "position_ids": position_ids}, features=features)
+    return packed, bins, lengths
+
+
+class PackedDataCollator:
+    """
+    Pads packed rows to the longest row in the batch.
+    No attention_mask is returned on purpose: the position-ID resets carry the example boundaries.
+    Padding gets its own position run starting at 0 so it forms a separate, fully masked segment.
+    """
+
+    def __init__(self, pad_token_id):
+        self.pad_token_id = pad_token_id
+
+    def __call__(self, features):
+        import torch
+
+        max_len = max(len(f["input_ids"]) for f in features)
+        input_ids = torch.full((len(features), max_len), self.pad_token_id, dtype=torch.long)
+        position_ids = torch.zeros((len(features), max_len), dtype=torch.long)
+        labels = torch.full((len(features), max_len), IGNORE_INDEX, dtype=torch.long)
+        for row, f in enumerate(features):
+            n = len(f["input_ids"])
+            ids = torch.as_tensor(f["input_ids"], dtype=torch.long)
+            pos = torch.as_tensor(f["position_ids"], dtype=torch.long)
+            input_ids[row, :n] = ids
+            position_ids[row, :n] = pos
+            position_ids[row, n:] = torch.arange(max_len - n)
+            row_labels = ids.clone()
+            # The first token of each example would be predicted from the previous example
+            row_labels[pos == 0] = IGNORE_INDEX
+            labels[row, :n] = row_labels
+        return {"input_ids": input_ids, "position_ids": position_ids, "labels": labels}
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--dataset", type=str, default=DATASET_FILE)
+    parser.add_argument("--model_name", type=str, default=MODEL_NAME)
+    parser.add_argument("--max_length", type=int, default=MAX_LENGTH)
+    parser.add_argument("--batch_size", type=int, default=4)
+    args = parser.parse_args()
+
+    from transformers import AutoTokenizer
+    tokenizer = AutoTokenizer.from_pretrained(args.model_name, use_fast=True)
+    tokenized = load_token_cache(args.dataset, tokenizer, max_length=args.max_length)
+    _, bins, lengths = build_packed_dataset(tokenized, args.max_length)
+    print_padding_report(padding_report(lengths, bins, args.batch_size, args.max_length), args.batch_size)
+
+
+if __name__ == "__main__":
+    main()
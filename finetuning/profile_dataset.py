@@ -0,0 +1,284 @@
+"""Single-pass profiler for Alpaca-format JSONL datasets.
+
+Streams the whole file once and reports:
+- token-length histogram of the formatted training prompts (batched fast-tokenizer calls)
+- number of samples over the training max_length
+- output-format breakdown (plain text / JSON / JSON-like / empty)
+- field-type anomalies (missing fields, non-string values, extra keys, parse errors)
+- duplicate rates (instruction-level and exact record-level)
+
+Reports are cached per (dataset hash, tokenizer, max_length, prompt template) in CACHE_DIR,
+so re-profiling an unchanged dataset is a file lookup.
+
+Usage:
+python -m finetuning.profile_dataset --dataset data_extraction/alpaca_physics_5k_cleaned.jsonl
+python -m finetuning.profile_dataset --no_tokenizer   # format/anomaly/duplicate checks only
+"""
+
+import argparse
+import hashlib
+import json
+import os
+import time
+
+import numpy as np
+
+from fingerprint import file_sha256, text_sha256
+from finetuning.data_utils import (
+    PROMPT_TEMPLATE,
+    PROMPT_TEMPLATE_NO_INPUT,
+    format_prompt,
+    iter_jsonl,
+)
+
+MODEL_NAME = "mistralai/Mistral-7B-Instruct-v0.2"
+DATASET_FILE = "data_extraction/alpaca_physics_5k_cleaned.jsonl"
+CACHE_DIR = ".cache/dataset_profiles"
+MAX_LENGTH = 2048
+BATCH_SIZE = 1024
+EXPECTED_FIELDS = ("instruction", "input", "output")
+HISTOGRAM_EDGES = [0, 64, 128, 256, 512, 1024, 2048, 4096]
+MAX_EXAMPLES = 10  # line numbers kept per anomaly type
+
+
+def classify_output(output):
+    """Buckets an output field into text / json / json_like / empty / non_string."""
+    if not isinstance(output, str):
+        return "non_string"
+    stripped = output.strip()
+    if not stripped:
+        return "empty"
+    if stripped.startswith('{') and stripped.endswith('}'):
+        try:
+            json.loads(stripped)
+            return "json"
+        except json.JSONDecodeError:
+            return "json_like"
+    return "text"
+
+
+def _digest(*parts):
+    h = hashlib.blake2b(digest_size=16)
+    for part in parts:
+        h.update(str(part).encode("utf-8"))
+        h.update(b"\x00")
+    return h.digest()
+
+
+def _note(anomalies, kind, line_num):
+    entry = anomalies.setdefault(kind, {"count": 0, "lines": []})
+    entry["count"] += 1
+    if len(entry["lines"]) < MAX_EXAMPLES:
+        entry["lines"].append(line_num)
+
+
+def _token_lengths(tokenizer, texts):
+    enc = tokenizer(
+        texts,
+        add_special_tokens=True,
+        return_attention_mask=False,
+        return_token_type_ids=False,
+        return_length=True,
+    )
+    return enc["length"]
+
+
+def cache_key(dataset_sha, tokenizer_name, max_length):
+    template_sha = text_sha256(PROMPT_TEMPLATE, PROMPT_TEMPLATE_NO_INPUT)
+    return text_sha256(dataset_sha, tokenizer_name or "none", max_length, template_sha)[:32]
+
+
+def profile_dataset(path, tokenizer=None, tokenizer_name=None, max_length=MAX_LENGTH,
+                    batch_size=BATCH_SIZE, cache_dir=CACHE_DIR, refresh=False):
+    """
+    Profiles `path` in one streaming pass and returns the report dict.
+    `tokenizer` is optional; without it the token-length section is skipped.
+    """
+    dataset_sha = file_sha256(path)
+    if tokenizer is not None and tokenizer_name is None:
+        tokenizer_name = getattr(tokenizer, "name_or_path", type(tokenizer).__name__)
+    key = cache_key(dataset_sha, tokenizer_name if tokenizer is not None else None, max_length)
+    cache_path = os.path.join(cache_dir, f"{key}.json") if cache_dir else None
+
+    if cache_path and not refresh and os.path.exists(cache_path):
+        with open(cache_path, "r", encoding="utf-8") as f:
+            report = json.load(f)
+        report["cached"] = True
+        return report
+
+    start = time.perf_counter()
+    total = 0
+    formats = {}
+    anomalies = {}
+    seen_instructions = set()
+    seen_records = set()
+    dup_instructions = 0
+    dup_records = 0
+    lengths = []
+    pending = []
+
+    for line_num, item in iter_jsonl(path):
+        total += 1
+        if not isinstance(item, dict):
+            _note(anomalies, "parse_error" if item is None else "not_an_object", line_num)
+            continue
+
+        for field in EXPECTED_FIELDS:
+            if field not in item:
+                _note(anomalies, f"missing_{field}", line_num)
+            elif not isinstance(item[field], str):
+                _note(anomalies, f"non_string_{field}", line_num)
+        for field in item.keys() - set(EXPECTED_FIELDS):
+            _note(anomalies, f"extra_field_{field}", line_num)
+        if isinstance(item.get("instruction"), str) and not item["instruction"].strip():
+            _note(anomalies, "empty_instruction", line_num)
+
+        fmt = classify_output(item.get("output"))
+        formats[fmt] = formats.get(fmt, 0) + 1
+
+        instruction = item.get("instruction", "")
+        instr_digest = _digest(str(instruction).strip().lower())
+        if instr_digest in seen_instructions:
+            dup_instructions += 1
+        else:
+            seen_instructions.add(instr_digest)
+        record_digest = _digest(instruction, item.get("input", ""), item.get("output", ""))
+        if record_digest in seen_records:
+            dup_records += 1
+        else:
+            seen_records.add(record_digest)
+
+        if tokenizer is not None and "instruction" in item and "output" in item:
+            pending.append(format_prompt({k: "" if v is None else str(v) for k, v in item.items()}))
+            if len(pending) >= batch_size:
+                lengths.extend(_token_lengths(tokenizer, pending))
+                pending = []
+
+    if pending:
+        lengths.extend(_token_lengths(tokenizer, pending))
+
+    report = {
+        "dataset": path,
+        "dataset_sha256": dataset_sha,
+        "total": total,
+        "output_formats": formats,
+        "anomalies": anomalies,
+        "duplicates": {
+            "instruction": dup_instructions,
+            "instruction_rate": dup_instructions / total if total else 0.0,
+            "record": dup_records,
+            "record_rate": dup_records / total if total else 0.0,
+        },
+        "tokens": None,
+    }
+
+    if tokenizer is not None and lengths:
+        arr = np.asarray(lengths, dtype=np.int64)
+        edges = list(HISTOGRAM_EDGES)
+        if arr.max() >= edges[-1]:
+            edges.append(int(arr.max()) + 1)
+        counts, _ = np.histogram(arr, bins=edges)
+        report["tokens"] = {
+            "tokenizer": tokenizer_name,
+            "max_length": max_length,
+            "count": int(arr.size),
+            "total": int(arr.sum()),
+            "mean": float(arr.mean()),
+            "p50": float(np.percentile(arr, 50)),
+            "p90": float(np.percentile(arr, 90)),
+            "p99": float(np.percentile(arr, 99)),
+            "max": int(arr.max()),
+            "over_max_length": int((arr > max_length).sum()),
+            "histogram": [
+                {"lo": int(lo), "hi": int(hi), "count": int(c)}
+                for lo, hi, c in zip(edges[:-1], edges[1:], counts)
+            ],
+        }
+
+    report["elapsed_sec"] = time.perf_counter() - start
+
+    if cache_path:
+        os.makedirs(cache_dir, exist_ok=True)
+        with open(cache_path, "w", encoding="utf-8") as f:
+            json.dump(report, f, indent=2)
+    report["cached"] = False
+    return report
+
+
+def print_report(report):
+    total = report["total"]
+    print(f"Dataset: {report['dataset']} (sha256 {report['dataset_sha256'][:12]})")
+    print(f"Total Lines: {total}")
+
+    print("\n--- Output Format ---")
+    for fmt, count in sorted(report["output_formats"].items(), key=lambda kv: -kv[1]):
+        print(f"{fmt:<12} {count:>8} ({count / total * 100 if total else 0:.1f}%)")
+
+    print("\n--- Field Anomalies ---")
+    if not report["anomalies"]:
+        print("None")
+    for kind, entry in sorted(report["anomalies"].items()):
+        print(f"{kind:<24} {entry['count']:>8}  e.g. lines {entry['lines']}")
+
+    dup = report["duplicates"]
+    print("\n--- Duplicates ---")
+    print(f"Instruction duplicates: {dup['instruction']} ({dup['instruction_rate'] * 100:.1f}%)")
+    print(f"Exact record duplicates: {dup['record']} ({dup['record_rate'] * 100:.1f}%)")
+
+    tokens = report["tokens"]
+    if tokens:
+        print(f"\n--- Token Lengths ({tokens['tokenizer']}) ---")
+        print(f"Mean: {tokens['mean']:.2f}  p50: {tokens['p50']:.0f}  p90: {tokens['p90']:.0f}  "
+              f"p99: {tokens['p99']:.0f}  Max: {tokens['max']}")
+        peak = max(b["count"] for b in tokens["histogram"]) or 1
+        for b in tokens["histogram"]:
+            bar = "#" * int(40 * b["count"] / peak)
+            print(f"[{b['lo']:>5}, {b['hi']:>5}) {b['count']:>8} {bar}")
+        if tokens["over_max_length"]:
+            print(f"WARNING: {tokens['over_max_length']} samples exceed {tokens['max_length']} tokens "
+                  f"and will be truncated during training.")
+        else:
+            print(f"SUCCESS: All samples fit within {tokens['max_length']} context window.")
+
+    source = "cache" if report.get("cached") else f"{report['elapsed_sec']:.2f}s"
+    print(f"\nProfiled in {source}.")
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--dataset", type=str, default=DATASET_FILE)
+    parser.add_argument("--model_name", type=str, default=MODEL_NAME, help="Tokenizer to measure lengths with")
+    parser.add_argument("--max_length", type=int, default=MAX_LENGTH)
+    parser.add_argument("--batch_size", type=int, default=BATCH_SIZE)
+    parser.add_argument("--no_tokenizer", action="store_true", help="Skip token-length profiling")
+    parser.add_argument("--refresh", action="store_true", help="Ignore any cached report")
+    parser.add_argument("--json", action="store_true", help="Print the raw report as JSON")
+    args = parser.parse_args()
+
+    if not os.path.exists(args.dataset):
+        print(f"Error: {args.dataset} not found.")
+        return
+
+    tokenizer = None
+    if not args.no_tokenizer:
+        from transformers import AutoTokenizer
+        tokenizer = AutoTokenizer.from_pretrained(args.model_name, use_fast=True)
+        if not tokenizer.is_fast:
+            print("Warning: slow tokenizer loaded, batched encoding will not be parallel.")
+
+    report = profile_dataset(
+        args.dataset,
+        tokenizer=tokenizer,
+        tokenizer_name=args.model_name if tokenizer is not None else None,
+        max_length=args.max_length,
+        batch_size=args.batch_size,
+        refresh=args.refresh,
+    )
+    if args.json:
+        print(json.dumps(report, indent=2))
+    else:
+        print_report(report)
+
+
+if __name__ == "__main__":
+    main()
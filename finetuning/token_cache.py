@@ -0,0 +1,177 @@
+"""Pre-tokenized, memory-mapped training dataset cache.
+
+Formats every Alpaca record with the training prompt template, tokenizes it once (batched,
+fast tokenizer), appends EOS and truncates to max_length exactly like SFTTrainer would, and
+saves the result as an Arrow dataset (`input_ids`, `length`). The cache directory is keyed by
+the dataset hash, tokenizer, prompt template and max_length, and is loaded with
+`load_from_disk`, which memory-maps the Arrow files instead of copying them into RAM.
+
+train.py and debug_dataset.py use it so launches and --resume_from_checkpoint restarts skip
+tokenization entirely.
+
+Usage:
+python -m finetuning.token_cache --dataset data_extraction/alpaca_physics_5k_cleaned.jsonl
+"""
+
+import argparse
+import json
+import os
+import shutil
+import time
+
+from fingerprint import file_sha256, text_sha256
+from finetuning.data_utils import (
+    PROMPT_TEMPLATE,
+    PROMPT_TEMPLATE_NO_INPUT,
+    format_prompt,
+    iter_jsonl,
+)
+
+MODEL_NAME = "mistralai/Mistral-7B-Instruct-v0.2"
+DATASET_FILE = "data_extraction/alpaca_physics_5k_cleaned.jsonl"
+CACHE_DIR = ".cache/tokenized"
+MAX_LENGTH = 2048
+BATCH_SIZE = 1024
+META_FILE = "cache_meta.json"
+
+
+def tokenizer_fingerprint(tokenizer):
+    """Identifies a tokenizer by name, vocab size and special tokens."""
+    return text_sha256(
+        getattr(tokenizer, "name_or_path", ""),
+        len(tokenizer),
+        tokenizer.bos_token_id,
+        tokenizer.eos_token_id,
+        type(tokenizer).__name__,
+    )
+
+
+def template_fingerprint():
+    return text_sha256(PROMPT_TEMPLATE, PROMPT_TEMPLATE_NO_INPUT)
+
+
+def cache_path_for(dataset_path, tokenizer, max_length=MAX_LENGTH, cache_dir=CACHE_DIR):
+    key = text_sha256(
+        file_sha256(dataset_path),
+        tokenizer_fingerprint(tokenizer),
+        template_fingerprint(),
+        max_length,
+    )[:32]
+    return os.path.join(cache_dir, key)
+
+
+def _tokenize_batch(tokenizer, texts, max_length):
+    enc = tokenizer(texts, add_special_tokens=True, return_attention_mask=False, return_token_type_ids=False)
+    eos = tokenizer.eos_token_id
+    out = []
+    for ids in enc["input_ids"]:
+        if eos is not None and (not ids or ids[-1] != eos):
+            ids.append(eos)
+        out.append(ids[:max_length])
+    return out
+
+
+def iter_training_records(dataset_path):
+    """
+    Streams the records the cache is built from, in row order. Yields (line_number, record);
+    record is None for malformed lines (no instruction / output), which the cache skips. Values
+    are strings, with missing (null) fields as "".
+    """
+    for line_num, item in iter_jsonl(dataset_path):
+        if not isinstance(item, dict) or "instruction" not in item or "output" not in item:
+            yield line_num, None
+            continue
+        yield line_num, {k: "" if v is None else str(v) for k, v in item.items()}
+
+
+def build_token_cache(dataset_path, tokenizer, max_length=MAX_LENGTH, cache_dir=CACHE_DIR, batch_size=BATCH_SIZE):
+    """Tokenizes `dataset_path` once and writes the Arrow cache. Returns the cache directory."""
+    from datasets import Dataset, Features, Sequence, Value
+
+    path = cache_path_for(dataset_path, tokenizer, max_length, cache_dir)
+    start = time.perf_counter()
+
+    input_ids = []
+    skipped = 0
+    pending = []
+    for _, record in iter_training_records(dataset_path):
+        if record is None:
+            skipped += 1
+            continue
+        pending.append(format_prompt(record))
+        if len(pending) >= batch_size:
+            input_ids.extend(_tokenize_batch(tokenizer, pending, max_length))
+            pending = []
+    if pending:
+        input_ids.extend(_tokenize_batch(tokenizer, pending, max_length))
+
+    features = Features({"input_ids": Sequence(Value("int32")), "length": Value("int32")})
+    dataset = Dataset.from_dict(
+        {"input_ids": input_ids, "length": [len(ids) for ids in input_ids]},
+        features=features,
+    )
+
+    # Write to a temp dir and rename so an interrupted build never leaves a half cache behind
+    tmp_path = path + ".tmp"
+    if os.path.exists(tmp_path):
+        shutil.rmtree(tmp_path)
+    dataset.save_to_disk(tmp_path)
+    with open(os.path.join(tmp_path, META_FILE), "w", encoding="utf-8") as f:
+        json.dump({
+            "dataset": dataset_path,
+            "dataset_sha256": file_sha256(dataset_path),
+            "tokenizer": getattr(tokenizer, "name_or_path", ""),
+            "tokenizer_fingerprint": tokenizer_fingerprint(tokenizer),
+            "template_fingerprint": template_fingerprint(),
+            "max_length": max_length,
+            "rows": len(input_ids),
+            "skipped": skipped,
+            "tokens": int(sum(len(ids) for ids in input_ids)),
+        }, f, indent=2)
+    if os.path.exists(path):
+        shutil.rmtree(path)
+    os.replace(tmp_path, path)
+
+    print(f"Tokenized {len(input_ids)} examples in {time.perf_counter() - start:.2f}s -> {path}")
+    if skipped:
+        print(f"Warning: skipped {skipped} malformed lines.")
+    return path
+
+
+def load_token_cache(dataset_path, tokenizer, max_length=MAX_LENGTH, cache_dir=CACHE_DIR, build=True):
+    """
+    Returns the memory-mapped tokenized dataset for (dataset, tokenizer, template, max_length),
+    building it first if it does not exist and `build` is set. Returns None on a miss otherwise.
+    """
+    from datasets import load_from_disk
+
+    path = cache_path_for(dataset_path, tokenizer, max_length, cache_dir)
+    if not os.path.exists(os.path.join(path, META_FILE)):
+        if not build:
+            return None
+        build_token_cache(dataset_path, tokenizer, max_length, cache_dir)
+    else:
+        print(f"Loading tokenized dataset from cache {path}")
+    return load_from_disk(path)
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--dataset", type=str, default=DATASET_FILE)
+    parser.add_argument("--model_name", type=str, default=MODEL_NAME)
+    parser.add_argument("--max_length", type=int, default=MAX_LENGTH)
+    parser.add_argument("--cache_dir", type=str, default=CACHE_DIR)
+    parser.add_argument("--rebuild", action="store_true", help="Rebuild even if a cache exists")
+    args = parser.parse_args()
+
+    from transformers import AutoTokenizer
+    tokenizer = AutoTokenizer.from_pretrained(args.model_name, use_fast=True)
+
+    if args.rebuild:
+        build_token_cache(args.dataset, tokenizer, args.max_length, args.cache_dir)
+    dataset = load_token_cache(args.dataset, tokenizer, args.max_length, args.cache_dir)
+    print(f"Rows: {len(dataset)}  Tokens: {sum(dataset['length'])}")
+
+
+if __name__ == "__main__":
+    main()
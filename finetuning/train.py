@@ -1,24 +1,24 @@
 
 import os
-import torch
 import argparse
 from datasets import load_dataset
 from peft import LoraConfig, prepare_model_for_kbit_training, get_peft_model
 from transformers import (
-    AutoModelForCausalLM,
-    AutoTokenizer,
-    BitsAndBytesConfig,
     TrainingArguments,
     pipeline,
     logging,
 )
 from trl import SFTTrainer, SFTConfig
+from finetuning.data_utils import format_prompt
+from finetuning.token_cache import load_token_cache
+from finetuning.packing import PackedDataCollator, build_packed_dataset, padding_report, print_padding_report
+from finetuning.instrumentation import instrument_trainer, parse_step_range, print_summary, summarize
+from model_registry import DEFAULT_MODEL, MODEL_REGISTRY, get_model_spec, is_cpu, load_base_model, load_tokenizer
 
 # Configuration
-MODEL_NAME = "mistralai/Mistral-7B-Instruct-v0.2"
-NEW_MODEL_NAME = "mistral-7b-physics-finetune"
 DATASET_FILE = "data_extraction/alpaca_physics_5k_cleaned.jsonl" # Path on Runpod
 OUTPUT_DIR = "./results"
+MAX_LENGTH = 2048
 
 def main():
     parser = argparse.ArgumentParser()
@@ -26,48 +26,51 @@ def main():
     parser.add_argument("--batch_size", type=int, default=4)
     parser.add_argument("--learning_rate", type=float, default=2e-4)
     parser.add_argument("--dataset_path", type=str, default=DATASET_FILE)
+    parser.add_argument("--model", type=str, default=DEFAULT_MODEL, help=f"Registry name ({', '.join(MODEL_REGISTRY)}) or HF model ID")
+    parser.add_argument("--quantization", type=str, default="default", help="Override the registry quantization (nf4, int8, none)")
+    parser.add_argument("--device", type=str, default=None, help="Override the registry device_map (e.g. cpu)")
+    parser.add_argument("--output_dir", type=str, default=OUTPUT_DIR)
     parser.add_argument("--resume_from_checkpoint", type=str, default=None, help="Path to checkpoint or 'True' to resume from latest")
     parser.add_argument("--max_steps", type=int, default=-1, help="Limit number of training steps for debugging")
+    parser.add_argument("--no_token_cache", action="store_true", help="Tokenize inside SFTTrainer instead of using the pre-tokenized cache")
+    parser.add_argument("--packing", action="store_true", help="Pack examples into max_length rows (first-fit-decreasing, position-ID resets)")
+    parser.add_argument("--instrument", action="store_true", help="Log tokens/sec, padding ratio, dataloader stall and optimizer time per step")
+    parser.add_argument("--profile_steps", type=str, default=None, help="torch.profiler window as 'start-end' (implies --instrument)")
     args = parser.parse_args()
 
-    print(f"Loading dataset from {args.dataset_path}...")
-    # Load dataset (Alpaca format handles 'instruction', 'input', 'output')
-    dataset = load_dataset('json', data_files=args.dataset_path, split="train")
-
-    # Formatting function
-    def format_prompts(example):
-        instruction = example['instruction']
-        input_text = example['input']
-        output = example['output']
-        
-        # Mistral Instruct Format: [INST] instruction [/INST] output
-        if input_text:
-            prompt = f"[INST] {instruction}\n\n{input_text} [/INST] {output}"
-        else:
-            prompt = f"[INST] {instruction} [/INST] {output}"
-        return prompt
-
-    # QLoRA Config
-    bnb_config = BitsAndBytesConfig(
-        load_in_4bit=True,
-        bnb_4bit_quant_type="nf4",
-        bnb_4bit_compute_dtype=torch.float16,
-        bnb_4bit_use_double_quant=False,
-    )
+    if args.packing and args.no_token_cache:
+        parser.error("--packing requires the token cache; drop --no_token_cache")
 
-    print(f"Loading model {MODEL_NAME}...")
-    model = AutoModelForCausalLM.from_pretrained(
-        MODEL_NAME,
-        quantization_config=bnb_config,
-        device_map="auto"
-    )
-    model.config.use_cache = False
-    model.config.pretraining_tp = 1
+    spec = get_model_spec(args.model, quantization=args.quantization, device=args.device)
+    if spec["quantization"] == "dynamic-int8":
+        parser.error("dynamic-int8 is inference-only; train with --quantization none")
+    new_model_name = spec["adapter_name"]
 
-    tokenizer = AutoTokenizer.from_pretrained(MODEL_NAME, trust_remote_code=True)
-    tokenizer.pad_token = tokenizer.eos_token
+    tokenizer = load_tokenizer(spec)
     tokenizer.padding_side = "right"
 
+    if args.no_token_cache:
+        print(f"Loading dataset from {args.dataset_path}...")
+        # Load dataset (Alpaca format handles 'instruction', 'input', 'output')
+        dataset = load_dataset('json', data_files=args.dataset_path, split="train")
+        formatting_func = format_prompt
+    else:
+        # Prompt-formatted, tokenized and truncated once; memory-mapped on every later launch/resume
+        dataset = load_token_cache(args.dataset_path, tokenizer, max_length=MAX_LENGTH)
+        formatting_func = None
+
+    data_collator = None
+    if args.packing:
+        dataset, bins, lengths = build_packed_dataset(dataset, MAX_LENGTH)
+        print_padding_report(padding_report(lengths, bins, args.batch_size, MAX_LENGTH), args.batch_size)
+        data_collator = PackedDataCollator(tokenizer.pad_token_id)
+
+    # QLoRA (nf4) for the 7B model; plain fp32 LoRA for the CPU registry entries
+    print(f"Loading model {spec['model_id']} (quantization: {spec['quantization']}, device: {spec['device_map']})...")
+    model = load_base_model(spec)
+    model.config.use_cache = False
+    model.config.pretraining_tp = 1
+
     # PEFT Config
     peft_config = LoraConfig(
         lora_alpha=128,
@@ -75,16 +78,16 @@ def main():
         r=64,
         bias="none",
         task_type="CAUSAL_LM",
-        target_modules=["q_proj", "k_proj", "v_proj", "o_proj", "gate_proj"]
+        target_modules=spec["target_modules"]
     )
 
     # SFTConfig (replaces TrainingArguments)
     sft_config = SFTConfig(
-        output_dir=OUTPUT_DIR,
+        output_dir=args.output_dir,
         num_train_epochs=args.epochs,
         per_device_train_batch_size=args.batch_size,
         gradient_accumulation_steps=1,
-        optim="paged_adamw_32bit",
+        optim=spec["optim"],
         save_strategy="epoch",
         logging_steps=10,
         learning_rate=args.learning_rate,
@@ -94,12 +97,14 @@ def main():
         max_grad_norm=0.3,
         max_steps=args.max_steps,
         warmup_ratio=0.03,
-        group_by_length=True,
+        group_by_length=not args.packing, # Packed rows are already ~max_length
         lr_scheduler_type="constant",
         report_to="tensorboard",
         save_total_limit=5,
-        max_length=2048,
+        max_length=MAX_LENGTH,
         packing=False,
+        dataset_kwargs={"skip_prepare_dataset": not args.no_token_cache},
+        use_cpu=is_cpu(spec),
     )
 
     print("Starting SFTTrainer...")
@@ -107,11 +112,16 @@ def main():
         model=model,
         train_dataset=dataset,
         peft_config=peft_config,
-        formatting_func=format_prompts,
+        formatting_func=formatting_func,
+        data_collator=data_collator,
         processing_class=tokenizer,
         args=sft_config,
     )
 
+    throughput = None
+    if args.instrument or args.profile_steps:
+        throughput = instrument_trainer(trainer, profile_steps=parse_step_range(args.profile_steps))
+
     # Handle boolean vs string for resume_from_checkpoint
     resume_checkpoint = args.resume_from_checkpoint
     if resume_checkpoint == "True":
@@ -121,10 +131,12 @@ def main():
 
     print(f"Training (Resume: {resume_checkpoint})...")
     trainer.train(resume_from_checkpoint=resume_checkpoint)
+    if throughput is not None:
+        print_summary(summarize(throughput.records))
 
-    print(f"Saving model to {OUTPUT_DIR}/{NEW_MODEL_NAME}...")
-    trainer.model.save_pretrained(f"{OUTPUT_DIR}/{NEW_MODEL_NAME}")
-    tokenizer.save_pretrained(f"{OUTPUT_DIR}/{NEW_MODEL_NAME}")
+    print(f"Saving model to {args.output_dir}/{new_model_name}...")
+    trainer.model.save_pretrained(f"{args.output_dir}/{new_model_name}")
+    tokenizer.save_pretrained(f"{args.output_dir}/{new_model_name}")
     print("Training Complete.")
 
 if __name__ == "__main__":
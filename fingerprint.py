@@ -0,0 +1,41 @@
+import hashlib
+import os
+
+CHUNK_SIZE = 1 << 20
+
+
+def file_sha256(path: str) -> str:
+    """Content hash of a single file, read in 1 MB chunks."""
+    h = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(CHUNK_SIZE), b""):
+            h.update(chunk)
+    return h.hexdigest()
+
+
+def dir_sha256(path: str) -> str:
+    """Content hash of a directory (relative file names + file contents)."""
+    h = hashlib.sha256()
+    for root, dirs, files in os.walk(path):
+        dirs.sort()
+        for name in sorted(files):
+            full = os.path.join(root, name)
+            h.update(os.path.relpath(full, path).replace(os.sep, "/").encode("utf-8"))
+            h.update(file_sha256(full).encode("ascii"))
+    return h.hexdigest()
+
+
+def path_sha256(path: str) -> str:
+    """Hash a file or a directory, whichever `path` points to."""
+    if os.path.isdir(path):
+        return dir_sha256(path)
+    return file_sha256(path)
+
+
+def text_sha256(*parts) -> str:
+    """Hash a sequence of values via their string form."""
+    h = hashlib.sha256()
+    for part in parts:
+        h.update(str(part).encode("utf-8"))
+        h.update(b"\x00")
+    return h.hexdigest()
@@ -0,0 +1,168 @@
+"""Model registry shared by finetuning/train.py and evaluation/run_eval.py.
+
+Each entry names a causal LM plus how to load it (quantization, dtype, device) and how to train
+it (optimizer, LoRA target modules). The default stays the 4-bit Mistral-7B setup used in the
+study; the tiny entries run the whole train -> eval -> score loop on CPU.
+
+Quantization options:
+- "nf4": bitsandbytes 4-bit NF4 (CUDA only; training + inference)
+- "int8": bitsandbytes 8-bit (CUDA only)
+- "dynamic-int8": torch dynamic int8 quantization of nn.Linear layers (CPU inference only)
+- None: plain weights in `dtype`
+
+Unknown names are treated as Hugging Face model IDs and loaded with CPU/GPU-appropriate defaults.
+"""
+
+import copy
+import json
+import os
+
+DEFAULT_MODEL = "mistral-7b"
+MERGE_MANIFEST_FILE = "merge_manifest.json"  # written by finetuning/merge_adapter.py
+
+MODEL_REGISTRY = {
+    "mistral-7b": {
+        "model_id": "mistralai/Mistral-7B-Instruct-v0.2",
+        "quantization": "nf4",
+        "dtype": "float16",
+        "device_map": "auto",
+        "optim": "paged_adamw_32bit",
+        "target_modules": ["q_proj", "k_proj", "v_proj", "o_proj", "gate_proj"],
+        "adapter_name": "mistral-7b-physics-finetune",
+    },
+    # Randomly initialised Mistral-architecture model (~1M params); same module names and prompt
+    # format as the real model, for CPU smoke runs and benchmarking the hot paths.
+    "tiny-mistral": {
+        "model_id": "hf-internal-testing/tiny-random-MistralForCausalLM",
+        "quantization": None,
+        "dtype": "float32",
+        "device_map": "cpu",
+        "optim": "adamw_torch",
+        "target_modules": ["q_proj", "k_proj", "v_proj", "o_proj", "gate_proj"],
+        "adapter_name": "tiny-mistral-physics-finetune",
+    },
+    # Smallest instruction-tuned model that gives non-random answers on CPU.
+    "smollm2-135m": {
+        "model_id": "HuggingFaceTB/SmolLM2-135M-Instruct",
+        "quantization": None,
+        "dtype": "float32",
+        "device_map": "cpu",
+        "optim": "adamw_torch",
+        "target_modules": ["q_proj", "k_proj", "v_proj", "o_proj", "gate_proj"],
+        "adapter_name": "smollm2-135m-physics-finetune",
+    },
+}
+
+
+def _cuda_available():
+    try:
+        import torch
+        return torch.cuda.is_available()
+    except ImportError:
+        return False
+
+
+def get_model_spec(name, quantization="default", device=None):
+    """
+    Resolves a registry name (or a raw HF model ID) into a spec dict.
+    `quantization` and `device` override the registry values when given.
+    """
+    if name in MODEL_REGISTRY:
+        spec = copy.deepcopy(MODEL_REGISTRY[name])
+    else:
+        on_gpu = _cuda_available()
+        spec = {
+            "model_id": name,
+            "quantization": "nf4" if on_gpu else None,
+            "dtype": "float16" if on_gpu else "float32",
+            "device_map": "auto" if on_gpu else "cpu",
+            "optim": "paged_adamw_32bit" if on_gpu else "adamw_torch",
+            "target_modules": ["q_proj", "k_proj", "v_proj", "o_proj", "gate_proj"],
+            "adapter_name": name.rstrip("/").split("/")[-1] + "-physics-finetune",
+        }
+    spec["name"] = name
+    if quantization != "default":
+        spec["quantization"] = None if quantization in (None, "none") else quantization
+    if device is not None:
+        spec["device_map"] = device
+        if device == "cpu":
+            if spec["quantization"] in ("nf4", "int8"):
+                spec["quantization"] = None
+            if spec["dtype"] == "float16":
+                spec["dtype"] = "float32"
+            if spec["optim"].startswith("paged_"):
+                spec["optim"] = "adamw_torch"
+    return spec
+
+
+def get_merged_spec(path, device=None):
+    """
+    Spec for a merged checkpoint directory from finetuning/merge_adapter.py: same loading
+    settings as its base model, weights from `path`, quantization as recorded at export.
+    """
+    with open(os.path.join(path, MERGE_MANIFEST_FILE), "r", encoding="utf-8") as f:
+        manifest = json.load(f)
+    quantization = manifest.get("quantization")
+    # nf4/int8 exports carry their quantization_config in config.json
+    spec = get_model_spec(
+        manifest.get("registry_name") or manifest["base_model"],
+        quantization=None if quantization in ("nf4", "int8") else quantization,
+        device=device,
+    )
+    spec["model_id"] = path
+    spec["merged_from"] = manifest
+    return spec
+
+
+def is_cpu(spec):
+    return spec["device_map"] == "cpu"
+
+
+def torch_dtype(spec):
+    import torch
+    return getattr(torch, spec["dtype"])
+
+
+def quantization_config(spec):
+    """BitsAndBytesConfig for the bitsandbytes modes, None otherwise."""
+    if spec["quantization"] == "nf4":
+        import torch
+        from transformers import BitsAndBytesConfig
+        return BitsAndBytesConfig(
+            load_in_4bit=True,
+            bnb_4bit_quant_type="nf4",
+            bnb_4bit_compute_dtype=torch.float16,
+        )
+    if spec["quantization"] == "int8":
+        from transformers import BitsAndBytesConfig
+        return BitsAndBytesConfig(load_in_8bit=True)
+    return None
+
+
+def load_tokenizer(spec):
+    from transformers import AutoTokenizer
+    tokenizer = AutoTokenizer.from_pretrained(spec["model_id"], trust_remote_code=True)
+    tokenizer.pad_token = tokenizer.eos_token
+    return tokenizer
+
+
+def load_base_model(spec, model_id=None):
+    """
+    Loads the causal LM described by `spec` (optionally from `model_id`, e.g. a merged checkpoint).
+    Dynamic int8 is applied after loading and is inference-only.
+    """
+    from transformers import AutoModelForCausalLM
+
+    kwargs = {"device_map": spec["device_map"]}
+    bnb_config = quantization_config(spec)
+    if bnb_config is not None:
+        kwargs["quantization_config"] = bnb_config
+    else:
+        kwargs["torch_dtype"] = torch_dtype(spec)
+
+    model = AutoModelForCausalLM.from_pretrained(model_id or spec["model_id"], **kwargs)
+
+    if spec["quantization"] == "dynamic-int8":
+        import torch
+        model = torch.ao.quantization.quantize_dynamic(model, {torch.nn.Linear}, dtype=torch.qint8)
+    return model
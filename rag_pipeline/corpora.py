@@ -0,0 +1,112 @@
+"""Corpora the RAG indexes are built from, and the manifest each index is checked against.
+
+- "openstax": OpenStax College Physics sections (data_extraction/data_crawler.py output), split
+  into overlapping character chunks; metadata keeps source URL, title and chapter.
+- "alpaca-qa": the cleaned Q&A training pairs, one "Q: ...\nA: ..." document per line (the
+  corpus run_eval has always retrieved from).
+
+`load_corpus_index(name)` returns the index for a corpus, rebuilding it (rag_pipeline/indexer.py
+streaming build) when the corpus file, chunking params or embedding model no longer match its
+manifest. Sections are chunked independently by `chunk_section`, so chunking parallelizes.
+Corpus paths and index directories are relative to the repository root, not the working directory.
+"""
+
+import functools
+import json
+import os
+
+from evaluation.rag import DEFAULT_EMBEDDING_MODEL, RAGIndex, load_or_build
+from fingerprint import file_sha256
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+CORPORA = {
+    "openstax": {
+        "path": "data_extraction/openstax_physics_vol1_ch1_6.json",
+        "index_dir": "rag_pipeline/openstax_index",
+        "chunking": {"splitter": "recursive_character", "chunk_size": 1000, "chunk_overlap": 100},
+    },
+    "alpaca-qa": {
+        "path": "data_extraction/alpaca_physics_5k_cleaned.jsonl",
+        "index_dir": "evaluation/rag_index",
+        "chunking": {"splitter": "qa_pair"},
+    },
+}
+
+
+def corpus_path(name):
+    """Absolute path of corpus `name`'s source file."""
+    return os.path.join(REPO_ROOT, CORPORA[name]["path"])
+
+
+def corpus_manifest(name, embedding_model=DEFAULT_EMBEDDING_MODEL, storage="float32", **chunking):
+    """Manifest fields an index of corpus `name` must carry to be current."""
+    corpus = CORPORA[name]
+    return {
+        "corpus": name,
+        "corpus_path": corpus["path"],
+        "corpus_sha256": file_sha256(corpus_path(name)),
+        "chunking": {**corpus["chunking"], **{k: v for k, v in chunking.items() if v is not None}},
+        "embedding_model": embedding_model,
+        "storage": storage,
+    }
+
+
+def default_index_dir(name, storage="float32"):
+    # Each storage type gets its own directory, so switching between them does not force rebuilds
+    index_dir = os.path.join(REPO_ROOT, CORPORA[name]["index_dir"])
+    return index_dir if storage == "float32" else f"{index_dir}_{storage}"
+
+
+def _read_sections(path, splitter):
+    with open(path, "r", encoding="utf-8") as f:
+        if splitter == "qa_pair":
+            return list(enumerate(f, 1))  # (line number, raw line)
+        return json.load(f)
+
+
+@functools.lru_cache(maxsize=4)
+def _text_splitter(chunk_size, chunk_overlap):
+    from langchain_text_splitters import RecursiveCharacterTextSplitter
+    return RecursiveCharacterTextSplitter(chunk_size=chunk_size, chunk_overlap=chunk_overlap)
+
+
+def chunk_section(section, chunking):
+    """One section (OpenStax page, or (line number, line) of the Q&A file) -> [(text, metadata)]."""
+    if chunking["splitter"] == "qa_pair":
+        line_num, line = section
+        try:
+            item = json.loads(line)
+        except json.JSONDecodeError:
+            return []
+        # Combine instruction and output for context
+        return [(f"Q: {item.get('instruction', '')}\nA: {item.get('output', '')}\n", {"line": line_num})]
+    splitter = _text_splitter(chunking["chunk_size"], chunking["chunk_overlap"])
+    meta = {"source": section["url"], "title": section["title"], "chapter": section["chapter"]}
+    return [(chunk, dict(meta)) for chunk in splitter.split_text(section["content"])]
+
+
+def iter_sections(name, chunking=None):
+    return _read_sections(corpus_path(name), (chunking or CORPORA[name]["chunking"])["splitter"])
+
+
+def load_corpus(name, chunking=None):
+    """(texts, metadata) for corpus `name` with the given chunking params (single process)."""
+    chunking = chunking or CORPORA[name]["chunking"]
+    texts, metadata = [], []
+    for section in iter_sections(name, chunking):
+        for text, meta in chunk_section(section, chunking):
+            texts.append(text)
+            metadata.append(meta)
+    return texts, metadata
+
+
+def load_corpus_index(name, index_dir=None, embedding_model=DEFAULT_EMBEDDING_MODEL, storage="float32", rebuild=False,
+                      embedding_backend="torch", **chunking) -> RAGIndex:
+    from rag_pipeline.indexer import build_streaming
+
+    expected = corpus_manifest(name, embedding_model, storage, **chunking)
+    index_dir = index_dir or default_index_dir(name, storage)
+    build = lambda: build_streaming(name, expected["chunking"], embedding_model, storage=storage,
+                                    embedding_backend=embedding_backend)
+    return load_or_build(index_dir, expected, build, rebuild=rebuild, embedding_backend=embedding_backend)
@@ -1,54 +1,153 @@
-import json
+import argparse
+import logging
+import multiprocessing
 import os
 import time
-from langchain_text_splitters import RecursiveCharacterTextSplitter
-from langchain_huggingface import HuggingFaceEmbeddings
-from langchain_community.vectorstores import FAISS
-from langchain_core.documents import Document
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from functools import partial
+
+from evaluation.embedders import EMBEDDING_BACKENDS, get_embedder
+from evaluation.rag import DEFAULT_EMBEDDING_MODEL, STORAGE_TYPES, RAGIndex, read_manifest, stale_reasons
+from rag_pipeline.corpora import CORPORA, chunk_section, corpus_manifest, corpus_path, default_index_dir, iter_sections
+
+# Build (or refresh) the retrieval index for a corpus. Same on-disk format as evaluation/rag.py:
+# index.faiss + bm25.npz + docs.jsonl + manifest.json (embedding model, chunking, corpus hash).
+#
+# The build streams: sections are chunked in a process pool, chunks are embedded in large
+# batches as they arrive (in this process, or sharded over --embed_workers processes on CPU),
+# and each batch of vectors is added to the index immediately.
+#
+# python -m rag_pipeline.indexer                       # OpenStax chunks -> rag_pipeline/openstax_index
+# python -m rag_pipeline.indexer --corpus alpaca-qa    # Q&A pairs -> evaluation/rag_index
+# python -m rag_pipeline.indexer --chunk_size 500 --chunk_overlap 50
+# python -m rag_pipeline.indexer --rebuild --embed_workers 4 --stream_batch 2048
+# python -m rag_pipeline.indexer --corpus alpaca-qa --storage int8
+# python -m rag_pipeline.indexer --rebuild --embedding_backend onnx-int8 --embed_workers 4
+
+logger = logging.getLogger(__name__)
+
+STREAM_BATCH = 1024  # chunks per encode call; SentenceTransformer length-sorts within a call
+ENCODE_BATCH_SIZE = 128  # forward-pass batch inside each encode call
+
+_EMBEDDER = None
+
+
+def _init_embedder(backend, model_name, threads, batch_size):
+    global _EMBEDDER
+    _EMBEDDER = (get_embedder(backend, model_name, threads), batch_size)
+
+
+def _embed(texts):
+    embedder, batch_size = _EMBEDDER
+    return embedder.encode(texts, batch_size=batch_size)
+
+
+def _batches(chunk_stream, size):
+    texts, metas = [], []
+    for chunks in chunk_stream:
+        for text, meta in chunks:
+            texts.append(text)
+            metas.append(meta)
+            if len(texts) >= size:
+                yield texts, metas
+                texts, metas = [], []
+    if texts:
+        yield texts, metas
+
+
+def build_streaming(name, chunking=None, embedding_model=DEFAULT_EMBEDDING_MODEL, chunk_workers=None,
+                    embed_workers=0, stream_batch=STREAM_BATCH, encode_batch_size=ENCODE_BATCH_SIZE,
+                    storage="float32", embedding_backend="torch", threads=None) -> RAGIndex:
+    """
+    Chunks corpus `name` in a process pool and embeds/adds chunks batch by batch.
+    embed_workers > 0 shards embedding over that many CPU processes (each with cpu_count / N
+    threads); 0 embeds in this process with `threads` (default: backend's own). Timing is left
+    in `rag.build_stats`.
+    """
+    chunking = chunking or CORPORA[name]["chunking"]
+    sections = iter_sections(name, chunking)
+    chunk_workers = chunk_workers or os.cpu_count()
+    rag = RAGIndex(embedding_model, storage, embedding_backend, threads)
+    stats = {"sections": len(sections), "chunks": 0, "chunk_workers": chunk_workers, "embed_workers": embed_workers}
+    start = time.perf_counter()
+
+    embed_pool = None
+    if embed_workers:
+        threads = max(1, (os.cpu_count() or 1) // embed_workers)
+        # spawn: torch / ORT thread pools do not survive fork
+        embed_pool = ProcessPoolExecutor(embed_workers, mp_context=multiprocessing.get_context("spawn"),
+                                         initializer=_init_embedder,
+                                         initargs=(embedding_backend, embedding_model, threads, encode_batch_size))
+    else:
+        encode = partial(rag.encode, batch_size=encode_batch_size)
+
+    pending = deque()  # in-flight (future, texts, metas), added to the index in submission order
+    with ProcessPoolExecutor(chunk_workers) as chunk_pool:
+        chunk_stream = chunk_pool.map(partial(chunk_section, chunking=chunking), sections,
+                                      chunksize=max(1, len(sections) // (chunk_workers * 8)))
+        for texts, metas in _batches(chunk_stream, stream_batch):
+            stats["chunks"] += len(texts)
+            if embed_pool is None:
+                rag.add(texts, encode(texts), metas)
+            else:
+                pending.append((embed_pool.submit(_embed, texts), texts, metas))
+                while len(pending) > 2 * embed_workers:
+                    future, t, m = pending.popleft()
+                    rag.add(t, future.result(), m)
+            logger.info(f"{stats['chunks']} chunks, {stats['chunks'] / (time.perf_counter() - start):.0f} docs/sec")
+    while pending:
+        future, t, m = pending.popleft()
+        rag.add(t, future.result(), m)
+    if embed_pool is not None:
+        embed_pool.shutdown()
+
+    rag.build_lexical()
+    stats["total_seconds"] = time.perf_counter() - start
+    stats["docs_per_sec"] = stats["chunks"] / stats["total_seconds"]
+    rag.build_stats = stats
+    return rag
 
-INPUT_FILE = "data_extraction/openstax_physics_vol1_ch1_6.json"
-INDEX_PATH = "rag_pipeline/faiss_index"
 
 def main():
-    if not os.path.exists(INPUT_FILE):
-        print(f"Error: {INPUT_FILE} not found.")
+    logging.basicConfig(level=logging.INFO)
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--corpus", choices=list(CORPORA), default="openstax")
+    parser.add_argument("--index_dir", default=None, help="Defaults to the corpus' index_dir in rag_pipeline/corpora.py")
+    parser.add_argument("--embedding_model", default=DEFAULT_EMBEDDING_MODEL)
+    parser.add_argument("--storage", choices=STORAGE_TYPES, default="float32", help="Vector storage (see evaluation/benchmark_storage.py)")
+    parser.add_argument("--chunk_size", type=int, default=None)
+    parser.add_argument("--chunk_overlap", type=int, default=None)
+    parser.add_argument("--chunk_workers", type=int, default=None, help="Chunking processes (default: all cores)")
+    parser.add_argument("--embedding_backend", choices=EMBEDDING_BACKENDS, default="torch", help="See evaluation/embedders.py")
+    parser.add_argument("--threads", type=int, default=None, help="Intra-op threads for in-process embedding")
+    parser.add_argument("--embed_workers", type=int, default=0, help="Shard embedding over N CPU processes (0 = this process)")
+    parser.add_argument("--stream_batch", type=int, default=STREAM_BATCH)
+    parser.add_argument("--encode_batch_size", type=int, default=ENCODE_BATCH_SIZE)
+    parser.add_argument("--rebuild", action="store_true", help="Rebuild even if the index is up to date")
+    args = parser.parse_args()
+
+    if not os.path.exists(corpus_path(args.corpus)):
+        print(f"Error: {corpus_path(args.corpus)} not found.")
+        return
+    index_dir = args.index_dir or default_index_dir(args.corpus, args.storage)
+    chunking = {"chunk_size": args.chunk_size, "chunk_overlap": args.chunk_overlap}
+    expected = corpus_manifest(args.corpus, args.embedding_model, args.storage, **chunking)
+
+    reasons = stale_reasons(read_manifest(index_dir), expected)
+    if not reasons and not args.rebuild:
+        print(f"Index at {index_dir} is up to date.")
         return
 
-    print("Loading raw data...")
-    with open(INPUT_FILE, "r", encoding="utf-8") as f:
-        data = json.load(f)
-    
-    documents = []
-    text_splitter = RecursiveCharacterTextSplitter(
-        chunk_size=1000,
-        chunk_overlap=100
-    )
-
-    print("Chunking documents...")
-    for section in data:
-        # Create a document for each chunk
-        chunks = text_splitter.split_text(section["content"])
-        for chunk in chunks:
-            doc = Document(
-                page_content=chunk,
-                metadata={
-                    "source": section["url"],
-                    "title": section["title"],
-                    "chapter": section["chapter"]
-                }
-            )
-            documents.append(doc)
-    
-    print(f"Created {len(documents)} chunks.")
-
-    print("Initializing Embeddings (all-MiniLM-L6-v2)...")
-    embeddings = HuggingFaceEmbeddings(model_name="all-MiniLM-L6-v2")
-
-    print("Building FAISS index...")
-    db = FAISS.from_documents(documents, embeddings)
-
-    print(f"Saving index to {INDEX_PATH}...")
-    db.save_local(INDEX_PATH)
+    print(f"Building {args.corpus} index ({'; '.join(reasons) or 'rebuild requested'})...")
+    rag = build_streaming(args.corpus, expected["chunking"], args.embedding_model, chunk_workers=args.chunk_workers,
+                          embed_workers=args.embed_workers, stream_batch=args.stream_batch,
+                          encode_batch_size=args.encode_batch_size, storage=args.storage,
+                          embedding_backend=args.embedding_backend, threads=args.threads)
+    rag.save(index_dir, expected)
+    s = rag.build_stats
+    print(f"Indexed {s['chunks']} chunks from {s['sections']} sections in {s['total_seconds']:.1f}s "
+          f"({s['docs_per_sec']:.0f} docs/sec) -> {index_dir}")
     print("Done.")
 
 if __name__ == "__main__":
@@ -1,24 +1,17 @@
-import os
-from langchain_huggingface import HuggingFaceEmbeddings
-from langchain_community.vectorstores import FAISS
+from evaluation.rag import RAGIndex
+from rag_pipeline.corpora import CORPORA, load_corpus_index
 
-INDEX_PATH = "rag_pipeline/faiss_index"
+INDEX_PATH = CORPORA["openstax"]["index_dir"]
 
-def load_index():
-    if not os.path.exists(INDEX_PATH):
-        raise FileNotFoundError(f"Index not found at {INDEX_PATH}. Run indexer.py first.")
-    
-    embeddings = HuggingFaceEmbeddings(model_name="all-MiniLM-L6-v2")
-    # Allow dangerous deserialization because we created the index ourselves
-    db = FAISS.load_local(INDEX_PATH, embeddings, allow_dangerous_deserialization=True)
-    return db
+def load_index(corpus="openstax") -> RAGIndex:
+    # Rebuilds when the index is missing or its manifest no longer matches the corpus
+    return load_corpus_index(corpus)
 
-def retrieve(db, query, k=5):
-    docs = db.similarity_search(query, k=k)
-    return docs
+def retrieve(db, query, k=5, mode="dense"):
+    return db.retrieve(query, k=k, mode=mode)
 
-def format_docs(docs):
-    return "\n\n".join([f"[Source: {d.metadata.get('title', 'Unknown')}]\n{d.page_content}" for d in docs])
+def format_docs(db, docs):
+    return "\n\n".join([f"[Source: {db.metadata[i].get('title', 'Unknown')}]\n{text}" for i, _, text in docs])
 
 if __name__ == "__main__":
     # Test
@@ -28,6 +21,6 @@ if __name__ == "__main__":
         print(f"Query: {query}")
         results = retrieve(db, query)
         print(f"Found {len(results)} results:")
-        print(format_docs(results))
+        print(format_docs(db, results))
     except Exception as e:
         print(f"Error: {e}")
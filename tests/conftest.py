@@ -0,0 +1,5 @@
+import os
+import sys
+
+# Entry points run as `python -m package.module` from the repo root; tests import them the same way
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
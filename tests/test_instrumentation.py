@@ -0,0 +1,34 @@
+import json
+import os
+
+import pytest
+
+pytest.importorskip("torch")
+pytest.importorskip("transformers")
+
+from finetuning.instrumentation import SIDECAR_FILE, run_smoke, smoke_dataset, summarize
+
+
+def test_smoke_run_records_throughput():
+    # One full epoch (64 examples, batches of 4): prefetching must not move a batch into another step
+    steps = 16
+    output_dir = run_smoke(steps=steps, profile_steps=None)
+    with open(os.path.join(output_dir, SIDECAR_FILE), "r", encoding="utf-8") as f:
+        lines = [json.loads(line) for line in f]
+    records = [line for line in lines if "step" in line]
+
+    assert [r["step"] for r in records] == list(range(1, steps + 1))
+    for r in records:
+        assert r["step_ms"] > 0
+        # Exactly one batch per step: 4 rows padded to the longest
+        assert r["real_tokens"] > 0 and r["padded_tokens"] >= r["real_tokens"]
+        assert r["padded_tokens"] % 4 == 0 and r["padded_tokens"] <= 4 * 63
+        assert r["tokens_per_sec"] > 0
+        assert 0 <= r["padding_ratio"] < 1
+    assert sum(r["real_tokens"] for r in records) == sum(len(f["input_ids"]) for f in smoke_dataset())
+    # Random lengths 8-63 in batches of 4 always pad somewhere
+    assert any(r["padding_ratio"] > 0 for r in records)
+
+    summary = lines[-1]["summary"]
+    assert summary == summarize(records)
+    assert set(summary) == {"step_ms", "dataloader_stall_ms", "optimizer_ms", "tokens_per_sec", "padding_ratio"}
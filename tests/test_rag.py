@@ -0,0 +1,24 @@
+import numpy as np
+import pytest
+
+pytest.importorskip("faiss")
+
+from evaluation.rag import RAGIndex
+
+
+def test_int8_streaming_build_fits_ranges_on_every_batch():
+    rng = np.random.default_rng(0)
+    # A small first batch whose values span a fraction of the later ones' range
+    batches = [rng.normal(size=(20, 16)) * 0.1, rng.normal(size=(200, 16)) * 3, rng.normal(size=(200, 16))]
+    batches = [b.astype(np.float32) for b in batches]
+    rag = RAGIndex(storage="int8")
+    for i, embs in enumerate(batches):
+        rag.add([f"doc {i}"] * len(embs), embs)
+    rag.flush_vectors()
+
+    vectors = np.concatenate(batches)
+    assert rag.index.ntotal == len(vectors)
+    decoded = rag.index.sa_decode(rag.index.sa_encode(vectors))
+    # One 8-bit step of the widest dimension's range; clipping to the first batch would be off by units
+    step = (vectors.max(0) - vectors.min(0)).max() / 255
+    assert np.abs(decoded - vectors).max() <= step
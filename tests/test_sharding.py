@@ -0,0 +1,134 @@
+import json
+import multiprocessing
+import os
+import sys
+
+import pytest
+
+import evaluation.run_eval as run_eval
+from evaluation.result_log import read_results, row_key, shard_path
+
+fork_only = pytest.mark.skipif(
+    "fork" not in multiprocessing.get_all_start_methods(), reason="stubs reach the workers through fork"
+)
+
+QUESTIONS = [{"id": i, "type": "mcq", "question": f"Question {i}?", "answer": "ABCD"[i % 4]} for i in range(7)]
+CONFIGS = ["Base", "Base+RAG", "Finetuned", "Finetuned+RAG"]
+
+
+class FakeManager:
+    """Stands in for ModelManager; generation is stubbed, so no weights are ever needed."""
+
+    def __init__(self, spec, lazy=False):
+        self.tokenizer = None
+        self.loaded = False
+
+    def add_adapter(self, name, path):
+        pass
+
+
+def tiny_model(path):
+    """A randomly initialised tiny Mistral and a word-level tokenizer, saved to `path` (no downloads)."""
+    from tokenizers import Tokenizer, models, pre_tokenizers
+    from transformers import MistralConfig, MistralForCausalLM, PreTrainedTokenizerFast
+
+    words = ["[UNK]", "<s>", "</s>", "[INST]", "[/INST]", "Question", "A", "B", "C", "D"]
+    tokenizer = Tokenizer(models.WordLevel({w: i for i, w in enumerate(words)}, unk_token="[UNK]"))
+    tokenizer.pre_tokenizer = pre_tokenizers.WhitespaceSplit()
+    PreTrainedTokenizerFast(tokenizer_object=tokenizer, unk_token="[UNK]", bos_token="<s>",
+                            eos_token="</s>").save_pretrained(path)
+    config = MistralConfig(vocab_size=len(words), hidden_size=16, intermediate_size=32, num_hidden_layers=1,
+                           num_attention_heads=2, num_key_value_heads=1, bos_token_id=1, eos_token_id=2)
+    MistralForCausalLM(config).save_pretrained(path)
+    return str(path)
+
+
+@pytest.fixture
+def stubbed(tmp_path, monkeypatch):
+    """run_eval with generation stubbed, run in tmp_path; returns the set of question IDs whose generation fails."""
+    failing = set()
+
+    def fake_generate(manager, adapter, q, context, *args, **kwargs):
+        if q["id"] in failing:
+            raise RuntimeError(f"generation failed for {q['id']}")
+        return q["answer"], False
+
+    monkeypatch.chdir(tmp_path)
+    monkeypatch.setattr(run_eval, "ModelManager", FakeManager)
+    monkeypatch.setattr(run_eval, "generate_cached", fake_generate)
+    monkeypatch.setattr(run_eval, "retrieve_context", lambda *args: ("", {"tokens": 0}))
+    monkeypatch.setattr(run_eval, "load_index", lambda *args: object())
+    monkeypatch.setattr(run_eval, "is_cpu", lambda spec: False)
+    fork = multiprocessing.get_context("fork")
+    monkeypatch.setattr(run_eval.multiprocessing, "get_context", lambda method: fork)
+    with open(tmp_path / "questions.json", "w", encoding="utf-8") as f:
+        json.dump(QUESTIONS, f)
+    return failing
+
+
+def run(monkeypatch, *args):
+    argv = ["run_eval", "--mode", "all", "--grader", "local", "--adapter_id", "adapter",
+            "--eval_file", "questions.json", "--no_generation_cache"] + list(args)
+    monkeypatch.setattr(sys, "argv", argv)
+    run_eval.main()
+    (manifest,) = [f for f in os.listdir(run_eval.LOG_DIR) if f.endswith(".run.json")]
+    return os.path.join(run_eval.LOG_DIR, manifest[:-len(".run.json")])
+
+
+def expected_keys():
+    return [(config, q["id"]) for config in CONFIGS for q in QUESTIONS]
+
+
+def check_complete(run_path):
+    keys = [row_key(row) for row in read_results(run_path + ".jsonl")]
+    assert sorted(keys) == sorted(expected_keys())  # every (config, question) exactly once
+    with open(run_path + ".csv", "r", encoding="utf-8") as f:
+        lines = f.read().splitlines()[1:]
+    assert [(line.split(",")[0], int(line.split(",")[1])) for line in lines] == expected_keys()
+    assert not [f for f in os.listdir(run_eval.LOG_DIR) if ".shard" in f]
+
+
+@fork_only
+@pytest.mark.parametrize("workers", [2, 3])
+def test_sharded_run_merges_every_row_once_in_order(stubbed, monkeypatch, workers):
+    run_path = run(monkeypatch, "--workers", str(workers))
+    check_complete(run_path)
+    # The merged log itself is in config, then question order (merge_shards sorts)
+    assert [row_key(row) for row in read_results(run_path + ".jsonl")] == expected_keys()
+
+
+@fork_only
+def test_resume_merges_leftover_shards_and_fills_gaps(stubbed, monkeypatch):
+    stubbed.update({2, 5})
+    run_path = run(monkeypatch, "--workers", "3")
+    logged = read_results(run_path + ".jsonl")
+    assert 0 < len(logged) < len(expected_keys())
+
+    # A crash before the merge: half the rows still sit in shard logs, one of them also merged
+    half = len(logged) // 2
+    with open(run_path + ".jsonl", "w", encoding="utf-8") as f:
+        f.writelines(json.dumps(row) + "\n" for row in logged[:half])
+    with open(shard_path(run_path, 1) + ".jsonl", "w", encoding="utf-8") as f:
+        f.writelines(json.dumps(row) + "\n" for row in logged[half - 1:])
+
+    stubbed.clear()
+    run(monkeypatch, "--resume", run_path, "--workers", "2")
+    check_complete(run_path)
+
+
+def test_spawn_workers_run_a_real_model(tmp_path, monkeypatch):
+    """The production path: spawned workers re-import run_eval and each load the model from disk."""
+    pytest.importorskip("torch")
+    model_path = tiny_model(tmp_path / "tiny")
+    monkeypatch.chdir(tmp_path)
+    with open(tmp_path / "questions.json", "w", encoding="utf-8") as f:
+        json.dump(QUESTIONS, f)
+    argv = ["run_eval", "--mode", "base", "--grader", "local", "--model", model_path, "--device", "cpu",
+            "--eval_file", "questions.json", "--no_generation_cache", "--max_new_tokens", "4", "--workers", "2"]
+    monkeypatch.setattr(sys, "argv", argv)
+    run_eval.main()
+
+    (manifest,) = [f for f in os.listdir(run_eval.LOG_DIR) if f.endswith(".run.json")]
+    run_path = os.path.join(run_eval.LOG_DIR, manifest[:-len(".run.json")])
+    assert [row_key(row) for row in read_results(run_path + ".jsonl")] == [("Base", q["id"]) for q in QUESTIONS]
+    assert not [f for f in os.listdir(run_eval.LOG_DIR) if ".shard" in f]